@@ -1,4 +1,23 @@
-from aranet4.client import Aranet4, Aranet4HistoryDelegate, Aranet4Error, Aranet4Scanner
 from .__version__ import __version__
 
 name = "aranet4"
+
+# Client is imported on first use, so that `aranet4.archive` and other
+# modules load without Bluetooth and asyncio
+_CLIENT_EXPORTS = ("Aranet4", "Aranet4HistoryDelegate", "Aranet4Error", "Aranet4Scanner")
+
+
+def __getattr__(attr):
+    if attr == "Aranet4Scanner":
+        from aranet4 import scanner
+
+        return scanner.Aranet4Scanner
+    if attr in _CLIENT_EXPORTS:
+        from aranet4 import client
+
+        return getattr(client, attr)
+    raise AttributeError(f"module {__name__!r} has no attribute {attr!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_CLIENT_EXPORTS))
@@ -1,14 +1,17 @@
 import argparse
-import csv
-from dataclasses import asdict
 import datetime
 from pathlib import Path
 import sys
-import requests
 from time import sleep
 
-from bleak.exc import BleakDeviceNotFoundError
-from aranet4 import client
+from aranet4 import archive
+from aranet4 import export
+from aranet4.metadata import MetadataCache
+
+# Device client, daemon and `requests` are imported by the commands that
+# use them, `--help` and archive reading start without them.
+# Same as `daemon.DEFAULT_PORT`
+DAEMON_PORT = 8764
 
 
 def parse_args(ctl_args):
@@ -23,6 +26,21 @@ def parse_args(ctl_args):
         action="store_true",
         help="Scan for Aranet devices"
     )
+    parser.add_argument(
+        "--daemon",
+        metavar="PORT",
+        nargs="?",
+        type=int,
+        const=DAEMON_PORT,
+        help=f"Scan continuously and serve latest readings as JSON on local PORT (default {DAEMON_PORT})"
+    )
+    parser.add_argument(
+        "--cache",
+        metavar="FILE",
+        type=Path,
+        help="Keep static device details (name, version) in FILE, so they are read only once. "
+        "Entries are dropped on firmware update only by --scan"
+    )
 
     current = parser.add_argument_group("Options for current reading")
     current.add_argument(
@@ -59,7 +77,20 @@ def parse_args(ctl_args):
         "--output",
         metavar="FILE",
         type=Path,
-        help="Save records to a file"
+        help="Save records to a file (.csv, .ndjson, .jsonl or .aranet archive, .gz compresses text files)"
+    )
+    history.add_argument(
+        "-i",
+        "--input",
+        metavar="FILE",
+        type=Path,
+        help="Read records from archive FILE (.aranet) instead of device"
+    )
+    history.add_argument(
+        "--sync",
+        metavar="FILE",
+        type=Path,
+        help="Get only records logged since previous sync, keep sync state in FILE"
     )
     history.add_argument(
         "-w",
@@ -220,37 +251,12 @@ def write_csv(filename, log_data):
     :param filename: file name
     :param log_data: `client.Record` data object
     """
-    with open(
-        file=filename, mode="w", encoding="utf-8", newline=""
-    ) as csv_file:
-        fieldnames = ["date"]
-        if log_data.filter.incl_co2:
-            fieldnames.append("co2")
-        if log_data.filter.incl_temperature:
-            fieldnames.append("temperature")
-        if log_data.filter.incl_humidity:
-            fieldnames.append("humidity")
-        if log_data.filter.incl_pressure:
-            fieldnames.append("pressure")
-        if log_data.filter.incl_rad_dose:
-            fieldnames.append("rad_dose")
-        if log_data.filter.incl_rad_dose_rate:
-            fieldnames.append("rad_dose_rate")
-        if log_data.filter.incl_rad_dose_total:
-            fieldnames.append("rad_dose_total")
-        if log_data.filter.incl_radon_concentration:
-            fieldnames.append("radon_concentration")
-        writer = csv.DictWriter(
-            csv_file, fieldnames=fieldnames, extrasaction="ignore"
-        )
-
-        writer.writeheader()
-
-        for line in log_data.value:
-            writer.writerow(asdict(line))
+    export.write_csv(filename, log_data)
 
 
 def post_data(url, current):
+    import requests
+
     # get current measurement minute
     now = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
     delta_ago = datetime.timedelta(seconds=current.ago)
@@ -266,8 +272,10 @@ def post_data(url, current):
     print(f"Pushing data: {r.text}")
 
 
-def wait_for_new_record(address):
-    current_vals = client.get_current_readings(address)
+def wait_for_new_record(address, metadata=None):
+    from aranet4 import client
+
+    current_vals = client.get_current_readings(address, metadata=metadata)
     wait_time = current_vals.interval - current_vals.ago
     for secs in range(wait_time, 0, -1):
         sleep(1)
@@ -278,24 +286,65 @@ def main(argv):
     found = {}
     args = parse_args(argv)
 
+    if args.daemon:
+        import asyncio
+        from aranet4 import daemon
+
+        print(f"Scanning for Aranet devices, readings at http://127.0.0.1:{args.daemon}/devices")
+        print(f"Metrics at http://127.0.0.1:{args.daemon}/metrics")
+        try:
+            asyncio.run(daemon.ScanDaemon().run(port=args.daemon))
+        except KeyboardInterrupt:
+            pass
+        return
+
     if args.scan:
+        from aranet4 import scanner
+
+        cache = MetadataCache(args.cache) if args.cache else None
+
+        def on_scan(advertisement):
+            if cache is not None:
+                # Drop cached details of device with updated firmware
+                cache.check_advertisement(advertisement)
+            store_and_print_scan_result(found, advertisement)
+
         print("Looking for Aranet devices...")
-        devices = client.find_nearby(lambda ad: store_and_print_scan_result(found, ad))
+        devices = scanner.find_nearby(on_scan)
         print(f"Scan finished. Found {len(devices)}")
         return
 
+    if args.input:
+        try:
+            records = archive.read_archive(args.input, args.start, args.end, args.last)
+        except (OSError, archive.ArchiveError) as e:
+            print(e)
+            return
+        print_records(records)
+        if args.output:
+            export.write_records(args.output, records)
+        return
+
     if not args.device_mac:
         print("Device address not specified")
         return
 
+    from bleak.exc import BleakDeviceNotFoundError
+    from aranet4 import client
+    from aranet4 import history
+
+    cache = MetadataCache(args.cache) if args.cache else None
     try:
         if args.records:
             if args.wait:
-                wait_for_new_record(args.device_mac)
-            records = client.get_all_records(args.device_mac, vars(args), True)
+                wait_for_new_record(args.device_mac, cache)
+            if args.sync:
+                records = history.sync_records(args.device_mac, args.sync, vars(args), cache)
+            else:
+                records = history.get_all_records(args.device_mac, vars(args), True, cache)
             print_records(records)
             if args.output:
-                write_csv(args.output, records)
+                export.write_records(args.output, records)
         else:
             settings = {}
 
@@ -315,7 +364,7 @@ def main(argv):
                     ret = "SUCCESS" if result[k] else "FAILED"
                     print(f"Set {k} to \"{val}\": {ret}")
             else:
-                current = client.get_current_readings(args.device_mac)
+                current = client.get_current_readings(args.device_mac, cache)
                 print(current.toString())
                 if args.url:
                     post_data(args.url, current)
@@ -0,0 +1,406 @@
+"""
+Binary archive of history records.
+
+File starts with a header holding device name and version, followed by
+segments appended by every `write_archive` call. Segment holds `Record`
+details, logging interval and one fixed-width column block per parameter.
+Log times are stored only when they are not evenly spaced. All values are
+little-endian and blocks are 8-byte aligned, so `Archive` reads columns
+straight from the memory-mapped file.
+"""
+
+from array import array
+import bisect
+from collections.abc import Sequence
+from dataclasses import fields
+import datetime
+import mmap
+import os
+import struct
+import sys
+
+from aranet4.records import Filter, Record, RecordColumns, _attach_tzinfo
+
+MAGIC = b"ARN4"
+SEGMENT_MAGIC = b"SEG1"
+FORMAT_VERSION = 1
+
+# magic, format version, name length, version length
+_HEADER = struct.Struct("<4sHHH")
+# magic, rows, records on device, filter begin, filter end, first log time,
+# interval (0 when log times are stored), columns, humidity flag, filter flags
+_SEGMENT = struct.Struct("<4sIIIIddBBH")
+# field index in `RecordColumns.FIELDS`, array typecode
+_COLUMN = struct.Struct("<Bc")
+
+# `Filter` flags, in `RecordColumns.FIELDS` order
+_FILTER_FLAGS = [flag.name for flag in fields(Filter)[2:]]
+
+_SWAP = sys.byteorder != "little"
+
+
+class ArchiveError(Exception):
+    pass
+
+
+def _padding(size: int) -> int:
+    return -size % 8
+
+
+def _typecode(column) -> str:
+    return column.typecode if isinstance(column, array) else column.format
+
+
+def _encode_header(name: str, version: str) -> bytes:
+    name = name.encode("utf-8")
+    version = version.encode("utf-8")
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, len(name), len(version)) + name + version
+    return header + bytes(_padding(len(header)))
+
+
+def _decode_header(buffer) -> tuple:
+    """Returns device name, version and offset of the first segment"""
+    if len(buffer) < _HEADER.size:
+        raise ArchiveError("Not an Aranet archive")
+    magic, format_version, name_size, version_size = _HEADER.unpack_from(buffer)
+    if magic != MAGIC:
+        raise ArchiveError("Not an Aranet archive")
+    if format_version != FORMAT_VERSION:
+        raise ArchiveError(f"Unsupported archive format version {format_version}")
+    offset = _HEADER.size
+    name = bytes(buffer[offset:offset + name_size]).decode("utf-8")
+    offset += name_size
+    version = bytes(buffer[offset:offset + version_size]).decode("utf-8")
+    offset += version_size
+    return name, version, offset + _padding(offset)
+
+
+def _record_columns(record: Record) -> RecordColumns:
+    """Columns of `record`, built from `RecordItem` rows if necessary"""
+    if isinstance(record.value, RecordColumns):
+        return record.value
+    items = list(record.value)
+    columns = {}
+    for name, flag in zip(RecordColumns.FIELDS, _FILTER_FLAGS):
+        if getattr(record.filter, flag):
+            values = [getattr(item, name) for item in items]
+            typecode = "d" if any(isinstance(value, float) for value in values) else "q"
+            columns[name] = array(typecode, values)
+    timestamps = array("d", [item.date.timestamp() for item in items])
+    return RecordColumns(timestamps, columns)
+
+
+def _encode_segment(record: Record) -> bytes:
+    value = _record_columns(record)
+    timestamps = value.timestamps
+    if isinstance(timestamps, range):
+        first, interval = timestamps.start, timestamps.step
+        blocks = []
+    else:
+        first, interval = (timestamps[0] if len(timestamps) else 0), 0
+        blocks = [array("d", timestamps)]
+
+    directory = b""
+    for idx, name in enumerate(RecordColumns.FIELDS):
+        column = value.columns.get(name)
+        if column is None:
+            continue
+        column = array(_typecode(column), column)
+        directory += _COLUMN.pack(idx, column.typecode.encode())
+        blocks.append(column)
+
+    rec_filter = record.filter
+    flags = sum(
+        1 << idx for idx, flag in enumerate(_FILTER_FLAGS) if getattr(rec_filter, flag)
+    )
+    parts = [
+        _SEGMENT.pack(
+            SEGMENT_MAGIC, len(value), record.records_on_device, rec_filter.begin,
+            rec_filter.end, first, interval, len(directory) // _COLUMN.size,
+            int(rec_filter.incl_humidity), flags,
+        ),
+        directory,
+        bytes(_padding(len(directory))),
+    ]
+    for block in blocks:
+        if _SWAP:
+            block.byteswap()
+        data = block.tobytes()
+        parts.append(data)
+        parts.append(bytes(_padding(len(data))))
+    return b"".join(parts)
+
+
+def _read_column(buffer, offset: int, typecode: str, size: int):
+    """Column of `size` values at `offset`, sharing memory with `buffer`"""
+    end = offset + size * array(typecode).itemsize
+    if _SWAP:
+        column = array(typecode, buffer[offset:end])
+        column.byteswap()
+        return column, end + _padding(end)
+    return memoryview(buffer)[offset:end].cast(typecode), end + _padding(end)
+
+
+def _decode_segment(buffer, offset: int, name: str, version: str) -> tuple:
+    """
+    Returns `Record` of segment at `offset`, and offset of the next one.
+    Returns `None` record for incomplete segment at the end of file.
+    """
+    if offset + _SEGMENT.size > len(buffer):
+        return None, offset
+    (
+        magic, size, records_on_device, begin, end, first, interval,
+        column_count, humidity_flag, flags,
+    ) = _SEGMENT.unpack_from(buffer, offset)
+    if magic != SEGMENT_MAGIC:
+        raise ArchiveError(f"Invalid archive segment at offset {offset}")
+    pos = offset + _SEGMENT.size
+    directory = [
+        _COLUMN.unpack_from(buffer, pos + idx * _COLUMN.size) for idx in range(column_count)
+    ]
+    pos += column_count * _COLUMN.size
+    pos += _padding(pos)
+
+    data_size = 0 if interval else size * 8 + _padding(size * 8)
+    for _, typecode in directory:
+        block = size * array(typecode.decode()).itemsize
+        data_size += block + _padding(block)
+    if pos + data_size > len(buffer):
+        return None, offset
+
+    if interval:
+        if float(first).is_integer() and float(interval).is_integer():
+            start, step = int(first), int(interval)
+            timestamps = range(start, start + size * step, step)
+        else:
+            timestamps = array("d", [first + idx * interval for idx in range(size)])
+    else:
+        timestamps, pos = _read_column(buffer, pos, "d", size)
+    columns = {}
+    for field_idx, typecode in directory:
+        column_name = RecordColumns.FIELDS[field_idx]
+        columns[column_name], pos = _read_column(buffer, pos, typecode.decode(), size)
+
+    included = [bool(flags >> idx & 1) for idx in range(len(_FILTER_FLAGS))]
+    if included[1] and humidity_flag == 2:
+        included[1] = 2  # v2 humidity
+    record = Record(name, version, records_on_device, Filter(begin, end, *included))
+    record.value = RecordColumns(timestamps, columns)
+    return record, pos
+
+
+def _copy_column(column) -> array:
+    if isinstance(column, array):
+        return column
+    copy = array(column.format)
+    copy.frombytes(column.cast("B"))
+    return copy
+
+
+def _detach(value: RecordColumns) -> RecordColumns:
+    """Copy of columns, independent of the archive file"""
+    timestamps = value.timestamps
+    if not isinstance(timestamps, range):
+        timestamps = _copy_column(timestamps)
+    columns = {name: _copy_column(column) for name, column in value.columns.items()}
+    return RecordColumns(timestamps, columns)
+
+
+class Archive(Sequence):
+    """
+    Read-only view of archive file. Rows of all segments are indexed from 0
+    and returned as `RecordItem`. Columns of records returned by `read` and
+    `between` share memory with the mapped file.
+    """
+
+    def __init__(self, path):
+        with open(file=path, mode="rb") as archive_file:
+            if os.fstat(archive_file.fileno()).st_size == 0:
+                raise ArchiveError("Not an Aranet archive")
+            self._mmap = mmap.mmap(archive_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.name, self.version, offset = _decode_header(self._mmap)
+        self.segments = []
+        self._starts = []
+        self._size = 0
+        while True:
+            record, offset = _decode_segment(self._mmap, offset, self.name, self.version)
+            if record is None:
+                break
+            self.segments.append(record)
+            self._starts.append(self._size)
+            self._size += len(record.value)
+        # Incomplete segment left by interrupted write is ignored
+        self.data_size = offset
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self.segments = []
+        try:
+            self._mmap.close()
+        except BufferError:
+            # Columns are still in use, mapping is closed once they are released
+            pass
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            start, stop, step = idx.indices(self._size)
+            if step != 1:
+                raise ValueError("Archive slice step must be 1")
+            return self.read(start, stop).value
+        if idx < 0:
+            idx += self._size
+        if not 0 <= idx < self._size:
+            raise IndexError("Archive index out of range")
+        pos = bisect.bisect_right(self._starts, idx) - 1
+        return self.segments[pos].value[idx - self._starts[pos]]
+
+    @property
+    def interval(self) -> float:
+        """Logging interval of the last segment, in seconds"""
+        if not self.segments:
+            return 0
+        timestamps = self.segments[-1].value.timestamps
+        if isinstance(timestamps, range):
+            return timestamps.step
+        return timestamps[1] - timestamps[0] if len(timestamps) > 1 else 0
+
+    def index(self, when: datetime.datetime, after: bool = False) -> int:
+        """
+        Index of the first row logged at or after `when`, or strictly after
+        `when` with `after`. Returns archive length if there is none.
+        Naive `when` is in local time.
+        """
+        timestamp = _attach_tzinfo(when).timestamp()
+        find = bisect.bisect_right if after else bisect.bisect_left
+        for start, segment in zip(self._starts, self.segments):
+            pos = find(segment.value.timestamps, timestamp)
+            if pos < len(segment.value):
+                return start + pos
+        return self._size
+
+    def read(self, start: int = 0, stop: int = None) -> Record:
+        """
+        Rows from `start` up to `stop` (excluded) as `Record`. Filter holds
+        device log indexes of the first and last row.
+        """
+        stop = self._size if stop is None else min(stop, self._size)
+        start = max(start, 0)
+        parts = []
+        for seg_start, segment in zip(self._starts, self.segments):
+            seg_stop = seg_start + len(segment.value)
+            if seg_stop <= start or seg_start >= stop:
+                continue
+            first = max(start, seg_start) - seg_start
+            last = min(stop, seg_stop) - seg_start
+            parts.append((segment, first, last))
+
+        if not parts:
+            rec_filter = Filter(0, 0, *[False] * len(_FILTER_FLAGS))
+            return Record(self.name, self.version, 0, rec_filter, RecordColumns(array("d"), {}))
+
+        included = [False] * len(_FILTER_FLAGS)
+        for segment, _, _ in parts:
+            for idx, flag in enumerate(_FILTER_FLAGS):
+                included[idx] = max(included[idx], getattr(segment.filter, flag))
+        first_segment, first, _ = parts[0]
+        last_segment, _, last = parts[-1]
+        rec_filter = Filter(
+            first_segment.filter.begin + first, last_segment.filter.begin + last - 1, *included
+        )
+        record = Record(self.name, self.version, last_segment.records_on_device, rec_filter)
+        if len(parts) == 1:
+            record.value = first_segment.value[first:last]
+        else:
+            record.value = _concat([segment.value[first:last] for segment, first, last in parts])
+        return record
+
+    def between(self, start: datetime.datetime = None, end: datetime.datetime = None) -> Record:
+        """Rows logged from `start` until `end`, both included, as `Record`"""
+        first = self.index(start) if start else 0
+        stop = self.index(end, after=True) if end else self._size
+        return self.read(first, stop)
+
+
+def _concat(parts: list) -> RecordColumns:
+    """Join columns of several segments into new arrays"""
+    timestamps = array("d")
+    for part in parts:
+        timestamps.extend(part.timestamps)
+    columns = {}
+    for name in RecordColumns.FIELDS:
+        blocks = [part.columns.get(name) for part in parts]
+        typecodes = {_typecode(block) for block in blocks if block is not None}
+        if not typecodes:
+            continue
+        column = array(typecodes.pop() if len(typecodes) == 1 else "d")
+        for part, block in zip(parts, blocks):
+            if block is None:
+                column.extend([-1] * len(part))
+            elif _typecode(block) == column.typecode and isinstance(block, memoryview):
+                column.frombytes(block.cast("B"))
+            else:
+                column.extend(block)
+        columns[name] = column
+    return RecordColumns(timestamps, columns)
+
+
+def write_archive(path, records):
+    """
+    Append records to archive file, creating it if needed. `records` is
+    `client.Record` or iterable of them, such as `client.stream_records`.
+    Every record is stored as a new segment.
+    """
+    if isinstance(records, Record):
+        records = (records,)
+    archive_file = None
+    try:
+        for record in records:
+            if archive_file is None:
+                archive_file = _open_for_append(path, record)
+            if len(record.value):
+                archive_file.write(_encode_segment(record))
+    finally:
+        if archive_file is not None:
+            archive_file.close()
+
+
+def _open_for_append(path, record: Record):
+    """Open archive file positioned after its last complete segment"""
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        archive_file = open(file=path, mode="wb")
+        archive_file.write(_encode_header(record.name, record.version))
+        return archive_file
+
+    with Archive(path) as archive:
+        name, data_size = archive.name, archive.data_size
+    if name != record.name:
+        raise ArchiveError(f"Archive {path} belongs to {name}, not {record.name}")
+    archive_file = open(file=path, mode="r+b")
+    archive_file.truncate(data_size)
+    archive_file.seek(data_size)
+    return archive_file
+
+
+def read_archive(
+    path, start: datetime.datetime = None, end: datetime.datetime = None, last: int = None
+) -> Record:
+    """
+    Read records logged from `start` until `end`, or `last` records,
+    from archive file. Returned columns are copied from the file.
+    """
+    with Archive(path) as archive:
+        first = archive.index(start) if start else 0
+        stop = archive.index(end, after=True) if end else len(archive)
+        if last:
+            first = max(first, stop - last)
+        record = archive.read(first, stop)
+        record.value = _detach(record.value)
+        return record
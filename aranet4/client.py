@@ -1,16 +1,35 @@
+from array import array
 import asyncio
-from dataclasses import dataclass, field
+import bisect
+import contextlib
+from dataclasses import asdict, dataclass, field
 import datetime
 from enum import IntEnum
+import functools
+import importlib
 import re
 import struct
 import math
-from typing import NamedTuple
+import time
+from typing import TYPE_CHECKING, NamedTuple
 
-from bleak import BleakClient
-from bleak import BleakScanner
-from bleak.backends.device import BLEDevice
-from bleak.uuids import normalize_uuid_16
+from aranet4.metadata import DeviceInfo, MetadataCache
+# Record classes are part of client API, they are defined apart so that
+# files are read and written without importing this module
+from aranet4.records import (  # noqa: F401
+    Filter,
+    Record,
+    RecordColumns,
+    RecordItem,
+    _attach_tzinfo,
+    _utc_time,
+)
+
+# Bleak is imported only when client or scanner is created
+if TYPE_CHECKING:
+    from bleak.backends.device import BLEDevice
+
+    from aranet4.pool import Aranet4Pool
 
 
 class Aranet4Error(Exception):
@@ -71,6 +90,72 @@ class AranetType(IntEnum):
         return description.get(self, "Unknown Aranet Device")
 
 
+class ParamDecoder(NamedTuple):
+    """Precompiled conversion of raw datapoint values of one parameter"""
+
+    decode: callable  # raw value -> scaled value, or -1 if invalid
+    decode_many: callable  # raw values -> list of scaled values
+    mask: int  # value is invalid if any of these bits is set
+    limit: int  # value is invalid if it is equal or above limit
+    multiplier: float
+    value_format: str  # struct format of history datapoint
+    typecode: str  # array.array type of scaled values
+
+
+def _compile_decoder(mask=0, limit=None, multiplier=1, value_format="H", typecode="q"):
+    """
+    Build `ParamDecoder` with conversion rules resolved once, so decoding
+    a value is a single expression.
+    """
+    if isinstance(multiplier, float):
+        def decode(value):
+            return -1 if value & mask else round(value * multiplier, 1)
+
+        def decode_many(values):
+            return [-1 if value & mask else round(value * multiplier, 1) for value in values]
+    elif limit is not None:
+        def decode(value):
+            return -1 if value >= limit else value * multiplier
+
+        def decode_many(values):
+            return [-1 if value >= limit else value * multiplier for value in values]
+    elif multiplier == 1:
+        def decode(value):
+            return -1 if value & mask else value
+
+        def decode_many(values):
+            return [-1 if value & mask else value for value in values]
+    else:
+        def decode(value):
+            return -1 if value & mask else value * multiplier
+
+        def decode_many(values):
+            return [-1 if value & mask else value * multiplier for value in values]
+
+    return ParamDecoder(decode, decode_many, mask, limit, multiplier, value_format, typecode)
+
+
+# While in CO2 calibration mode Aranet4 did not take new measurements and
+# stores Magic numbers in measurement history. Decoders check for them.
+PARAM_DECODERS = {
+    Param.TEMPERATURE: _compile_decoder(1 << 14, multiplier=0.05, typecode="d"),
+    Param.HUMIDITY: _compile_decoder(~0xFF, value_format="B", typecode="h"),
+    Param.PRESSURE: _compile_decoder(1 << 15, multiplier=0.1, typecode="d"),
+    Param.CO2: _compile_decoder(1 << 15, typecode="h"),
+    Param.HUMIDITY2: _compile_decoder(1 << 15, multiplier=0.1, typecode="d"),
+    # Pulses are not decoded, always invalid
+    Param.PULSES: _compile_decoder(limit=0),
+    # nSv
+    Param.RADIATION_DOSE: _compile_decoder(1 << 15, value_format="Hx", typecode="i"),
+    # nSv/h
+    Param.RADIATION_DOSE_RATE: _compile_decoder(1 << 15, multiplier=10, value_format="Hx", typecode="i"),
+    # nSv
+    Param.RADIATION_DOSE_INTEGRAL: _compile_decoder(1 << 63, value_format="Q"),
+    # Bq/m3. 0x1f00 general error, 0x1f01 no data, 0x1f02 Hi humidity in sensor chamber
+    Param.RADON_CONCENTRATION: _compile_decoder(limit=0x1f00, value_format="I", typecode="i"),
+}
+
+
 @dataclass
 class Aranet4HistoryDelegate:
     """
@@ -84,35 +169,95 @@ class Aranet4HistoryDelegate:
     size: int
     client: object
     result: list = field(default_factory=list)
+    use_numpy: bool = False
+    end: int = 0xFFFF
+    done: asyncio.Event = None
+    chunks: asyncio.Queue = None
 
     def __post_init__(self):
-        self.result = _empty_reading(self.size)
+        if self.chunks is None:
+            self.result = _empty_reading(self.size, PARAM_DECODERS[self.param].typecode)
+        self.done = asyncio.Event()
+        self.last_packet = time.monotonic()
 
     def handle_notification(self, sender: int, packet: bytes):
         """
         Method to use with Bleak's `start_notify` function.
         Takes data returned and process it before storing
         """
-        data_type, start, count = struct.unpack("<BHB", packet[:4])
+        self.last_packet = time.monotonic()
+        data_type, start, count = struct.unpack_from("<BHB", packet)
+        if self.param != data_type:
+            if count:
+                # Late end of data packet of previous parameter is ignored
+                print(f"ERROR: invalid parameter. Got {data_type:02X}, expected {self.param:02X}")
+            return
+
         if start > self.size or count == 0:
-            self.client.reading = False
+            self._finish()
             return
 
-        if self.param != data_type:
-            (
-                print(f"ERROR: invalid parameter. Got {data_type:02X}, expected {self.param:02X}")
-            )
+        first = start - 1
+        value_size = _history_struct(self.param, 1).size
+        count = min(count, (len(packet) - 4) // value_size, self.size - first)
+        if count > 0:
+            values = decode_history_values(self.param, packet, count, 4, self.use_numpy)
+            if self.chunks is None:
+                self.result[first:first + count] = values
+            else:
+                self.chunks.put_nowait(RecordChunk(self.param, start, values))
+        if first + count >= min(self.size, self.end):
+            self._finish()
+
+    def _finish(self):
+        if self.done.is_set():
             return
-        pattern = "<B" if data_type == Param.HUMIDITY else "<H"
+        self.client.reading = False
+        self.done.set()
+        if self.chunks is not None:
+            self.chunks.put_nowait(None)
+
+    def _time_left(self, packet_timeout: float, deadline: float) -> float:
+        """Time to wait for the next packet. Raises `Aranet4Error` if none is left"""
+        now = time.monotonic()
+        if now >= deadline:
+            raise Aranet4Error(f"History download of {self.param.name} timed out")
+        if now - self.last_packet >= packet_timeout:
+            raise Aranet4Error(
+                f"History download of {self.param.name} stalled for {packet_timeout} s"
+            )
+        return min(deadline - now, self.last_packet + packet_timeout - now)
+
+    async def wait(self, packet_timeout: float, deadline: float):
+        """
+        Wait until the final packet is received. Raises `Aranet4Error` if
+        there is no packet for `packet_timeout` seconds, or if download is
+        not finished until `deadline` (`time.monotonic()` value).
+        """
+        while not self.done.is_set():
+            timeout = self._time_left(packet_timeout, deadline)
+            try:
+                await asyncio.wait_for(self.done.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
 
-        data_values = struct.iter_unpack(pattern, packet[4:])
-        for idx, value in enumerate(data_values, start - 1):
-            if idx == start - 1 + count:
-                break
-            self.result[idx] = CurrentReading._set(self.param, value[0])
+    async def next_chunk(self, packet_timeout: float, deadline: float):
+        """
+        Wait for the next `RecordChunk` when created with `chunks` queue.
+        Returns `None` after the final packet. Timeouts same as in `wait`.
+        """
+        while True:
+            if not self.chunks.empty():
+                # Slow consumer must not be taken for a stalled device
+                return self.chunks.get_nowait()
+            timeout = self._time_left(packet_timeout, deadline)
+            try:
+                return await asyncio.wait_for(self.chunks.get(), timeout)
+            except asyncio.TimeoutError:
+                pass
 
 
-@dataclass
+@dataclass(slots=True)
 class CurrentReading:
     """dataclass to store the information when querying the devices current settings"""
 
@@ -249,11 +394,12 @@ class CurrentReading:
 
     def _decode_aranet4(self, value: tuple, gatt=False):
         """Process Aranet4 data - CO2, Temperature, Humidity, Pressure"""
+        decoders = PARAM_DECODERS
 
-        self.co2 = self._set(Param.CO2, value[0])
-        self.temperature = self._set(Param.TEMPERATURE, value[1])
-        self.pressure = self._set(Param.PRESSURE, value[2])
-        self.humidity = self._set(Param.HUMIDITY, value[3])
+        self.co2 = decoders[Param.CO2].decode(value[0])
+        self.temperature = decoders[Param.TEMPERATURE].decode(value[1])
+        self.pressure = decoders[Param.PRESSURE].decode(value[2])
+        self.humidity = decoders[Param.HUMIDITY].decode(value[3])
         self.battery = value[4]
         self.status = Color(value[5])
         # If extended data list
@@ -263,19 +409,20 @@ class CurrentReading:
 
     def _decode_aranet2(self, value: tuple, gatt=False):
         """Process Aranet2 data - Temperature, Humidity"""
+        decoders = PARAM_DECODERS
 
         # order from gatt and advertisements are different
         if gatt:
-            self.temperature = self._set(Param.TEMPERATURE, value[4])
-            self.humidity = self._set(Param.HUMIDITY2, value[5])
+            self.temperature = decoders[Param.TEMPERATURE].decode(value[4])
+            self.humidity = decoders[Param.HUMIDITY2].decode(value[5])
             self.battery = value[3]
             self.status_humidity = Status(value[6] & 0b0011)
             self.status_temperature = Status((value[6] & 0b1100) >> 2)
             self.interval = value[1]
             self.ago = value[2]
         else:
-            self.temperature = self._set(Param.TEMPERATURE, value[1])
-            self.humidity = self._set(Param.HUMIDITY2, value[3])
+            self.temperature = decoders[Param.TEMPERATURE].decode(value[1])
+            self.humidity = decoders[Param.HUMIDITY2].decode(value[3])
             self.status_humidity = Status(value[6] & 0b0011)
             self.status_temperature = Status((value[6] & 0b1100) >> 2)
             self.battery = value[5]
@@ -304,22 +451,23 @@ class CurrentReading:
 
     def _decode_aranetRn(self, value: tuple, gatt=False):
         """Process Aranet Radon data"""
+        decoders = PARAM_DECODERS
         # order from gatt and advertisements are different
         if gatt:
             self.battery = value[3]
-            self.temperature = self._set(Param.TEMPERATURE, value[4])
-            self.pressure = self._set(Param.PRESSURE, value[5])
-            self.humidity = self._set(Param.HUMIDITY2, value[6])
-            self.radon_concentration = self._set(Param.RADON_CONCENTRATION, value[7])
+            self.temperature = decoders[Param.TEMPERATURE].decode(value[4])
+            self.pressure = decoders[Param.PRESSURE].decode(value[5])
+            self.humidity = decoders[Param.HUMIDITY2].decode(value[6])
+            self.radon_concentration = decoders[Param.RADON_CONCENTRATION].decode(value[7])
             self.status = Color(value[8])
             self.radon_concentration_avg_24h = self._parse_avg_radon(value[9], value[10])["value"]
             self.radon_concentration_avg_7d = self._parse_avg_radon(value[11], value[12])["value"]
             self.radon_concentration_avg_30d = self._parse_avg_radon(value[13], value[14])["value"]
         else:
-            self.radon_concentration = self._set(Param.RADON_CONCENTRATION, value[0])
-            self.temperature = self._set(Param.TEMPERATURE, value[1])
-            self.pressure = self._set(Param.PRESSURE, value[2])
-            self.humidity = self._set(Param.HUMIDITY2, value[3])
+            self.radon_concentration = decoders[Param.RADON_CONCENTRATION].decode(value[0])
+            self.temperature = decoders[Param.TEMPERATURE].decode(value[1])
+            self.pressure = decoders[Param.PRESSURE].decode(value[2])
+            self.humidity = decoders[Param.HUMIDITY2].decode(value[3])
             self.battery = value[5]
             self.status = Color(value[6])
             self.interval = value[7]
@@ -350,51 +498,13 @@ class CurrentReading:
     @staticmethod
     def _set(param: Param, value: int):
         """
-        While in CO2 calibration mode Aranet4 did not take new measurements and
-        stores Magic numbers in measurement history.
-        Here data is converted with checking for Magic numbers.
+        Convert raw value of parameter, checking for invalid value flags.
+        Invalid values are returned as -1.
         """
-        invalid_reading_flag = True
-        multiplier = 1
-        if param == Param.CO2:
-            invalid_reading_flag = value >> 15 == 1
-            multiplier = 1
-        elif param == Param.PRESSURE:
-            invalid_reading_flag = value >> 15 == 1
-            multiplier = 0.1
-        elif param == Param.TEMPERATURE:
-            invalid_reading_flag = value >> 14 & 1 == 1
-            multiplier = 0.05
-        elif param == Param.HUMIDITY:
-            invalid_reading_flag = value >> 8
-            multiplier = 1
-        elif param == Param.HUMIDITY2:
-            invalid_reading_flag = value >> 15 == 1
-            multiplier = 0.1
-        elif param == Param.RADIATION_DOSE:
-            invalid_reading_flag = value >> 15 == 1
-            multiplier = 1  # nSv
-        elif param == Param.RADIATION_DOSE_RATE:
-            invalid_reading_flag = value >> 15 == 1
-            multiplier = 10  # nSv/h
-        elif param == Param.RADIATION_DOSE_INTEGRAL:
-            invalid_reading_flag = value >> 63 == 1
-            multiplier = 1  # nSv
-        elif param == Param.RADON_CONCENTRATION:
-            # 0x1f00 general error
-            # 0x1f01 no data
-            # 0x1f02 Hi humidity in sensor chamber
-            invalid_reading_flag = value >= 0x1f00
-            multiplier = 1  # Bq/m3
-
-        if invalid_reading_flag:
-            return -1
-        if isinstance(multiplier, float):
-            return round(value * multiplier, 1)
-        return value * multiplier
-
-
-@dataclass(order=True)
+        return PARAM_DECODERS[param].decode(value)
+
+
+@dataclass(order=True, slots=True)
 class Version:
     major: int = -1
     minor: int = -1
@@ -417,7 +527,11 @@ class CalibrationState(IntEnum):
     ERROR = 3
 
 
-@dataclass
+# Indexed by 2-bit state value, faster than enum lookup
+_CALIBRATION_STATES = tuple(CalibrationState)
+
+
+@dataclass(slots=True)
 class ManufacturerData:
     """dataclass to store manufacturer data"""
 
@@ -429,7 +543,7 @@ class ManufacturerData:
 
     def decode(self, value: tuple):
         self.disconnected = self._get_b(value[0], 0)
-        self.calibration_state = CalibrationState(self._get_uint2(value[0], 2))
+        self.calibration_state = _CALIBRATION_STATES[self._get_uint2(value[0], 2)]
         self.dfu_active = self._get_b(value[0], 4)
         self.integrations = self._get_b(value[0], 5)
         self.version = Version(value[3], value[2], value[1])
@@ -441,17 +555,34 @@ class ManufacturerData:
         return (value >> pos) & 0x03
 
 
-@dataclass
+_ADVERTISEMENT_NAMES = ("Aranet4", "Aranet2", "Aranet\u2622", "AranetRn")
+
+# Layouts of manufacturer data, following the device type byte
+_ADVERTISEMENT_INFO = struct.Struct("<BBBB")
+_ADVERTISEMENT_READINGS = {
+    aranet_type.value: (aranet_type, struct.Struct(value_fmt)) for aranet_type, value_fmt in (
+        (AranetType.ARANET4, "<xxxxxxxxHHHBBBHH"),
+        (AranetType.ARANET2, "<xxxxxxxHHHHBBBHHB"),
+        (AranetType.ARANET_RADIATION, "<xxxxxIIHBBBHHB"),
+        (AranetType.ARANET_RADON, "<xxxxxxxHHHHBBBHHB"),
+    )
+}
+
+
+@dataclass(slots=True)
 class Aranet4Advertisement:
     """dataclass to store the information aboud scanned aranet4 device"""
 
-    device: BLEDevice = None
+    device: "BLEDevice" = None
     readings: CurrentReading = None
     manufacturer_data: ManufacturerData = None
     rssi: int = None
 
     def __init__(self, device=None, ad_data=None):
         self.device = device
+        self.readings = None
+        self.manufacturer_data = None
+        self.rssi = None
 
         if device and ad_data:
             has_manufacturer_data = Aranet4.MANUFACTURER_ID in ad_data.manufacturer_data
@@ -459,50 +590,35 @@ class Aranet4Advertisement:
 
             if has_manufacturer_data:
                 mf_data = ManufacturerData()
-                raw_bytes = bytearray(ad_data.manufacturer_data[Aranet4.MANUFACTURER_ID])
+                raw_bytes = ad_data.manufacturer_data[Aranet4.MANUFACTURER_ID]
                 if len(raw_bytes) < 5:
                     # invalid manufacturer data
                     return
 
                 # Passive scan may return result with no name.
-                valid_name = device.name and device.name.startswith(("Aranet4", "Aranet2", "Aranet\u2622", "AranetRn"))
+                valid_name = device.name and device.name.startswith(_ADVERTISEMENT_NAMES)
                 cond_name = valid_name and device.name.startswith("Aranet4")
                 cond_len = not valid_name and len(raw_bytes) in [7, 22]
 
+                # Aranet4 data has no device type byte, read it from the start
                 if cond_name or cond_len:  # Should be Aranet4
-                    raw_bytes.insert(0, 0)
+                    aranetv = AranetType.ARANET4.value
+                    offset = 0
+                else:
+                    aranetv = raw_bytes[0]
+                    offset = 1
 
                 # Basic info
-                value_fmt = "<BBBB"
-                value = struct.unpack(value_fmt, raw_bytes[1:5])
-                mf_data.decode(value)
+                mf_data.decode(_ADVERTISEMENT_INFO.unpack_from(raw_bytes, offset))
                 self.manufacturer_data = mf_data
 
                 if not mf_data.integrations:
                     return
 
                 # Extended info / measurements
-                aranetv = raw_bytes[0]
-
-                if aranetv == 0:  # Aranet4
-                    value_fmt = "<xxxxxxxxxHHHBBBHH"
-                    aranetv = AranetType.ARANET4
-                elif aranetv == 1:  # Aranet2
-                    value_fmt = "<xxxxxxxxHHHHBBBHHB"
-                    aranetv = AranetType.ARANET2
-                elif aranetv == 2:  # Aranet Radiation
-                    value_fmt = "<xxxxxxIIHBBBHHB"
-                    aranetv = AranetType.ARANET_RADIATION
-                elif aranetv == 3:  # Aranet Radon
-                    value_fmt = "<xxxxxxxxHHHHBBBHHB"
-                    aranetv = AranetType.ARANET_RADON
-                else:
-                    value_fmt = ""
-                    aranetv = None
-
-                end = struct.calcsize(value_fmt)
-                if end > 0 and len(raw_bytes[:end]) == end:
-                    value = struct.unpack(value_fmt, raw_bytes[:end])
+                aranetv, layout = _ADVERTISEMENT_READINGS.get(aranetv, (None, None))
+                if layout is not None and len(raw_bytes) - offset >= layout.size:
+                    value = layout.unpack_from(raw_bytes, offset)
                     self.readings = CurrentReading()
                     self.readings.name = device.name
                     self.readings.decode(value, aranetv)
@@ -510,47 +626,7 @@ class Aranet4Advertisement:
                     mf_data.integrations = False
 
 
-@dataclass
-class RecordItem:
-    """dataclass to store historical records"""
-
-    date: datetime
-    temperature: float
-    humidity: int
-    pressure: float
-    co2: int
-    rad_dose: float
-    rad_dose_rate: float
-    rad_dose_total: float
-    radon_concentration: int
-
-
-@dataclass
-class Filter:
-    """dataclass to store log filter information"""
-
-    begin: int
-    end: int
-    incl_temperature: bool
-    incl_humidity: int
-    incl_pressure: bool
-    incl_co2: bool
-    incl_rad_dose: bool
-    incl_rad_dose_rate: bool
-    incl_rad_dose_total: bool
-    incl_radon_concentration: bool
-
-
-@dataclass
-class Record:
-    name: str
-    version: str
-    records_on_device: int
-    filter: Filter
-    value: list[RecordItem] = field(default_factory=list)
-
-
-@dataclass
+@dataclass(slots=True)
 class SensorState:
     """dataclass to store sensor state values"""
 
@@ -640,8 +716,144 @@ class HistoryHeader(NamedTuple):
     count: int
 
 
-def _empty_reading(size):
-    return [-1] * size
+class RecordChunk(NamedTuple):
+    """Consecutive datapoints of one parameter, as received in one packet"""
+
+    param: Param
+    start: int  # Index of the first datapoint, counted from 1
+    values: array
+
+
+class SettingResult(NamedTuple):
+    """
+    Outcome of one setting written by `Aranet4.apply_settings`. `actual`
+    is value read back from device, None if not verified.
+    """
+
+    name: str  # "interval", "range" or "integrations"
+    requested: object
+    actual: object = None
+    verified: bool = False
+
+    @property
+    def ok(self) -> bool:
+        """Setting was written and, if verified, read back as requested"""
+        return not self.verified or self.actual == self.requested
+
+
+# Upper bounds in seconds of GATT operation latency histogram buckets
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class GattOperation(NamedTuple):
+    """Single GATT operation of `Aranet4`, as passed to `on_operation` hook"""
+
+    kind: str  # connect, disconnect, read, write, notify, start_notify or stop_notify
+    uuid: str  # Characteristic, None for connect and disconnect
+    seconds: float  # Notification: time since the previous packet or request
+    size: int  # Bytes transferred
+    error: bool  # Raised exception or was cancelled
+
+
+@dataclass
+class OperationStats:
+    """Count, transferred bytes and latency of one kind of GATT operation"""
+
+    count: int = 0
+    errors: int = 0
+    bytes: int = 0
+    seconds: float = 0.0
+    # Operations by `LATENCY_BUCKETS` upper bound, the last are slower than all
+    histogram: list = field(default_factory=lambda: [0] * (len(LATENCY_BUCKETS) + 1))
+
+    def add(self, operation: GattOperation):
+        self.count += 1
+        self.errors += operation.error
+        self.bytes += operation.size
+        self.seconds += operation.seconds
+        self.histogram[bisect.bisect_left(LATENCY_BUCKETS, operation.seconds)] += 1
+
+
+@dataclass
+class GattStats:
+    """
+    GATT operations of `Aranet4` connection. Statistics of operations are
+    kept by kind and characteristic UUID in `operations`. Connect time
+    includes service discovery, which Bleak does while connecting.
+    """
+
+    operations: dict = field(default_factory=dict)
+    # History packets received, v2 reads without data are counted as empty reads
+    history_packets: int = 0
+    # History v2 reads that returned no data, and seconds spent on them
+    empty_reads: int = 0
+    stall_time: float = 0.0
+
+    def add(self, operation: GattOperation):
+        key = (operation.kind, operation.uuid)
+        stats = self.operations.get(key)
+        if stats is None:
+            stats = self.operations[key] = OperationStats()
+        stats.add(operation)
+
+    def total(self, kind: str) -> OperationStats:
+        """Statistics of all operations of `kind`"""
+        total = OperationStats()
+        for (op_kind, _), stats in self.operations.items():
+            if op_kind == kind:
+                total.count += stats.count
+                total.errors += stats.errors
+                total.bytes += stats.bytes
+                total.seconds += stats.seconds
+                total.histogram = [a + b for a, b in zip(total.histogram, stats.histogram)]
+        return total
+
+    def to_dict(self) -> dict:
+        """JSON serializable statistics, characteristics by `Aranet4` name"""
+        names = _characteristic_names()
+        return {
+            "operations": [
+                {"kind": kind, "characteristic": names.get(uuid, uuid), **asdict(stats)}
+                for (kind, uuid), stats in self.operations.items()
+            ],
+            "latency_buckets": list(LATENCY_BUCKETS),
+            "history_packets": self.history_packets,
+            "empty_reads": self.empty_reads,
+            "stall_time": self.stall_time,
+        }
+
+
+@functools.lru_cache(maxsize=1)
+def _characteristic_names() -> dict:
+    """Characteristic UUID and lower case name of `Aranet4.CHARACTERISTIC_` constant"""
+    prefix = "CHARACTERISTIC_"
+    return {
+        uuid: name[len(prefix):].lower()
+        for name, uuid in vars(Aranet4).items() if name.startswith(prefix)
+    }
+
+
+# `RecordItem` field name of each history parameter
+_PARAM_FIELDS = {
+    Param.TEMPERATURE: "temperature",
+    Param.HUMIDITY: "humidity",
+    Param.HUMIDITY2: "humidity",
+    Param.PRESSURE: "pressure",
+    Param.CO2: "co2",
+    Param.RADIATION_DOSE: "rad_dose",
+    Param.RADIATION_DOSE_RATE: "rad_dose_rate",
+    Param.RADIATION_DOSE_INTEGRAL: "rad_dose_total",
+    Param.RADON_CONCENTRATION: "radon_concentration",
+}
+
+
+def _uuid16(value: int) -> str:
+    """Full UUID of 16-bit Bluetooth SIG assigned number, as `bleak.uuids.normalize_uuid_16`"""
+    return f"0000{value:04x}-0000-1000-8000-00805f9b34fb"
+
+
+def _empty_reading(size, typecode="q"):
+    return array(typecode, [-1]) * size
 
 
 class Aranet4:
@@ -649,36 +861,40 @@ class Aranet4:
     # Param return value if no data
     AR4_NO_DATA_FOR_PARAM = -1
 
+    # Delay limits in seconds between history v2 reads, while device prepares data
+    READ_BACKOFF_MIN = 0.01
+    READ_BACKOFF_MAX = 0.2
+
     # Company Identifier (Akciju sabiedriba "SAF TEHNIKA")
     MANUFACTURER_ID = 0x0702
 
     # GAP Service
-    SERVICE_GAP = normalize_uuid_16(0x1800)
+    SERVICE_GAP = _uuid16(0x1800)
 
     # GAP Service Characteristics
-    CHARACTERISTIC_DEVICE_NAME = normalize_uuid_16(0x2a00)
-    CHARACTERISTIC_APPEARANCE = normalize_uuid_16(0x2a01)
+    CHARACTERISTIC_DEVICE_NAME = _uuid16(0x2a00)
+    CHARACTERISTIC_APPEARANCE = _uuid16(0x2a01)
 
     # Device Information Service
-    SERVICE_DIS = normalize_uuid_16(0x180a)
+    SERVICE_DIS = _uuid16(0x180a)
 
     # Device Information Service Characteristics
-    CHARACTERISTIC_SYSTEM_ID = normalize_uuid_16(0x2a23)
-    CHARACTERISTIC_MODEL_NUMBER = normalize_uuid_16(0x2a24)
-    CHARACTERISTIC_SERIAL_NO = normalize_uuid_16(0x2a25)
-    CHARACTERISTIC_SW_REV = normalize_uuid_16(0x2a26)
-    CHARACTERISTIC_HW_REV = normalize_uuid_16(0x2a27)
-    CHARACTERISTIC_SW_REV_FACTORY = normalize_uuid_16(0x2a28)
-    CHARACTERISTIC_MANUFACTURER_NAME = normalize_uuid_16(0x2a29)
+    CHARACTERISTIC_SYSTEM_ID = _uuid16(0x2a23)
+    CHARACTERISTIC_MODEL_NUMBER = _uuid16(0x2a24)
+    CHARACTERISTIC_SERIAL_NO = _uuid16(0x2a25)
+    CHARACTERISTIC_SW_REV = _uuid16(0x2a26)
+    CHARACTERISTIC_HW_REV = _uuid16(0x2a27)
+    CHARACTERISTIC_SW_REV_FACTORY = _uuid16(0x2a28)
+    CHARACTERISTIC_MANUFACTURER_NAME = _uuid16(0x2a29)
 
     # Battery Service
-    SERVICE_BATTERY = normalize_uuid_16(0x180f)
+    SERVICE_BATTERY = _uuid16(0x180f)
 
     # Battery Service Characteristics
-    CHARACTERISTIC_BATTERY_LEVEL = normalize_uuid_16(0x2a19)
+    CHARACTERISTIC_BATTERY_LEVEL = _uuid16(0x2a19)
 
     # SAF Tehnika Service
-    SERVICE_SAF_TEHNIKA = normalize_uuid_16(0xfce0)  # v1.2.0 and later
+    SERVICE_SAF_TEHNIKA = _uuid16(0xfce0)  # v1.2.0 and later
     SERVICE_SAF_TEHNIKA_OLD = "f0cd1400-95da-4f4b-9ac8-aa55d312af0c"  # until v1.2.0
 
     # SAF Tehnika Service Characteristics (Aranet2 has different readings characteristic uuids)
@@ -697,7 +913,7 @@ class Aranet4:
     CHARACTERISTIC_CURRENT_READINGS_A_AR2 = "f0cd3003-95da-4f4b-9ac8-aa55d312af0c"  # Aranet2 Only
 
     # Nordic Semiconductor ASA Service
-    SERVICE_NORDIC_SEMICONDUCTOR = normalize_uuid_16(0xfe59)
+    SERVICE_NORDIC_SEMICONDUCTOR = _uuid16(0xfe59)
 
     # Nordic Semiconductor ASA Service Characteristics
     CHARACTERISTIC_SECURE_DFU = "8ec90003-f315-4f60-9fb8-838830daea50"
@@ -707,13 +923,31 @@ class Aranet4:
     REGEX_UUID = "[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}"
     REGEX_ADDR = f"({REGEX_MAC})|({REGEX_UUID})"
 
-    def __init__(self, address: str):
+    def __init__(self, address: str, client=None):
+        """
+        `client` : Connection used in place of `BleakClient`, such as
+        `simulator.SimulatedDevice`
+        """
         if not re.match(self.REGEX_ADDR, address.lower()):
             raise Aranet4Error("Invalid device address")
 
         self.address = address
-        self.device = BleakClient(address)
+        if client is None:
+            client = _bleak("BleakClient")(address)
+        self.device = client
         self.reading = True
+        self.record_timings = {}
+        # Decode history with NumPy, if installed
+        self.use_numpy = False
+        # Seconds given to download history, and to wait for the next packet
+        self.history_timeout = 300
+        self.packet_timeout = 10
+        # GATT operation statistics, can be shared by several clients, and
+        # function called with `GattOperation` after every operation
+        self.stats = GattStats()
+        self.on_operation = None
+        # `MetadataCache` of static device details, read over GATT if None
+        self.metadata = None
 
     def __del__(self):
         """Close remote"""
@@ -726,7 +960,48 @@ class Aranet4:
 
     async def connect(self):
         """Connect to remote device"""
-        await self.device.connect()
+        await self._gatt("connect", None, self.device.connect())
+
+    async def disconnect(self):
+        """Disconnect from remote device"""
+        await self._gatt("disconnect", None, self.device.disconnect())
+
+    async def _gatt(self, kind: str, uuid: str, operation, size: int = 0):
+        """Await GATT `operation` and record it in `stats`"""
+        started = time.monotonic()
+        try:
+            result = await operation
+        except BaseException:
+            self._record(GattOperation(kind, uuid, time.monotonic() - started, size, True))
+            raise
+        if kind == "read":
+            size = len(result)
+        self._record(GattOperation(kind, uuid, time.monotonic() - started, size, False))
+        return result
+
+    def _record(self, operation: GattOperation):
+        self.stats.add(operation)
+        if self.on_operation:
+            self.on_operation(operation)
+
+    async def _read(self, uuid: str) -> bytearray:
+        return await self._gatt("read", uuid, self.device.read_gatt_char(uuid))
+
+    async def _write(self, uuid: str, data: bytes):
+        await self._gatt("write", uuid, self.device.write_gatt_char(uuid, data, True), len(data))
+
+    async def __aenter__(self):
+        """Stay connected for the duration of `async with` block"""
+        try:
+            await self.connect()
+        except BaseException:
+            # Connection attempt could be cancelled half way
+            await _disconnect_quietly(self)
+            raise
+        return self
+
+    async def __aexit__(self, exc_type, exc, traceback):
+        await _disconnect_quietly(self)
 
     async def current_readings(self, details: bool = False):
         """Extract current readings from remote device"""
@@ -738,7 +1013,7 @@ class Aranet4:
 
         if new_aranet_char:
             uuid = self.CHARACTERISTIC_CURRENT_READINGS_AR2
-            raw_bytes = await self.device.read_gatt_char(uuid)
+            raw_bytes = await self._read(uuid)
 
             isRadon = raw_bytes[0] == 3
             isNucleo = raw_bytes[0] == 4
@@ -768,43 +1043,55 @@ class Aranet4:
                 # co2, temp, pressure, humidity, battery, status
                 value_fmt = "<HHHBBB"
 
-            raw_bytes = await self.device.read_gatt_char(uuid)
+            raw_bytes = await self._read(uuid)
             value = struct.unpack(value_fmt, raw_bytes)
             readings.decode(value, AranetType.ARANET4)
         return readings
 
     async def get_interval(self) -> int:
         """Get the value for how often datapoints are logged on device"""
-        raw_bytes = await self.device.read_gatt_char(self.CHARACTERISTIC_INTERVAL)
+        raw_bytes = await self._read(self.CHARACTERISTIC_INTERVAL)
         return int.from_bytes(raw_bytes, byteorder="little")
 
     async def get_name(self):
         """Get name of remote device"""
         try:
-            raw_bytes = await self.device.read_gatt_char(self.CHARACTERISTIC_DEVICE_NAME)
+            raw_bytes = await self._read(self.CHARACTERISTIC_DEVICE_NAME)
             return raw_bytes.decode("utf-8")
         except Exception:
             # fallback to model + serial number
-            model = await self.device.read_gatt_char(self.CHARACTERISTIC_MODEL_NUMBER)
-            serial = await self.device.read_gatt_char(self.CHARACTERISTIC_SERIAL_NO)
+            model = await self._read(self.CHARACTERISTIC_MODEL_NUMBER)
+            serial = await self._read(self.CHARACTERISTIC_SERIAL_NO)
             return "{} {}".format(model.decode("utf-8"), serial.decode("utf-8"))
 
     async def get_version(self):
         """Get firmware version of remote device"""
-        raw_bytes = await self.device.read_gatt_char(self.CHARACTERISTIC_SW_REV)
+        raw_bytes = await self._read(self.CHARACTERISTIC_SW_REV)
         return raw_bytes.decode("utf-8")
 
+    async def get_device_info(self) -> DeviceInfo:
+        """Name and version of device, from `metadata` cache if it has them"""
+        if self.metadata is not None:
+            info = self.metadata.get(self.address)
+            if info is not None:
+                return info
+
+        info = DeviceInfo(self.address, await self.get_name(), await self.get_version())
+        if self.metadata is not None:
+            self.metadata.put(info)
+        return info
+
     async def get_seconds_since_update(self):
         """
         Get the value for how long (in seconds) has passed since last
         datapoint was logged
         """
-        raw_bytes = await self.device.read_gatt_char(self.CHARACTERISTIC_SECONDS_SINCE_UPDATE)
+        raw_bytes = await self._read(self.CHARACTERISTIC_SECONDS_SINCE_UPDATE)
         return int.from_bytes(raw_bytes, byteorder="little")
 
     async def get_total_readings(self):
         """Return the count of how many datapoints are logged on device"""
-        raw_bytes = await self.device.read_gatt_char(self.CHARACTERISTIC_TOTAL_READINGS)
+        raw_bytes = await self._read(self.CHARACTERISTIC_TOTAL_READINGS)
         return int.from_bytes(raw_bytes, byteorder="little")
 
     async def get_last_measurement_date(self, use_epoch: bool = False):
@@ -825,89 +1112,70 @@ class Aranet4:
         List will be length of "total datapoints". If index is outside `start`
         and `end` request then default of `-1` is returned for those datapoints.
         """
+        results = await self.get_records_batch([param], log_size, start, end)
+        return results[param]
 
+    async def get_records_batch(
+        self, params: list, log_size: int, start: int = 0x0001, end: int = 0xFFFF
+    ) -> dict:
+        """
+        Download datapoints of several parameters in one connection.
+        Request for the next parameter is sent as soon as the last packet
+        of the previous one arrives. Returns dictionary of `Param` and ordered
+        list of datapoints, same as `get_records`. Download time of each
+        parameter in seconds is stored in `record_timings`.
+        """
+        return await _collect_records(self.iter_records(params, log_size, start, end), params, log_size)
+
+    async def iter_records(
+        self, params: list, log_size: int, start: int = 0x0001, end: int = 0xFFFF
+    ):
+        """
+        Async generator of datapoints of several parameters, same as
+        `get_records_batch`. Yields `RecordChunk` of each history packet
+        as soon as it is received, so whole log is never held in memory.
+        Chunk can extend one datapoint past `end`.
+        """
         history_v2 = self.device.services.get_characteristic(
             self.CHARACTERISTIC_HISTORY_READINGS_V2
         )
 
         if history_v2 is not None:
-            return await self._get_records_v2(param, log_size, start, end)
-
-        return await self._get_records_v1(param, log_size, start, end)
+            chunks = self._iter_records_v2(params, log_size, start, end)
+        else:
+            chunks = self._iter_records_v1(params, log_size, start, end)
+        async with contextlib.aclosing(chunks):
+            async for chunk in chunks:
+                yield chunk
 
     async def _get_records_v2(
         self, param: Param, log_size: int, start: int = 0x0001, end: int = 0xFFFF
     ):
-        """
-        Return ordered list of datapoints for requested parameter.
-        List will be length of "total datapoints". If index is outside `start`
-        and `end` request then default of `-1` is returned for those datapoints.
-        """
-        start = max(start, 0x0001)
+        """Same as `get_records`, using history characteristic v2"""
+        chunks = self._iter_records_v2([param], log_size, start, end)
+        results = await _collect_records(chunks, [param], log_size)
+        return results[param]
+
+    async def _get_records_v1(
+        self, param: Param, log_size: int, start: int = 0x0001, end: int = 0xFFFF
+    ):
+        """Same as `get_records`, using history characteristic v1 notifications"""
+        chunks = self._iter_records_v1([param], log_size, start, end)
+        results = await _collect_records(chunks, [param], log_size)
+        return results[param]
 
+    async def _request_records_v2(self, param: Param, start: int):
+        """Send history request for parameter, read by history characteristic v2"""
         header = 0x61
         val = struct.pack("<BBH", header, param.value, start)
         # Request command: b"\x61\x01\x01\x00"
         # for temperature from start at 1
         # Request command: b"\x61\x04\xde\x01"
         # for co2 from start at 478
+        await self._write(self.CHARACTERISTIC_CMD, val)
 
-        result = _empty_reading(log_size)
-
-        await self.device.write_gatt_char(self.CHARACTERISTIC_CMD, val, True)
-
-        reading = True
-        while reading:
-            packet = await self.device.read_gatt_char(
-                self.CHARACTERISTIC_HISTORY_READINGS_V2
-            )
-
-            header = HistoryHeader(*struct.unpack("<BHHHHB", packet[:10]))
-            packet = packet[10:]
-
-            if header.param != param.value or header.count == 0:
-                await asyncio.sleep(0.1)
-                continue
-
-            if param.value == Param.HUMIDITY:
-                pattern = "<B"
-            elif param.value == Param.RADIATION_DOSE:
-                pattern = "<Hx"
-            elif param.value == Param.RADIATION_DOSE_RATE:
-                pattern = "<Hx"
-            elif param.value == Param.RADIATION_DOSE_INTEGRAL:
-                pattern = "<Q"
-            elif param.value == Param.RADON_CONCENTRATION:
-                pattern = "<I"
-            else:
-                pattern = "<H"
-
-            # trim to multiples of pattern size
-            plen = len(packet)
-            packet = packet[:plen - plen % struct.calcsize(pattern)]
-
-            # extract values
-            data_values = struct.iter_unpack(pattern, packet)
-            for idx, value in enumerate(data_values, header.start - 1):
-                if idx > end or idx == header.start - 1 + header.count:
-                    break
-                result[idx] = CurrentReading._set(param, value[0])
-
-            if idx >= end or (header.start - 1 + header.count) == log_size:
-                reading = False
-
-        return result
-
-    async def _get_records_v1(
-        self, param: Param, log_size: int, start: int = 0x0001, end: int = 0xFFFF
-    ):
-        """
-        Return ordered list of datapoints for requested parameter.
-        List will be length of "total datapoints". If index is outside `start`
-        and `end` request then default of `-1` is returned for those datapoints.
-        """
-        start = max(start, 0x0001)
-
+    async def _request_records_v1(self, param: Param, start: int, end: int):
+        """Send history request for parameter, sent as v1 notifications"""
         header = 0x82
         unknown = 0x00
         val = struct.pack("<BBHHH", header, param.value, unknown, start, end)
@@ -915,127 +1183,311 @@ class Aranet4:
         # for temperature from start at 1 and ending 2016
         # Request command: b"\x82\x04\x00\x00\xde\x01\x3d\x05"
         # for co2 from start at 478 and end 1341
+        await self._write(self.CHARACTERISTIC_CMD, val)
 
-        # register delegate
-        delegate = Aranet4HistoryDelegate(
-            self.CHARACTERISTIC_HISTORY_READINGS_V1, param, log_size, self
-        )
+    async def _iter_records_v2(
+        self, params: list, log_size: int, start: int = 0x0001, end: int = 0xFFFF
+    ):
+        """Download parameters back-to-back using history characteristic v2"""
+        start = max(start, 0x0001)
+        self.record_timings = {}
+        if not params:
+            return
 
-        await self.device.write_gatt_char(self.CHARACTERISTIC_CMD, val, True)
-        self.reading = True
-        await self.device.start_notify(
-            self.CHARACTERISTIC_HISTORY_READINGS_V1, delegate.handle_notification
-        )
-        while self.reading:
-            await asyncio.sleep(0.1)
-        await self.device.stop_notify(self.CHARACTERISTIC_HISTORY_READINGS_V1)
-        return delegate.result
+        await self._request_records_v2(params[0], start)
+        started = time.monotonic()
+        deadline = started + self.history_timeout
+
+        for pos, param in enumerate(params):
+            stalled = None
+            backoff = 0
+
+            reading = True
+            while reading:
+                packet = await self._read(
+                    self.CHARACTERISTIC_HISTORY_READINGS_V2
+                )
+
+                header = HistoryHeader(*struct.unpack_from("<BHHHHB", packet))
+
+                if header.param != param.value or header.count == 0:
+                    # Device is still preparing data. Retry at once, then back
+                    # off exponentially, so slow devices are not flooded.
+                    now = time.monotonic()
+                    self.stats.empty_reads += 1
+                    if stalled is None:
+                        stalled = now
+                    if now >= deadline:
+                        self.stats.stall_time += now - stalled
+                        raise Aranet4Error(f"History download of {param.name} timed out")
+                    if now - stalled >= self.packet_timeout:
+                        self.stats.stall_time += now - stalled
+                        raise Aranet4Error(
+                            f"History download of {param.name} stalled for {self.packet_timeout} s"
+                        )
+                    await asyncio.sleep(backoff)
+                    backoff = min(max(backoff * 2, self.READ_BACKOFF_MIN), self.READ_BACKOFF_MAX)
+                    continue
+
+                if stalled is not None:
+                    self.stats.stall_time += time.monotonic() - stalled
+                    stalled = None
+                    backoff = 0
+                self.stats.history_packets += 1
+
+                reading = header.start - 1 + header.count < min(end, log_size)
+                if not reading:
+                    finished = time.monotonic()
+                    self.record_timings[param] = finished - started
+                    started = finished
+                    if pos + 1 < len(params):
+                        # Device prepares next parameter while this packet is decoded
+                        await self._request_records_v2(params[pos + 1], start)
+
+                chunk = _decode_records_v2(param, header, packet, log_size, end, self.use_numpy)
+                if chunk is not None:
+                    yield chunk
+
+    async def _iter_records_v1(
+        self, params: list, log_size: int, start: int = 0x0001, end: int = 0xFFFF
+    ):
+        """
+        Download parameters back-to-back using history characteristic v1.
+        Notifications stay enabled for the whole batch.
+        """
+        start = max(start, 0x0001)
+        self.record_timings = {}
+        deadline = time.monotonic() + self.history_timeout
+        delegate = None
+        uuid = self.CHARACTERISTIC_HISTORY_READINGS_V1
+        last_packet = time.monotonic()
+
+        def handle_notification(sender, packet):
+            nonlocal last_packet
+            now = time.monotonic()
+            self.stats.history_packets += 1
+            self._record(GattOperation("notify", uuid, now - last_packet, len(packet), False))
+            last_packet = now
+            delegate.handle_notification(sender, packet)
+
+        notifying = False
+        try:
+            for param in params:
+                started = time.monotonic()
+                # register delegate
+                delegate = Aranet4HistoryDelegate(
+                    self.CHARACTERISTIC_HISTORY_READINGS_V1, param, log_size, self,
+                    use_numpy=self.use_numpy, end=end, chunks=asyncio.Queue()
+                )
+
+                self.reading = True
+                await self._request_records_v1(param, start, end)
+                last_packet = time.monotonic()
+                if not notifying:
+                    await self._gatt(
+                        "start_notify", uuid, self.device.start_notify(uuid, handle_notification)
+                    )
+                    notifying = True
+
+                while True:
+                    chunk = await delegate.next_chunk(self.packet_timeout, deadline)
+                    if chunk is None:
+                        break
+                    yield chunk
+
+                self.record_timings[param] = time.monotonic() - started
+        finally:
+            if notifying:
+                await self._gatt("stop_notify", uuid, self.device.stop_notify(uuid))
+
+    async def apply_settings(
+        self, interval: int = None, extended_range: bool = None,
+        integrations: bool = None, verify: bool = True
+    ) -> dict:
+        """
+        Change settings that are not None. Commands are written back-to-back,
+        then verified with one sensor state and one interval read.
+        Returns dictionary of setting name and `SettingResult`.
+        `interval` : logging interval in minutes
+        """
+        commands = []
+        if interval is not None:
+            commands.append(("interval", interval, struct.pack("<BB", 0x90, interval)))
+        if extended_range is not None:
+            commands.append(("range", extended_range, struct.pack("<BB", 0x92, 1 if extended_range else 0)))
+        if integrations is not None:
+            commands.append(("integrations", integrations, struct.pack("<BB", 0x91, 1 if integrations else 0)))
+
+        for _, _, command in commands:
+            await self._write(self.CHARACTERISTIC_CMD, command)
+
+        results = {name: SettingResult(name, requested) for name, requested, _ in commands}
+        if not verify:
+            return results
+
+        actual = {}
+        if interval is not None:
+            actual["interval"] = await self.get_interval() / 60
+        if extended_range is not None or integrations is not None:
+            state = await self.get_sensor_state()
+            actual["range"] = state.bluetoothRange == "extended"
+            actual["integrations"] = state.isOpenForIntegration
+        return {
+            name: result._replace(actual=actual[name], verified=True)
+            for name, result in results.items()
+        }
 
     async def set_readings_interval(self, interval: int, verify: bool = True):
         """Set reading interval"""
-        header = 0x90
-        val = struct.pack("<BB", header, interval)
-        await self.device.write_gatt_char(self.CHARACTERISTIC_CMD, val, True)
-        if verify:
-            iv = await self.get_interval()
-            return interval == (iv / 60)
-        return True
+        results = await self.apply_settings(interval=interval, verify=verify)
+        return results["interval"].ok
 
     async def set_home_integration_enabled(self, enabled: bool, verify: bool = True):
         """
         Toggle smart home integrations.
         This is required to receive measurements in advertisements.
         """
-        header = 0x91
-        val = struct.pack("<BB", header, 1 if enabled else 0)
-        await self.device.write_gatt_char(self.CHARACTERISTIC_CMD, val, True)
-        if verify:
-            state = await self.get_sensor_state()
-            return enabled == state.isOpenForIntegration
-        return True
+        results = await self.apply_settings(integrations=enabled, verify=verify)
+        return results["integrations"].ok
 
     async def set_bluetooth_range(self, extended: bool, verify: bool = True):
         """Set bluetooth range"""
-        header = 0x92
-        val = struct.pack("<BB", header, 1 if extended else 0)
-        await self.device.write_gatt_char(self.CHARACTERISTIC_CMD, val, True)
-        if verify:
-            state = await self.get_sensor_state()
-            if extended:
-                return state.bluetoothRange == "extended"
-            return state.bluetoothRange == "normal"
+        results = await self.apply_settings(extended_range=extended, verify=verify)
+        return results["range"].ok
 
     async def get_sensor_state(self):
         """Return the count of how many datapoints are logged on device"""
-        raw_bytes = await self.device.read_gatt_char(self.CHARACTERISTIC_SENSOR_STATE)
+        raw_bytes = await self._read(self.CHARACTERISTIC_SENSOR_STATE)
         state = SensorState()
         state.decode(raw_bytes)
         return state
 
 
-def _log_times(now, total, interval, ago):
-    """Calculate the actual times datapoints were logged on device"""
-    times = []
-    start = now - datetime.timedelta(seconds=((total - 1) * interval) + ago)
-    for idx in range(total):
-        times.append(start + datetime.timedelta(seconds=interval * idx))
-    return times
+@functools.lru_cache(maxsize=1024)
+def _history_struct(param: Param, count: int) -> struct.Struct:
+    """Precompiled struct for `count` history datapoints of parameter"""
+    return struct.Struct("<" + PARAM_DECODERS[param].value_format * count)
 
 
-def _attach_tzinfo(dt: datetime) -> datetime:
-    if dt and not dt.tzinfo:
-        now = datetime.datetime.now().astimezone()
-        dt = dt.replace(tzinfo=now.tzinfo)
-    return dt
+def decode_history_values(
+    param: Param, payload, count: int, offset: int = 0, use_numpy: bool = False
+) -> array:
+    """
+    Decode `count` history datapoints of `param` from `payload` buffer,
+    starting at `offset`. Whole payload is converted in one pass, without
+    copying it. Invalid datapoints are returned as `-1`.
+    """
+    if use_numpy:
+        return _decode_history_values_numpy(param, payload, count, offset)
+
+    decoder = PARAM_DECODERS[param]
+    raw = _history_struct(param, count).unpack_from(payload, offset)
+    return array(decoder.typecode, decoder.decode_many(raw))
+
+
+def _decode_history_values_numpy(param: Param, payload, count: int, offset: int) -> array:
+    """Same as `decode_history_values`, using NumPy"""
+    import numpy
+
+    decoder = PARAM_DECODERS[param]
+    dtype = numpy.dtype({
+        "names": ["value"],
+        "formats": ["<" + {"B": "u1", "H": "u2", "I": "u4", "Q": "u8"}[decoder.value_format[0]]],
+        "itemsize": struct.calcsize("<" + decoder.value_format),
+    })
+    raw = numpy.frombuffer(payload, dtype=dtype, count=count, offset=offset)["value"]
+    if raw.dtype.itemsize < 8:
+        # Widen, so invalid value masks fit
+        raw = raw.astype(numpy.int64)
+
+    if isinstance(decoder.multiplier, float):
+        values = _numpy_scaling_table(param)[raw]
+    else:
+        invalid = (raw >= decoder.limit) if decoder.limit is not None else (raw & decoder.mask) != 0
+        values = numpy.where(invalid, -1, raw.astype(numpy.int64) * decoder.multiplier)
+    return array(decoder.typecode, values.astype(decoder.typecode).tobytes())
 
 
-def _calc_start_end(datapoint_times: int, entry_filter):
+@functools.lru_cache(maxsize=None)
+def _numpy_scaling_table(param: Param):
     """
-    Apply filters to get required start and end datapoint.
-    `entry_filter` is a dictionary that can have the following values:
-        `last`: int : Get last n entries
-        `start`: datetime : Get entries after specified time
-        `end`: datetime : Get entries before specified time
+    Lookup table of every 16-bit datapoint value. NumPy rounding differs
+    from Python's `round`, so values are rounded by Python once.
     """
-    last_n_entries = entry_filter.get("last")
-    filter_start = _attach_tzinfo(entry_filter.get("start"))
-    filter_end = _attach_tzinfo(entry_filter.get("end"))
-    start = 0x0001
-    end = len(datapoint_times)
-    if last_n_entries:
-        # Result is inclusive so reduce count back by 1
-        start = max(end - last_n_entries + 1, start)
-    if filter_start:
-        time_start = -1
-        for idx, timestamp in enumerate(datapoint_times, start=1):
-            if filter_start <= timestamp:
-                time_start = idx
-                break
-        if 0 < time_start <= end:
-            start = time_start
-        else:
-            start = -1  # out of range
-    if filter_end:
-        time_end = -1
-        for idx, timestamp in enumerate(datapoint_times, start=1):
-            if timestamp <= filter_end:
-                time_end = idx
-            else:
-                break
-        if start <= time_end <= end:
-            end = time_end
-        else:
-            end = -1  # out of range
-    return start, end
+    import numpy
+
+    return numpy.array(PARAM_DECODERS[param].decode_many(range(0x10000)))
+
+
+def _decode_records_v2(
+    param: Param, header: HistoryHeader, packet, size: int, end: int, use_numpy: bool = False
+):
+    """Decode datapoints of history v2 packet. Returns `RecordChunk` or `None`"""
+    first = header.start - 1
+    value_size = _history_struct(param, 1).size
+    count = min(
+        header.count,
+        (len(packet) - 10) // value_size,
+        end - first + 1,
+        size - first,
+    )
+    if count <= 0:
+        return None
+    values = decode_history_values(param, packet, count, 10, use_numpy)
+    return RecordChunk(param, header.start, values)
+
+
+async def _collect_records(chunks, params: list, log_size: int) -> dict:
+    """Store `RecordChunk`s of async generator in one array per parameter"""
+    results = {
+        param: _empty_reading(log_size, PARAM_DECODERS[param].typecode) for param in params
+    }
+    async with contextlib.aclosing(chunks):
+        async for chunk in chunks:
+            first = chunk.start - 1
+            results[chunk.param][first:first + len(chunk.values)] = chunk.values
+    return results
+
+
+async def _disconnect_quietly(monitor: Aranet4):
+    """Disconnect if still connected, ignoring errors of already broken link"""
+    try:
+        if monitor.device.is_connected:
+            await monitor.disconnect()
+    except Exception:
+        pass
+
+
+def _connection(address: str, pool: "Aranet4Pool" = None, metadata: MetadataCache = None):
+    """
+    Connected `Aranet4` context: from `pool` if given, otherwise single use
+    with `metadata` cache
+    """
+    if pool:
+        return pool.connection(address)
+    monitor = Aranet4(address=address)
+    monitor.metadata = metadata
+    return monitor
 
 
-async def _current_reading(address):
+async def _current_reading(address, pool: "Aranet4Pool" = None, metadata: MetadataCache = None):
     """Populate and return `client.CurrentReading` dataclass"""
-    monitor = Aranet4(address=address)
-    await monitor.connect()
+    async with _connection(address, pool, metadata) as monitor:
+        return await _read_current(monitor)
+
+
+async def _name_version(monitor: Aranet4) -> tuple:
+    """Name and software version of device, cached if `monitor.metadata` is set"""
+    if monitor.metadata is None:
+        return await monitor.get_name(), await monitor.get_version()
+    info = await monitor.get_device_info()
+    return info.name, info.version
+
+
+async def _read_current(monitor: Aranet4) -> CurrentReading:
+    """Populate `client.CurrentReading` dataclass from connected device"""
     readings = await monitor.current_readings(details=True)
-    readings.name = await monitor.get_name()
-    readings.version = await monitor.get_version()
+    readings.name, readings.version = await _name_version(monitor)
     readings.stored = await monitor.get_total_readings()
     return readings
 
@@ -1047,32 +1499,37 @@ def _eval(val) -> bool:
     return bool(val)
 
 
-async def _set_settings(address, settings, verify: bool = True) -> dict:
+async def _set_settings(address, settings, verify: bool = True, pool: "Aranet4Pool" = None) -> dict:
     """Change device settings. Returns changed count"""
-    monitor = Aranet4(address=address)
-    await monitor.connect()
-    status = {}
+    async with _connection(address, pool) as monitor:
+        return await _apply_settings(monitor, settings, verify)
+
+
+async def _apply_settings(monitor: Aranet4, settings, verify: bool = True) -> dict:
+    """Change settings of connected device. Returns whether each one succeeded"""
+    interval = extend = on = None
 
     if "interval" in settings:
-        intval = int(settings["interval"])
-        status["interval"] = await monitor.set_readings_interval(intval, verify)
+        interval = int(settings["interval"])
 
     if "range" in settings:
         extend = ["extend", "extended", "1"]
         extend = settings["range"].lower() in extend
-        status["range"] = await monitor.set_bluetooth_range(extend, verify)
 
     if "integrations" in settings:
         on = ["on", "enable", "enabled", "1"]
         on = settings["integrations"].lower() in on
-        status["integrations"] = await monitor.set_home_integration_enabled(on, verify)
 
-    return status
+    results = await monitor.apply_settings(interval, extend, on, verify)
+    return {name: result.ok for name, result in results.items()}
 
 
-def get_current_readings(mac_address: str) -> CurrentReading:
-    """Get from the device the current measurements"""
-    return asyncio.run(_current_reading(mac_address))
+def get_current_readings(mac_address: str, metadata: MetadataCache = None) -> CurrentReading:
+    """
+    Get from the device the current measurements. Name and version are
+    taken from `metadata` cache if given.
+    """
+    return asyncio.run(_current_reading(mac_address, metadata=metadata))
 
 
 def set_settings(mac_address: str, settings: dict, verify: bool = True) -> int:
@@ -1080,213 +1537,39 @@ def set_settings(mac_address: str, settings: dict, verify: bool = True) -> int:
     return asyncio.run(_set_settings(mac_address, settings, verify))
 
 
-class Aranet4Scanner:
-    """Aranet4 Scanner class - scan advertisements and process data, if available"""
-
-    def _process_advertisement(self, device, ad_data):
-        """Processes Aranet4 advertisement data"""
-        adv = Aranet4Advertisement(device, ad_data)
-        self.on_scan(adv)
-
-    def __init__(self, on_scan):
-        uuids = [Aranet4.SERVICE_SAF_TEHNIKA, Aranet4.SERVICE_SAF_TEHNIKA_OLD]
-        self.on_scan = on_scan
-        self.scanner = BleakScanner(
-            detection_callback=self._process_advertisement,
-            service_uuids=uuids
-        )
-
-    async def start(self):
-        await self.scanner.start()
-
-    async def stop(self):
-        await self.scanner.stop()
-
-
-async def _find_nearby(detect_callback: callable, duration: int) -> list[BLEDevice]:
-    scanner = Aranet4Scanner(detect_callback)
-    await scanner.start()
-    await asyncio.sleep(duration)
-    await scanner.stop()
-    return [device
-            for device in scanner.scanner.discovered_devices
-            if "Aranet" in device.name]
-
-
-def find_nearby(detect_callback: callable, duration: int = 8) -> list[BLEDevice]:
-    """
-    Scans for nearby Aranet4 devices.
-    Will call callback on every valid Aranet4 advertisement, including duplicates
-    """
-
-    return asyncio.run(_find_nearby(detect_callback, duration))
-
-
-async def _all_records(address, entry_filter, remove_empty):
-    """
-    Get stored data points from device. Apply any filters requested
-    `entry_filter` is a dictionary that can have the following values:
-        `last`: int : Get last n entries
-        `start`: datetime : Get entries after specified time
-        `end`: datetime : Get entries before specified time
-        `temp`: bool : Get temperature data points (default = True)
-        `humi`: bool : Get humidity data points (default = True)
-        `pres`: bool : Get pressure data points (default = True)
-        `co2`: bool : Get co2 data points (default = True)
-    """
-    # Connect
-    monitor = Aranet4(address=address)
-    await monitor.connect()
-    # Get Basic information
-    dev_name = await monitor.get_name()
-    dev_version = await monitor.get_version()
-    sensor_state = await monitor.get_sensor_state()
-    last_log = await monitor.get_seconds_since_update()
-    now = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
-    interval = await monitor.get_interval()
-    next_log = interval - last_log
-    # Decide if there is enough time to read all the data
-    # before the next datapoint is logged.
-    print(f"Next data point will be logged in {next_log} seconds")
-    if next_log < 10:
-        print(f"Waiting {next_log} for next datapoint to be taken...")
-        await asyncio.sleep(next_log)
-        # there was another log so update the numbers
-        last_log = await monitor.get_seconds_since_update()
-        now = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
-
-    unknwon_model = False
-
-    if dev_name.startswith("Aranet2"):
-        entry_filter["pres"] = False
-        entry_filter["co2"] = False
-        if entry_filter.get("humi", False):
-            entry_filter["humi"] = 2  # v2 humidity
-    elif dev_name.startswith("Aranet\u2622"):
-        entry_filter["pres"] = False
-        entry_filter["co2"] = False
-        entry_filter["humi"] = False
-        entry_filter["temp"] = False
-        entry_filter["rad_dose"] = entry_filter.get("rad_dose", True)
-        entry_filter["rad_dose_rate"] = entry_filter.get("rad_dose_rate", True)
-        entry_filter["rad_dose_total"] = entry_filter.get("rad_dose_total", True)
-    elif dev_name.startswith("AranetRn"):
-        entry_filter["co2"] = False
-        entry_filter["radon_concentration"] = entry_filter.get("radon_concentration", True)
-        entry_filter["pres"] = entry_filter.get("pres", True)
-        if dev_name.startswith("AranetRn+"):
-            entry_filter["temp"] = entry_filter.get("temp", True)
-            if entry_filter.get("humi", False):
-                entry_filter["humi"] = 2  # v2 humidity
-    else:
-        unknwon_model = True
-
-    log_size = await monitor.get_total_readings()
-    log_points = _log_times(now, log_size, interval, last_log)
-    begin, end = _calc_start_end(log_points, entry_filter)
-    rec_filter = Filter(
-        begin,
-        end,
-        entry_filter.get("temp", True),
-        entry_filter.get("humi", True),
-        entry_filter.get("pres", True),
-        entry_filter.get("co2", True),
-        entry_filter.get("rad_dose", False),
-        entry_filter.get("rad_dose_rate", False),
-        entry_filter.get("rad_dose_total", False),
-        entry_filter.get("radon_concentration", False),
-    )
-
-    if begin < 0 or end < 0 or unknwon_model:
-        # Invalid model or invalid range. Most likely no points available
-        return Record(dev_name, dev_version, log_size, rec_filter)
-
-    # Read datapoint history from device
-    if rec_filter.incl_temperature:
-        temperature_val = await monitor.get_records(
-            Param.TEMPERATURE, log_size=log_size, start=begin, end=end
-        )
-    else:
-        temperature_val = _empty_reading(log_size)
-    if rec_filter.incl_humidity == 2:
-        humidity_val = await monitor.get_records(
-            Param.HUMIDITY2, log_size=log_size, start=begin, end=end
-        )
-    elif rec_filter.incl_humidity:
-        humidity_val = await monitor.get_records(
-            Param.HUMIDITY, log_size=log_size, start=begin, end=end
-        )
-    else:
-        humidity_val = _empty_reading(log_size)
-    if rec_filter.incl_pressure:
-        pressure_val = await monitor.get_records(
-            Param.PRESSURE, log_size=log_size, start=begin, end=end
-        )
-    else:
-        pressure_val = _empty_reading(log_size)
-    if rec_filter.incl_co2:
-        co2_val = await monitor.get_records(
-            Param.CO2, log_size=log_size, start=begin, end=end
-        )
-    else:
-        co2_val = _empty_reading(log_size)
-    if rec_filter.incl_rad_dose:
-        rad_dose_val = await monitor.get_records(
-            Param.RADIATION_DOSE, log_size=log_size, start=begin, end=end
-        )
-    else:
-        rad_dose_val = _empty_reading(log_size)
-    if rec_filter.incl_rad_dose_rate:
-        rad_dose_rate_val = await monitor.get_records(
-            Param.RADIATION_DOSE_RATE, log_size=log_size, start=begin, end=end
-        )
-    else:
-        rad_dose_rate_val = _empty_reading(log_size)
-    if rec_filter.incl_rad_dose_total:
-        rad_dose_total_val = await monitor.get_records(
-            Param.RADIATION_DOSE_INTEGRAL, log_size=log_size, start=begin, end=end
-        )
-    else:
-        rad_dose_total_val = _empty_reading(log_size)
-    if rec_filter.incl_radon_concentration:
-        radon_concentration_val = await monitor.get_records(
-            Param.RADON_CONCENTRATION, log_size=log_size, start=begin, end=end
-        )
-    else:
-        radon_concentration_val = _empty_reading(log_size)
-####
-    # Store returned data in dataclass
-    data = zip(
-        log_points,
-        co2_val,
-        temperature_val,
-        pressure_val,
-        humidity_val,
-        rad_dose_val,
-        rad_dose_rate_val,
-        rad_dose_total_val,
-        radon_concentration_val
-    )
-
-    record = Record(dev_name, dev_version, log_size, rec_filter)
-
-    for date, co2, temp, pres, hum, rad, rad_rate, rad_integral, radon in data:
-        record.value.append(RecordItem(date, temp, hum, pres, co2, rad, rad_rate, rad_integral, radon))
-    if remove_empty:
-        record.value = record.value[begin - 1:end + 1]
-    return record
-
-
-def get_all_records(mac_address: str, entry_filter: dict, remove_empty: bool = False) -> Record:
-    """
-    Get stored datapoints from device. Apply any filters requested
-    `entry_filter` is a dictionary that can have the following values:
-        `last`: int : Get last n entries
-        `start`: datetime : Get entries after specified time
-        `end`: datetime : Get entries before specified time
-        `temp`: bool : Get temperature data points (default = True)
-        `humi`: bool : Get humidity data points (default = True)
-        `pres`: bool : Get pressure data points (default = True)
-        `co2`: bool : Get co2 data points (default = True)
-    """
-    return asyncio.run(_all_records(mac_address, entry_filter, remove_empty))
+# Moved to their own modules, still available here for compatibility
+_MOVED = {
+    "history": (
+        "LogTimeline", "SyncCursor", "get_all_records", "stream_records", "sync_records",
+        "_all_records", "_calc_start_end", "_load_sync_cursors", "_log_times",
+        "_read_records", "_save_sync_cursors", "_stream_records",
+    ),
+    "pool": ("Aranet4Pool",),
+    "fleet": ("FleetReading", "get_fleet_readings", "stream_current_readings"),
+    "scanner": ("DECODE_BUCKETS", "Aranet4Scanner", "ScanStats", "find_nearby"),
+}
+_MODULE_OF = {name: module for module, names in _MOVED.items() for name in names}
+_BLEAK_EXPORTS = {
+    "BleakClient": "bleak",
+    "BleakScanner": "bleak",
+    "BLEDevice": "bleak.backends.device",
+}
+
+
+def _bleak(name):
+    """Bleak class `name`, imported on first use and kept as module attribute"""
+    if name not in globals():
+        globals()[name] = getattr(importlib.import_module(_BLEAK_EXPORTS[name]), name)
+    return globals()[name]
+
+
+def __getattr__(attr):
+    if attr in _BLEAK_EXPORTS:
+        return _bleak(attr)
+    if attr in _MODULE_OF:
+        return getattr(importlib.import_module(f"aranet4.{_MODULE_OF[attr]}"), attr)
+    raise AttributeError(f"module {__name__!r} has no attribute {attr!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_MODULE_OF) | set(_BLEAK_EXPORTS))
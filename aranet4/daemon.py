@@ -0,0 +1,149 @@
+"""
+Long running scanner. Latest advertised readings of every device and
+a bounded history of recent measurements are kept in memory, and served
+as JSON over HTTP to local consumers. Scanner internals are served in
+Prometheus text format.
+"""
+
+import asyncio
+from collections import deque
+from dataclasses import dataclass, field
+import json
+import time
+
+from aranet4.client import Aranet4Advertisement, CurrentReading, ManufacturerData
+from aranet4.metrics import CONTENT_TYPE, Metrics, _handle_http
+from aranet4.scanner import Aranet4Scanner
+
+DEFAULT_PORT = 8764
+
+
+@dataclass
+class DeviceState:
+    """Latest advertisement data of one device"""
+
+    address: str
+    name: str = None
+    readings: CurrentReading = None
+    manufacturer_data: ManufacturerData = None
+    rssi: int = None
+    seen: float = 0  # Epoch time of the last advertisement
+    # (epoch time of measurement, `CurrentReading`) of recent measurements
+    history: deque = field(default_factory=deque)
+
+    def to_dict(self, history: bool = False) -> dict:
+        """JSON serializable state, optionally with recent measurements"""
+        data = {
+            "address": self.address,
+            "name": self.name,
+            "rssi": self.rssi,
+            "seen": self.seen,
+        }
+        if self.manufacturer_data:
+            data["version"] = str(self.manufacturer_data.version)
+            data["integrations"] = self.manufacturer_data.integrations
+        if self.readings:
+            data["readings"] = _readings_dict(self.readings)
+        if history:
+            data["history"] = [
+                {"time": measured, **_readings_dict(readings)}
+                for measured, readings in self.history
+            ]
+        return data
+
+
+def _readings_dict(readings: CurrentReading) -> dict:
+    data = readings.toDict()
+    data["interval"] = readings.interval
+    data["ago"] = readings.ago
+    return data
+
+
+class ScanDaemon:
+    """
+    Keeps `Aranet4Scanner` running and a table of `DeviceState` by device
+    address in `devices`. Every new measurement is added to the device
+    history, which holds at most `history_size` measurements. Repeated
+    measurements are recognized by the scanner, they only update RSSI and
+    time the device was seen.
+    """
+
+    def __init__(self, history_size: int = 60):
+        self.history_size = history_size
+        self.devices = {}
+        self.scanner = Aranet4Scanner(self._on_scan, skip_duplicates=True, on_duplicate=self._update)
+        self.metrics = Metrics()
+        self.metrics.add_scanner(self.scanner)
+
+    def _update(self, adv: Aranet4Advertisement) -> DeviceState:
+        """Update state of advertising device, None if device is unknown"""
+        if not adv.device:
+            return None
+        address = adv.device.address.upper()
+        state = self.devices.get(address)
+        if state is None:
+            state = DeviceState(address, history=deque(maxlen=self.history_size))
+            self.devices[address] = state
+
+        state.name = adv.device.name or state.name
+        state.rssi = adv.rssi
+        state.seen = time.time()
+        state.manufacturer_data = adv.manufacturer_data
+        if adv.readings:
+            state.readings = adv.readings
+        return state
+
+    def _on_scan(self, adv: Aranet4Advertisement):
+        """New measurement, added to history"""
+        state = self._update(adv)
+        if state and adv.readings:
+            state.history.append((state.seen - max(adv.readings.ago, 0), adv.readings))
+
+    def latest(self, address: str) -> DeviceState:
+        """Latest state of device, or None if it was not seen"""
+        return self.devices.get(address.upper())
+
+    async def start(self):
+        await self.scanner.start()
+
+    async def stop(self):
+        await self.scanner.stop()
+
+    async def serve(self, host: str = "127.0.0.1", port: int = DEFAULT_PORT) -> asyncio.Server:
+        """
+        Start HTTP server with JSON responses:
+            `GET /devices`: latest state of all devices
+            `GET /devices/<address>`: latest state and history of one device
+        and `GET /metrics` in Prometheus text format.
+        """
+        return await asyncio.start_server(self._handle_request, host, port)
+
+    async def run(self, host: str = "127.0.0.1", port: int = DEFAULT_PORT):
+        """Scan and serve until cancelled"""
+        await self.start()
+        try:
+            server = await self.serve(host, port)
+            async with server:
+                await server.serve_forever()
+        finally:
+            await self.stop()
+
+    def _response(self, path: str) -> tuple:
+        """Returns HTTP status and JSON body of request path"""
+        parts = path.split("?", 1)[0].strip("/").split("/")
+        if parts == ["devices"]:
+            return "200 OK", {address: state.to_dict() for address, state in self.devices.items()}
+        if len(parts) == 2 and parts[0] == "devices":
+            state = self.latest(parts[1])
+            if state:
+                return "200 OK", state.to_dict(history=True)
+        return "404 Not Found", {"error": "not found"}
+
+    async def _handle_request(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        await _handle_http(reader, writer, self._respond)
+
+    def _respond(self, path: str) -> tuple:
+        if path.split("?", 1)[0] == "/metrics":
+            return "200 OK", CONTENT_TYPE, self.metrics.render().encode()
+        status, data = self._response(path)
+        return status, "application/json", json.dumps(data).encode()
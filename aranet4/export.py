@@ -0,0 +1,135 @@
+"""
+Export of history records to CSV and newline-delimited JSON files.
+Rows are produced straight from record columns, without creating
+`RecordItem` objects, and written in batches.
+"""
+
+from collections.abc import Iterable
+import csv
+import datetime
+import gzip
+from itertools import islice, repeat
+import json
+from operator import attrgetter
+from pathlib import Path
+
+from aranet4 import archive
+from aranet4.records import Record, RecordColumns, _utc_time
+
+# Exported columns, in file order, and `Filter` flag including each one
+FILTER_FIELDS = (
+    ("co2", "incl_co2"),
+    ("temperature", "incl_temperature"),
+    ("humidity", "incl_humidity"),
+    ("pressure", "incl_pressure"),
+    ("rad_dose", "incl_rad_dose"),
+    ("rad_dose_rate", "incl_rad_dose_rate"),
+    ("rad_dose_total", "incl_rad_dose_total"),
+    ("radon_concentration", "incl_radon_concentration"),
+)
+
+NDJSON_SUFFIXES = (".ndjson", ".jsonl")
+ARCHIVE_SUFFIX = ".aranet"
+
+
+def record_fields(record: Record) -> list:
+    """Names of columns included by `record.filter`, starting with date"""
+    fields = ["date"]
+    for name, flag in FILTER_FIELDS:
+        if getattr(record.filter, flag):
+            fields.append(name)
+    return fields
+
+
+def _as_records(records) -> Iterable:
+    """Single `Record`, or any iterable of them, such as `stream_records`"""
+    if isinstance(records, Record):
+        return (records,)
+    return records
+
+
+def _open(filename, compress: bool):
+    if compress:
+        return gzip.open(filename, mode="wt", encoding="utf-8", newline="")
+    return open(file=filename, mode="w", encoding="utf-8", newline="")
+
+
+def _rows(values, fields: list):
+    """Tuples of `fields` values for every row of `Record.value`"""
+    if isinstance(values, RecordColumns):
+        columns = [
+            map(_utc_time, values.timestamps) if name == "date"
+            else values.columns.get(name, repeat(-1))
+            for name in fields
+        ]
+        return zip(*columns)
+    getter = attrgetter(*fields)
+    if len(fields) == 1:
+        return ((getter(line),) for line in values)
+    return map(getter, values)
+
+
+def _batches(rows, batch_size: int):
+    while batch := list(islice(rows, batch_size)):
+        yield batch
+
+
+def write_csv(filename, records, fields: list = None, compress: bool = False):
+    """
+    Write records to CSV file. `records` is `client.Record` or iterable of
+    them, such as `client.stream_records`. `fields` defaults to date and
+    columns included by filter of the first record.
+    """
+    with _open(filename, compress) as csv_file:
+        writer = csv.writer(csv_file)
+        header = True
+        for record in _as_records(records):
+            if fields is None:
+                fields = record_fields(record)
+            if header:
+                writer.writerow(fields)
+                header = False
+            writer.writerows(_rows(record.value, fields))
+
+
+def _json_default(value):
+    """Dates are not JSON serializable, write them as ISO 8601 strings"""
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def write_ndjson(
+    filename, records, fields: list = None, compress: bool = False, batch_size: int = 1024
+):
+    """
+    Write records to newline-delimited JSON file, one object per row.
+    Arguments same as in `write_csv`. Dates are ISO 8601 strings.
+    """
+    encode = json.JSONEncoder(separators=(",", ":"), default=_json_default).encode
+    with _open(filename, compress) as json_file:
+        for record in _as_records(records):
+            if fields is None:
+                fields = record_fields(record)
+            for batch in _batches(_rows(record.value, fields), batch_size):
+                json_file.write("".join([encode(dict(zip(fields, row))) + "\n" for row in batch]))
+
+
+def write_records(filename, records, fields: list = None):
+    """
+    Write records to file, format is chosen by file name: `.ndjson` or
+    `.jsonl` for newline-delimited JSON, `.aranet` to append to binary
+    archive with all columns, CSV otherwise. Additional `.gz` suffix
+    compresses text files.
+    """
+    suffixes = [suffix.lower() for suffix in Path(filename).suffixes]
+    if suffixes[-1:] == [ARCHIVE_SUFFIX]:
+        archive.write_archive(filename, records)
+        return
+    compress = suffixes[-1:] == [".gz"]
+    if compress:
+        suffixes.pop()
+    if suffixes and suffixes[-1] in NDJSON_SUFFIXES:
+        write_ndjson(filename, records, fields, compress)
+    else:
+        write_csv(filename, records, fields, compress)
@@ -0,0 +1,70 @@
+"""
+Current readings of many devices, read concurrently within the number of
+connections the Bluetooth adapter can handle.
+"""
+
+import asyncio
+from typing import NamedTuple
+
+from aranet4.client import CurrentReading, _current_reading
+from aranet4.pool import Aranet4Pool
+
+
+class FleetReading(NamedTuple):
+    """Current readings of one device, or error if they could not be read"""
+
+    address: str
+    readings: CurrentReading = None
+    error: Exception = None
+
+
+async def _fleet_reading(
+    address: str, connections: asyncio.Semaphore, timeout: float, pool: Aranet4Pool = None
+) -> FleetReading:
+    """Read current values of single device while holding a connection slot"""
+    async with connections:
+        try:
+            readings = await asyncio.wait_for(_current_reading(address, pool), timeout)
+            return FleetReading(address, readings)
+        except Exception as e:  # single failing device must not stop the others
+            return FleetReading(address, error=e)
+
+
+async def stream_current_readings(
+    addresses: list, max_connections: int = 3, timeout: float = 30, pool: Aranet4Pool = None
+):
+    """
+    Read current values of many devices concurrently. Yields `FleetReading`
+    for every device as soon as it is done.
+    `max_connections` : Number of simultaneous connections the Bluetooth
+    adapter can handle
+    `timeout` : Seconds given to connect and read single device
+    `pool` : Keep connections open in this `Aranet4Pool` for the next poll.
+    Its `max_connections` should not exceed adapter limit either.
+    """
+    connections = asyncio.Semaphore(max_connections)
+    tasks = [
+        asyncio.ensure_future(_fleet_reading(address, connections, timeout, pool))
+        for address in addresses
+    ]
+    try:
+        for task in asyncio.as_completed(tasks):
+            yield await task
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def get_fleet_readings(addresses: list, max_connections: int = 3, timeout: float = 30) -> dict:
+    """
+    Get current measurements of many devices concurrently.
+    Returns dictionary of address and `FleetReading`
+    """
+
+    async def collect():
+        return {
+            result.address: result
+            async for result in stream_current_readings(addresses, max_connections, timeout)
+        }
+
+    return asyncio.run(collect())
@@ -0,0 +1,444 @@
+"""
+History log download: times datapoints were logged, filters, and whole,
+streamed or incremental download of stored datapoints.
+"""
+
+from array import array
+import asyncio
+from collections.abc import Sequence
+import contextlib
+from dataclasses import asdict, dataclass, replace
+import datetime
+import json
+import os
+from typing import TYPE_CHECKING, NamedTuple
+
+from aranet4.client import (
+    PARAM_DECODERS,
+    _PARAM_FIELDS,
+    Aranet4,
+    Param,
+    _connection,
+    _empty_reading,
+    _name_version,
+)
+from aranet4.metadata import MetadataCache
+from aranet4.records import Filter, Record, RecordColumns, _attach_tzinfo
+
+if TYPE_CHECKING:
+    from aranet4.pool import Aranet4Pool
+
+
+@dataclass
+class SyncCursor:
+    """dataclass to store position of the last record fetched by incremental sync"""
+
+    address: str
+    index: int = 0
+    timestamp: float = 0  # epoch seconds of the last fetched record
+    interval: int = 0
+
+
+class LogTimeline(Sequence):
+    """
+    Times datapoints were logged on device. Datapoints are logged every
+    `interval` seconds, so time of any datapoint and datapoint of any time
+    are calculated, not stored. Items are `datetime`, indexed from 0.
+    """
+
+    def __init__(self, now, total, interval, ago):
+        self.total = total
+        self.interval = interval
+        self.start = now - datetime.timedelta(seconds=((total - 1) * interval) + ago)
+        self._step = datetime.timedelta(seconds=interval)
+
+    def __len__(self):
+        return self.total
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[pos] for pos in range(*idx.indices(self.total))]
+        if idx < 0:
+            idx += self.total
+        if not 0 <= idx < self.total:
+            raise IndexError("log timeline index out of range")
+        return self.start + self._step * idx
+
+    def first_at_or_after(self, when) -> int:
+        """Number (from 1) of the first datapoint logged at `when` or later, -1 if none"""
+        idx = max(-((self.start - when) // self._step), 0) + 1
+        return idx if idx <= self.total else -1
+
+    def last_at_or_before(self, when) -> int:
+        """Number (from 1) of the last datapoint logged at `when` or earlier, -1 if none"""
+        idx = min((when - self.start) // self._step + 1, self.total)
+        return idx if idx >= 1 else -1
+
+    def timestamps(self):
+        """Epoch seconds of all datapoints. Lazy `range`, when start is whole second"""
+        start = self.start.timestamp()
+        if start.is_integer() and self.interval > 0:
+            start = int(start)
+            return range(start, start + self.total * self.interval, self.interval)
+        return array("d", (start + self.interval * idx for idx in range(self.total)))
+
+
+def _log_times(now, total, interval, ago):
+    """Calculate the actual times datapoints were logged on device"""
+    return list(LogTimeline(now, total, interval, ago))
+
+
+def _calc_start_end(datapoint_times, entry_filter):
+    """
+    Apply filters to get required start and end datapoint.
+    `datapoint_times` is `LogTimeline` or list of log times.
+    `entry_filter` is a dictionary that can have the following values:
+        `last`: int : Get last n entries
+        `start`: datetime : Get entries after specified time
+        `end`: datetime : Get entries before specified time
+    """
+    timeline = isinstance(datapoint_times, LogTimeline)
+    last_n_entries = entry_filter.get("last")
+    filter_start = _attach_tzinfo(entry_filter.get("start"))
+    filter_end = _attach_tzinfo(entry_filter.get("end"))
+    start = 0x0001
+    end = len(datapoint_times)
+    if last_n_entries:
+        # Result is inclusive so reduce count back by 1
+        start = max(end - last_n_entries + 1, start)
+    if filter_start and timeline:
+        time_start = datapoint_times.first_at_or_after(filter_start)
+    elif filter_start:
+        time_start = -1
+        for idx, timestamp in enumerate(datapoint_times, start=1):
+            if filter_start <= timestamp:
+                time_start = idx
+                break
+    if filter_start:
+        if 0 < time_start <= end:
+            start = time_start
+        else:
+            start = -1  # out of range
+    if filter_end and timeline:
+        time_end = datapoint_times.last_at_or_before(filter_end)
+    elif filter_end:
+        time_end = -1
+        for idx, timestamp in enumerate(datapoint_times, start=1):
+            if timestamp <= filter_end:
+                time_end = idx
+            else:
+                break
+    if filter_end:
+        if start <= time_end <= end:
+            end = time_end
+        else:
+            end = -1  # out of range
+    return start, end
+
+
+async def _all_records(
+    address, entry_filter, remove_empty, cursor: SyncCursor = None, pool: "Aranet4Pool" = None,
+    metadata: MetadataCache = None,
+):
+    """
+    Get stored data points from device. Apply any filters requested
+    `entry_filter` is a dictionary that can have the following values:
+        `last`: int : Get last n entries
+        `start`: datetime : Get entries after specified time
+        `end`: datetime : Get entries before specified time
+        `temp`: bool : Get temperature data points (default = True)
+        `humi`: bool : Get humidity data points (default = True)
+        `pres`: bool : Get pressure data points (default = True)
+        `co2`: bool : Get co2 data points (default = True)
+    If `cursor` is given, only records logged after it are fetched and
+    cursor is moved to the last fetched record.
+    Name and version are taken from `metadata` cache if given.
+    """
+    async with _connection(address, pool, metadata) as monitor:
+        return await _read_records(monitor, entry_filter, remove_empty, cursor)
+
+
+class _HistoryPlan(NamedTuple):
+    """What `_read_records` and `_stream_records` download from device"""
+
+    name: str
+    version: str
+    log_size: int
+    filter: Filter
+    timeline: LogTimeline
+    params: list  # Empty for unknown model or range without datapoints
+
+
+async def _plan_records(monitor: Aranet4, entry_filter, cursor: SyncCursor = None) -> _HistoryPlan:
+    """Read device details and resolve `entry_filter` of connected device"""
+    # Get Basic information
+    dev_name, dev_version = await _name_version(monitor)
+    last_log = await monitor.get_seconds_since_update()
+    now = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
+    interval = await monitor.get_interval()
+    next_log = interval - last_log
+    # Decide if there is enough time to read all the data
+    # before the next datapoint is logged.
+    print(f"Next data point will be logged in {next_log} seconds")
+    if next_log < 10:
+        print(f"Waiting {next_log} for next datapoint to be taken...")
+        await asyncio.sleep(next_log)
+        # there was another log so update the numbers
+        last_log = await monitor.get_seconds_since_update()
+        now = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
+
+    if cursor and cursor.timestamp and cursor.interval == interval:
+        # Log times are derived from current time, so they can be off by a
+        # second between runs. Start half an interval after the last record.
+        # Interval change clears the log on device, then everything is fetched.
+        since = datetime.datetime.fromtimestamp(
+            cursor.timestamp + interval / 2, datetime.timezone.utc
+        )
+        filter_start = _attach_tzinfo(entry_filter.get("start"))
+        if not filter_start or filter_start < since:
+            entry_filter["start"] = since
+
+    unknwon_model = False
+
+    if dev_name.startswith("Aranet2"):
+        entry_filter["pres"] = False
+        entry_filter["co2"] = False
+        if entry_filter.get("humi", False):
+            entry_filter["humi"] = 2  # v2 humidity
+    elif dev_name.startswith("Aranet\u2622"):
+        entry_filter["pres"] = False
+        entry_filter["co2"] = False
+        entry_filter["humi"] = False
+        entry_filter["temp"] = False
+        entry_filter["rad_dose"] = entry_filter.get("rad_dose", True)
+        entry_filter["rad_dose_rate"] = entry_filter.get("rad_dose_rate", True)
+        entry_filter["rad_dose_total"] = entry_filter.get("rad_dose_total", True)
+    elif dev_name.startswith("AranetRn"):
+        entry_filter["co2"] = False
+        entry_filter["radon_concentration"] = entry_filter.get("radon_concentration", True)
+        entry_filter["pres"] = entry_filter.get("pres", True)
+        if dev_name.startswith("AranetRn+"):
+            entry_filter["temp"] = entry_filter.get("temp", True)
+            if entry_filter.get("humi", False):
+                entry_filter["humi"] = 2  # v2 humidity
+    elif not dev_name.startswith("Aranet4"):
+        unknwon_model = True
+
+    log_size = await monitor.get_total_readings()
+    log_points = LogTimeline(now, log_size, interval, last_log)
+    begin, end = _calc_start_end(log_points, entry_filter)
+    rec_filter = Filter(
+        begin,
+        end,
+        entry_filter.get("temp", True),
+        entry_filter.get("humi", True),
+        entry_filter.get("pres", True),
+        entry_filter.get("co2", True),
+        entry_filter.get("rad_dose", False),
+        entry_filter.get("rad_dose_rate", False),
+        entry_filter.get("rad_dose_total", False),
+        entry_filter.get("radon_concentration", False),
+    )
+
+    if begin < 0 or end < 0 or unknwon_model:
+        # Invalid model or invalid range. Most likely no points available
+        return _HistoryPlan(dev_name, dev_version, log_size, rec_filter, log_points, [])
+
+    humidity_param = Param.HUMIDITY2 if rec_filter.incl_humidity == 2 else Param.HUMIDITY
+    params = [
+        param for param, included in (
+            (Param.TEMPERATURE, rec_filter.incl_temperature),
+            (humidity_param, rec_filter.incl_humidity),
+            (Param.PRESSURE, rec_filter.incl_pressure),
+            (Param.CO2, rec_filter.incl_co2),
+            (Param.RADIATION_DOSE, rec_filter.incl_rad_dose),
+            (Param.RADIATION_DOSE_RATE, rec_filter.incl_rad_dose_rate),
+            (Param.RADIATION_DOSE_INTEGRAL, rec_filter.incl_rad_dose_total),
+            (Param.RADON_CONCENTRATION, rec_filter.incl_radon_concentration),
+        ) if included
+    ]
+    return _HistoryPlan(dev_name, dev_version, log_size, rec_filter, log_points, params)
+
+
+def _move_cursor(cursor: SyncCursor, plan: _HistoryPlan):
+    """Move sync cursor to the last datapoint of `plan`"""
+    cursor.index = plan.filter.end
+    cursor.timestamp = plan.timeline[plan.filter.end - 1].timestamp()
+    cursor.interval = plan.timeline.interval
+
+
+async def _read_records(monitor: Aranet4, entry_filter, remove_empty, cursor: SyncCursor = None):
+    """Get stored data points from connected device. See `_all_records`"""
+    plan = await _plan_records(monitor, entry_filter, cursor)
+    record = Record(plan.name, plan.version, plan.log_size, plan.filter)
+    if not plan.params:
+        return record
+
+    # Read datapoint history from device
+    begin, end = plan.filter.begin, plan.filter.end
+    values = await monitor.get_records_batch(
+        plan.params, log_size=plan.log_size, start=begin, end=end
+    )
+
+    # Store returned data in columns
+    columns = {_PARAM_FIELDS[param]: column for param, column in values.items()}
+
+    record.value = RecordColumns(plan.timeline.timestamps(), columns)
+    if remove_empty:
+        record.value = record.value[begin - 1:end + 1]
+    if cursor:
+        _move_cursor(cursor, plan)
+    return record
+
+
+async def _stream_records(
+    address, entry_filter, chunk_size: int = 1024, cursor: SyncCursor = None,
+    pool: "Aranet4Pool" = None, metadata: MetadataCache = None,
+):
+    """
+    Async generator of stored data points, same as `_all_records` with
+    `remove_empty`. Every parameter is requested once, and every window of
+    `chunk_size` datapoints is yielded as `Record` as soon as the last
+    parameter is received for it.
+    `Record.filter` holds range of the window. Cursor is moved only after
+    the last window.
+    Datapoints are kept per window and released once it is yielded. All
+    parameters but the last are complete before any window is, so their
+    not yet yielded windows are held, the last one takes about a window.
+    """
+    async with _connection(address, pool, metadata) as monitor:
+        plan = await _plan_records(monitor, entry_filter, cursor)
+        if not plan.params:
+            return
+        begin, end = plan.filter.begin, plan.filter.end
+        timestamps = plan.timeline.timestamps()
+        # Window number -> datapoints of the window, for every parameter
+        windows = {param: {} for param in plan.params}
+
+        def window_range(number: int):
+            first = begin + number * chunk_size
+            return first, min(first + chunk_size - 1, end)
+
+        def store(chunk, first: int, last: int):
+            typecode = PARAM_DECODERS[chunk.param].typecode
+            for number in range((first - begin) // chunk_size, (last - begin) // chunk_size + 1):
+                w_first, w_last = window_range(number)
+                lo, hi = max(first, w_first), min(last, w_last)
+                column = windows[chunk.param].get(number)
+                if column is None:
+                    column = windows[chunk.param][number] = _empty_reading(w_last - w_first + 1, typecode)
+                column[lo - w_first:hi - w_first + 1] = chunk.values[lo - chunk.start:hi - chunk.start + 1]
+
+        def window(number: int) -> Record:
+            first, last = window_range(number)
+            record = Record(
+                plan.name, plan.version, plan.log_size,
+                replace(plan.filter, begin=first, end=last),
+            )
+            columns = {}
+            for param in plan.params:
+                column = windows[param].pop(number, None)
+                if column is None:
+                    column = _empty_reading(last - first + 1, PARAM_DECODERS[param].typecode)
+                columns[_PARAM_FIELDS[param]] = column
+            record.value = RecordColumns(timestamps[first - 1:last], columns)
+            return record
+
+        # Parameters are downloaded one after another in a single request
+        # each. Window is complete once the last parameter reaches its end.
+        last_param = plan.params[-1]
+        next_window = 0
+        chunks = monitor.iter_records(plan.params, plan.log_size, begin, end)
+        async with contextlib.aclosing(chunks):
+            async for chunk in chunks:
+                first = max(chunk.start, begin)
+                last = min(chunk.start + len(chunk.values) - 1, end)
+                if first > last:
+                    continue
+                store(chunk, first, last)
+                while chunk.param == last_param and window_range(next_window)[0] + chunk_size - 1 <= last:
+                    yield window(next_window)
+                    next_window += 1
+        # Last partial window, and windows of datapoints that were not received
+        for number in range(next_window, (end - begin) // chunk_size + 1):
+            yield window(number)
+        if cursor:
+            _move_cursor(cursor, plan)
+
+
+def get_all_records(
+    mac_address: str, entry_filter: dict, remove_empty: bool = False, metadata: MetadataCache = None
+) -> Record:
+    """
+    Get stored datapoints from device. Apply any filters requested
+    `entry_filter` is a dictionary that can have the following values:
+        `last`: int : Get last n entries
+        `start`: datetime : Get entries after specified time
+        `end`: datetime : Get entries before specified time
+        `temp`: bool : Get temperature data points (default = True)
+        `humi`: bool : Get humidity data points (default = True)
+        `pres`: bool : Get pressure data points (default = True)
+        `co2`: bool : Get co2 data points (default = True)
+    Name and version are taken from `metadata` cache if given.
+    """
+    return asyncio.run(_all_records(mac_address, entry_filter, remove_empty, metadata=metadata))
+
+
+def stream_records(
+    mac_address: str, entry_filter: dict, chunk_size: int = 1024, metadata: MetadataCache = None
+):
+    """
+    Generator of stored datapoints in windows of `chunk_size`. Yields
+    `Record` of every window, so datapoints can be written out before the
+    whole log is downloaded. `entry_filter` and `metadata` same as in
+    `get_all_records`.
+    """
+    loop = asyncio.new_event_loop()
+    records = _stream_records(mac_address, entry_filter, chunk_size, metadata=metadata)
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(anext(records))
+            except StopAsyncIteration:
+                break
+    finally:
+        loop.run_until_complete(records.aclose())
+        loop.close()
+
+
+def _load_sync_cursors(path) -> dict:
+    """Read sync cursors from JSON file. Missing file means nothing synced yet"""
+    try:
+        with open(file=path, encoding="utf-8") as state_file:
+            data = json.load(state_file)
+    except FileNotFoundError:
+        return {}
+    return {address: SyncCursor(**cursor) for address, cursor in data.items()}
+
+
+def _save_sync_cursors(path, cursors: dict):
+    """Write sync cursors to JSON file, replacing it only when fully written"""
+    tmp_path = f"{path}.tmp"
+    with open(file=tmp_path, mode="w", encoding="utf-8") as state_file:
+        json.dump({address: asdict(cursor) for address, cursor in cursors.items()}, state_file, indent=2)
+    os.replace(tmp_path, path)
+
+
+def sync_records(
+    mac_address: str, state_file, entry_filter: dict = None, metadata: MetadataCache = None
+) -> Record:
+    """
+    Get stored datapoints logged since the previous sync of the device.
+    Position of the last fetched record is kept per device in `state_file`.
+    First sync, or sync after logging interval was changed, gets whole log.
+    `entry_filter` and `metadata` accept same values as in `get_all_records`.
+    """
+    cursors = _load_sync_cursors(state_file)
+    key = mac_address.upper()
+    cursor = cursors.get(key, SyncCursor(key))
+    record = asyncio.run(
+        _all_records(mac_address, dict(entry_filter or {}), True, cursor, metadata=metadata)
+    )
+    cursors[key] = cursor
+    _save_sync_cursors(state_file, cursors)
+    return record
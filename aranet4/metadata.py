@@ -0,0 +1,84 @@
+"""
+Cache of static device details: name and software version, read by every
+current reading and history download. They change only with firmware
+update, so repeated polls of a device skip reading them over GATT.
+Entries are kept in JSON file by device address and dropped when device
+advertises firmware version other than the cached one. Polls and history
+downloads don't check the version, without a scanner passing advertisements
+to `check_advertisement` entries are never dropped.
+"""
+
+from dataclasses import asdict, dataclass
+import json
+import os
+
+
+@dataclass
+class DeviceInfo:
+    """dataclass to store static details of device"""
+
+    address: str
+    name: str
+    version: str  # software revision, same as advertised `ManufacturerData.version`
+
+
+class MetadataCache:
+    """
+    `DeviceInfo` of devices by address. Kept in memory only when `path`
+    is None, otherwise loaded from and saved to JSON file `path`.
+    Share with clients to use it, and with a scanner to drop entries of
+    devices with updated firmware:
+
+        cache = MetadataCache("aranet-devices.json")
+        pool = Aranet4Pool(metadata=cache)
+        readings = get_current_readings(address, metadata=cache)
+        scanner = Aranet4Scanner(cache.check_advertisement)
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.devices = self._load() if path else {}
+
+    def get(self, address: str) -> DeviceInfo:
+        """Cached details of device, None if not cached"""
+        return self.devices.get(address.upper())
+
+    def put(self, info: DeviceInfo):
+        self.devices[info.address.upper()] = info
+        self._save()
+
+    def invalidate(self, address: str):
+        if self.devices.pop(address.upper(), None) is not None:
+            self._save()
+
+    def check_advertisement(self, advertisement) -> bool:
+        """
+        Drop cached details of advertising device when firmware version
+        changed. Returns True if entry was dropped.
+        """
+        mf_data = advertisement.manufacturer_data
+        if advertisement.device is None or mf_data is None or mf_data.version is None:
+            return False
+        info = self.get(advertisement.device.address)
+        if info is None or info.version == str(mf_data.version):
+            return False
+        self.invalidate(advertisement.device.address)
+        return True
+
+    def _load(self) -> dict:
+        """Read JSON file. Missing file means nothing cached yet"""
+        try:
+            with open(file=self.path, encoding="utf-8") as cache_file:
+                data = json.load(cache_file)
+        except FileNotFoundError:
+            return {}
+        return {address: DeviceInfo(**info) for address, info in data.items()}
+
+    def _save(self):
+        """Write JSON file, replacing it only when fully written"""
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(file=tmp_path, mode="w", encoding="utf-8") as cache_file:
+            json.dump({address: asdict(info) for address, info in self.devices.items()}, cache_file, indent=2)
+        os.replace(tmp_path, self.path)
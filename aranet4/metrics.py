@@ -0,0 +1,183 @@
+"""
+Internals of long running collector in Prometheus text format: scanner
+advertisement counters and decode time, GATT operations of `Aranet4`
+clients and time since the last advertisement of every device.
+Counters are kept by `ScanStats` and `GattStats` anyway, they are only
+formatted when scraped.
+"""
+
+import asyncio
+import time
+
+from aranet4.client import LATENCY_BUCKETS, Aranet4, GattStats, _characteristic_names
+from aranet4.scanner import DECODE_BUCKETS, Aranet4Scanner
+
+DEFAULT_PORT = 8765
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_HISTORY_CHARACTERISTICS = (
+    Aranet4.CHARACTERISTIC_HISTORY_READINGS_V1,
+    Aranet4.CHARACTERISTIC_HISTORY_READINGS_V2,
+)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _metric(lines: list, name: str, kind: str, help_text: str, samples: list):
+    """Add metric with `samples` of (labels, value)"""
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} {kind}")
+    for labels, value in samples:
+        lines.append(f"{name}{_labels(labels)} {value}")
+
+
+def _histogram(lines: list, name: str, help_text: str, bounds: tuple, series: list):
+    """
+    Add histogram with `series` of (labels, counts by bucket, sum).
+    The last count is of values above all `bounds`.
+    """
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} histogram")
+    for labels, counts, total in series:
+        cumulative = 0
+        for bound, count in zip(bounds + ("+Inf",), counts):
+            cumulative += count
+            lines.append(f"{name}_bucket{_labels({**labels, 'le': bound})} {cumulative}")
+        lines.append(f"{name}_sum{_labels(labels)} {total}")
+        lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+
+
+async def _handle_http(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, respond):
+    """
+    Answer single HTTP request. `respond(path)` of GET request returns
+    status, content type and body.
+    """
+    try:
+        request = await reader.readline()
+        # Headers are not used
+        while (await reader.readline()).strip():
+            pass
+        method, path, _ = request.decode("latin-1").split(" ", 2)
+        if method != "GET":
+            status, content_type, body = "405 Method Not Allowed", "text/plain", b"method not allowed\n"
+        else:
+            status, content_type, body = respond(path)
+        writer.write(
+            f"HTTP/1.1 {status}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+    except (ValueError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+class Metrics:
+    """
+    Prometheus exposition of scanners added with `add_scanner`, and of
+    `gatt` statistics. Share `gatt` with clients to include them:
+
+        metrics = Metrics()
+        pool = Aranet4Pool(stats=metrics.gatt)
+        monitor.stats = metrics.gatt
+    """
+
+    def __init__(self, gatt: GattStats = None):
+        self.gatt = gatt if gatt is not None else GattStats()
+        self.scanners = []
+
+    def add_scanner(self, scanner: Aranet4Scanner):
+        self.scanners.append(scanner)
+
+    def render(self) -> str:
+        """Current values in Prometheus text format"""
+        lines = []
+        self._render_scanners(lines)
+        self._render_gatt(lines)
+        return "\n".join(lines) + "\n"
+
+    def _render_scanners(self, lines: list):
+        stats = [scanner.stats for scanner in self.scanners]
+        for name, attr, help_text in [
+            ("aranet4_advertisements_received_total", "received", "Advertisements decoded by scanner"),
+            ("aranet4_advertisements_emitted_total", "emitted", "Advertisements passed to scan callback"),
+            ("aranet4_advertisements_duplicates_total", "duplicates", "Repeated measurements suppressed"),
+        ]:
+            _metric(lines, name, "counter", help_text, [({}, sum(getattr(item, attr) for item in stats))])
+
+        histogram = [sum(counts) for counts in zip(*(item.decode_histogram for item in stats))]
+        _histogram(
+            lines, "aranet4_advertisement_decode_seconds", "Time to decode advertisement",
+            DECODE_BUCKETS, [({}, histogram or [0] * (len(DECODE_BUCKETS) + 1),
+                              sum(item.decode_seconds for item in stats))],
+        )
+
+        last_seen = {}
+        for item in stats:
+            for address, seen in item.last_seen.items():
+                last_seen[address] = max(seen, last_seen.get(address, seen))
+        now = time.monotonic()
+        _metric(
+            lines, "aranet4_device_last_seen_seconds", "gauge", "Seconds since the last advertisement of device",
+            [({"address": address}, round(now - seen, 3)) for address, seen in sorted(last_seen.items())],
+        )
+
+    def _render_gatt(self, lines: list):
+        gatt = self.gatt
+        names = _characteristic_names()
+        operations = sorted(
+            gatt.operations.items(), key=lambda item: (item[0][0], names.get(item[0][1], item[0][1] or ""))
+        )
+
+        def samples(attr):
+            return [
+                ({"kind": kind, "characteristic": names.get(uuid, uuid or "")}, getattr(stats, attr))
+                for (kind, uuid), stats in operations
+            ]
+
+        _metric(lines, "aranet4_gatt_operations_total", "counter", "GATT operations", samples("count"))
+        _metric(lines, "aranet4_gatt_errors_total", "counter", "Failed or cancelled GATT operations", samples("errors"))
+        _metric(lines, "aranet4_gatt_bytes_total", "counter", "Bytes transferred by GATT operations", samples("bytes"))
+
+        kinds = sorted({kind for kind, _ in gatt.operations})
+        totals = {kind: gatt.total(kind) for kind in kinds}
+        _histogram(
+            lines, "aranet4_gatt_operation_seconds", "GATT operation latency", LATENCY_BUCKETS,
+            [({"kind": kind}, total.histogram, total.seconds) for kind, total in totals.items()],
+        )
+
+        connect = totals.get("connect") or gatt.total("connect")
+        _metric(lines, "aranet4_connections_total", "counter", "Connection attempts", [({}, connect.count)])
+        _metric(lines, "aranet4_connection_failures_total", "counter", "Failed connection attempts", [({}, connect.errors)])
+        history_bytes = sum(
+            stats.bytes for (_, uuid), stats in gatt.operations.items() if uuid in _HISTORY_CHARACTERISTICS
+        )
+        _metric(lines, "aranet4_history_bytes_total", "counter", "History bytes received", [({}, history_bytes)])
+        _metric(lines, "aranet4_history_packets_total", "counter", "History packets received",
+                [({}, gatt.history_packets)])
+        _metric(lines, "aranet4_history_empty_reads_total", "counter", "History reads without data",
+                [({}, gatt.empty_reads)])
+        _metric(lines, "aranet4_history_stall_seconds_total", "counter", "Time waited for history data",
+                [({}, gatt.stall_time)])
+
+    def _respond(self, path: str) -> tuple:
+        if path.split("?", 1)[0] == "/metrics":
+            return "200 OK", CONTENT_TYPE, self.render().encode()
+        return "404 Not Found", "text/plain", b"not found\n"
+
+    async def serve(self, host: str = "127.0.0.1", port: int = DEFAULT_PORT) -> asyncio.Server:
+        """Start HTTP server with `GET /metrics` endpoint"""
+        return await asyncio.start_server(
+            lambda reader, writer: _handle_http(reader, writer, self._respond), host, port
+        )
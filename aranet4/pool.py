@@ -0,0 +1,144 @@
+"""
+Device connections kept open between calls, so that repeated polls of the
+same devices skip connection setup and service discovery.
+"""
+
+import asyncio
+import contextlib
+import time
+
+from aranet4 import client
+from aranet4.client import (
+    CurrentReading,
+    GattStats,
+    _current_reading,
+    _disconnect_quietly,
+    _set_settings,
+)
+from aranet4.history import _all_records
+from aranet4.metadata import MetadataCache
+from aranet4.records import Record
+
+
+class Aranet4Pool:
+    """
+    Pool of device connections, kept open and reused across calls.
+    Connection is closed after it was not used for `idle_time` seconds.
+    If `max_connections` is set, the least recently used idle connection is
+    closed to make room for a new one.
+    `client_factory` : Function returning `Aranet4` client of address, in
+    place of `BleakClient`, such as `simulator.SimulatedDevice`
+    `stats` : `GattStats` shared by all connections of the pool
+    `metadata` : `MetadataCache` shared by all connections of the pool
+    """
+
+    def __init__(
+        self, idle_time: float = 30, max_connections: int = None, client_factory=None,
+        stats: GattStats = None, metadata: MetadataCache = None,
+    ):
+        self.idle_time = idle_time
+        self.max_connections = max_connections
+        self.client_factory = client_factory
+        self.stats = stats
+        self.metadata = metadata
+        self._idle = {}  # idle connections by address
+        self._locks = {}
+        self._timers = {}
+        self._last_used = {}
+        self._in_use = 0
+        self._closed = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, traceback):
+        await self.close()
+
+    @contextlib.asynccontextmanager
+    async def connection(self, address: str):
+        """
+        Async context manager giving connected `Aranet4`. Only one caller
+        can use connection to the same device at a time.
+        """
+        key = address.upper()
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            timer = self._timers.pop(key, None)
+            if timer:
+                timer.cancel()
+            monitor = self._idle.pop(key, None)
+            self._in_use += 1
+            try:
+                if monitor is None or not monitor.device.is_connected:
+                    await self._make_room()
+                    ble_client = self.client_factory(address) if self.client_factory else None
+                    # Looked up at call time, so that `client.Aranet4` can be replaced
+                    monitor = client.Aranet4(address=address, client=ble_client)
+                    if self.stats is not None:
+                        monitor.stats = self.stats
+                    monitor.metadata = self.metadata
+                    await monitor.__aenter__()
+                try:
+                    yield monitor
+                except BaseException:
+                    # Link state is unknown after failure, don't reuse it
+                    await _disconnect_quietly(monitor)
+                    raise
+            finally:
+                self._in_use -= 1
+
+            if self._closed:
+                await _disconnect_quietly(monitor)
+                return
+            self._idle[key] = monitor
+            self._last_used[key] = time.monotonic()
+            self._timers[key] = asyncio.get_running_loop().call_later(
+                self.idle_time, self._expire, key
+            )
+
+    async def close(self):
+        """Close all idle connections. Connections in use are closed when released"""
+        self._closed = True
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+        idle = list(self._idle.values())
+        self._idle.clear()
+        for monitor in idle:
+            await _disconnect_quietly(monitor)
+
+    async def _make_room(self):
+        if not self.max_connections:
+            return
+        # Connection being opened is already counted as in use
+        while self._idle and len(self._idle) + self._in_use > self.max_connections:
+            key = min(self._idle, key=self._last_used.get)
+            timer = self._timers.pop(key, None)
+            if timer:
+                timer.cancel()
+            await _disconnect_quietly(self._idle.pop(key))
+
+    def _expire(self, key):
+        self._timers.pop(key, None)
+        asyncio.ensure_future(self._close_idle(key))
+
+    async def _close_idle(self, key):
+        async with self._locks[key]:
+            if key in self._timers:
+                # Used again meanwhile
+                return
+            monitor = self._idle.pop(key, None)
+            if monitor:
+                await _disconnect_quietly(monitor)
+
+    async def current_readings(self, address: str) -> CurrentReading:
+        """Same as `get_current_readings`, using pooled connection"""
+        return await _current_reading(address, self)
+
+    async def get_all_records(self, address: str, entry_filter: dict, remove_empty: bool = False) -> Record:
+        """Same as `get_all_records`, using pooled connection"""
+        return await _all_records(address, entry_filter, remove_empty, pool=self)
+
+    async def set_settings(self, address: str, settings: dict, verify: bool = True) -> dict:
+        """Same as `set_settings`, using pooled connection"""
+        return await _set_settings(address, settings, verify, self)
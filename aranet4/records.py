@@ -0,0 +1,131 @@
+"""
+History record data classes shared by device client, archive, store and
+export modules. Kept apart from `client` so that reading and writing
+files does not import Bluetooth and asyncio modules.
+"""
+
+from array import array
+from collections.abc import Sequence
+from dataclasses import dataclass, field
+import datetime
+
+
+def _utc_time(timestamp) -> datetime.datetime:
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc)
+
+
+def _attach_tzinfo(dt: datetime) -> datetime:
+    if dt and not dt.tzinfo:
+        now = datetime.datetime.now().astimezone()
+        dt = dt.replace(tzinfo=now.tzinfo)
+    return dt
+
+
+@dataclass(slots=True)
+class RecordItem:
+    """dataclass to store historical records"""
+
+    date: datetime
+    temperature: float
+    humidity: int
+    pressure: float
+    co2: int
+    rad_dose: float
+    rad_dose_rate: float
+    rad_dose_total: float
+    radon_concentration: int
+
+
+@dataclass
+class Filter:
+    """dataclass to store log filter information"""
+
+    begin: int
+    end: int
+    incl_temperature: bool
+    incl_humidity: int
+    incl_pressure: bool
+    incl_co2: bool
+    incl_rad_dose: bool
+    incl_rad_dose_rate: bool
+    incl_rad_dose_total: bool
+    incl_radon_concentration: bool
+
+
+class RecordColumns(Sequence):
+    """
+    Columnar storage of historical records. Datapoints of every parameter
+    are kept in one `array.array` and log times as epoch seconds (`range`
+    from `LogTimeline.timestamps` or `array.array`).
+    Rows are created as `RecordItem` only when accessed.
+    """
+
+    FIELDS = (
+        "temperature",
+        "humidity",
+        "pressure",
+        "co2",
+        "rad_dose",
+        "rad_dose_rate",
+        "rad_dose_total",
+        "radon_concentration",
+    )
+
+    def __init__(self, timestamps, columns: dict):
+        self.timestamps = timestamps
+        # Fields without column were not fetched and read as -1
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return RecordColumns(
+                self.timestamps[idx],
+                {name: column[idx] for name, column in self.columns.items()}
+            )
+        values = [
+            self.columns[name][idx] if name in self.columns else -1
+            for name in self.FIELDS
+        ]
+        return RecordItem(_utc_time(self.timestamps[idx]), *values)
+
+    def __iter__(self):
+        size = len(self.timestamps)
+        empty = (-1,) * size
+        columns = [self.columns.get(name, empty) for name in self.FIELDS]
+        for row in zip(self.timestamps, *columns):
+            yield RecordItem(_utc_time(row[0]), *row[1:])
+
+    def column(self, name: str):
+        """Return datapoints of `RecordItem` field, or None if not fetched"""
+        return self.columns.get(name)
+
+    def to_numpy(self) -> dict:
+        """
+        Return log times and fetched columns as NumPy arrays. Column arrays
+        share memory with this object. Requires numpy to be installed.
+        """
+        import numpy
+
+        if isinstance(self.timestamps, range):
+            timestamps = self.timestamps
+            dates = numpy.arange(timestamps.start, timestamps.stop, timestamps.step, dtype=numpy.float64)
+        else:
+            dates = numpy.frombuffer(self.timestamps, dtype=numpy.float64)
+        data = {"date": dates}
+        for name, column in self.columns.items():
+            # Columns of `archive.Archive` are memoryviews
+            typecode = column.typecode if isinstance(column, array) else column.format
+            data[name] = numpy.frombuffer(column, dtype=typecode)
+        return data
+
+
+@dataclass
+class Record:
+    name: str
+    version: str
+    records_on_device: int
+    filter: Filter
+    value: Sequence[RecordItem] = field(default_factory=list)
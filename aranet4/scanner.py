@@ -0,0 +1,137 @@
+"""
+Scanner of advertisements. Devices with Smart Home integration enabled
+advertise their current readings, so they are read without connecting.
+"""
+
+import asyncio
+import bisect
+from dataclasses import dataclass, field, replace
+import time
+from typing import TYPE_CHECKING
+
+from aranet4 import client
+from aranet4.client import Aranet4, Aranet4Advertisement
+
+if TYPE_CHECKING:
+    from bleak.backends.device import BLEDevice
+
+
+# Upper bounds in seconds of advertisement decode time histogram buckets
+DECODE_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001)
+
+
+@dataclass
+class ScanStats:
+    """Advertisement counters of `Aranet4Scanner`"""
+
+    received: int = 0
+    emitted: int = 0
+    duplicates: int = 0
+    # Total decode time, and advertisements by `DECODE_BUCKETS` upper bound
+    decode_seconds: float = 0.0
+    decode_histogram: list = field(default_factory=lambda: [0] * (len(DECODE_BUCKETS) + 1))
+    # `time.monotonic()` of the last advertisement by device address
+    last_seen: dict = field(default_factory=dict)
+
+    def add_decode(self, seconds: float):
+        self.decode_seconds += seconds
+        self.decode_histogram[bisect.bisect_left(DECODE_BUCKETS, seconds)] += 1
+
+
+def _is_new_measurement(
+    previous: Aranet4Advertisement, adv: Aranet4Advertisement, elapsed: float = 0.0
+) -> bool:
+    """
+    Compare advertisement with the previous one from the same device.
+    `elapsed` is time in seconds since the last emitted advertisement,
+    measurement is new when it exceeds the measurement interval.
+    """
+    if previous is None or adv.manufacturer_data != previous.manufacturer_data:
+        return True
+    old, new = previous.readings, adv.readings
+    if old is None or new is None:
+        return old is not new
+    if new.counter != old.counter or new.ago < old.ago:
+        return True
+    if new.interval > 0 and elapsed > new.interval:
+        return True
+    # Same measurement is repeated with growing age only
+    return replace(new, ago=old.ago) != old
+
+
+class Aranet4Scanner:
+    """
+    Aranet4 Scanner class - scan advertisements and process data, if available.
+    Device repeats its last measurement until the next one is taken. With
+    `skip_duplicates`, only advertisements with a new measurement (counter,
+    age or data change, or longer than measurement interval since the
+    last one passed) are passed to `on_scan`, suppressed ones to
+    `on_duplicate` if set. Counts are kept in `stats`.
+    """
+
+    def _process_advertisement(self, device, ad_data):
+        """Processes Aranet4 advertisement data"""
+        started = time.perf_counter()
+        adv = Aranet4Advertisement(device, ad_data)
+        self.stats.add_decode(time.perf_counter() - started)
+        self.stats.received += 1
+        now = time.monotonic()
+        self.stats.last_seen[device.address] = now
+        if self.skip_duplicates:
+            previous = self._last_advertisement.get(device.address)
+            self._last_advertisement[device.address] = adv
+            elapsed = now - self._last_emitted.get(device.address, now)
+            if not _is_new_measurement(previous, adv, elapsed):
+                self.stats.duplicates += 1
+                if self.on_duplicate:
+                    self.on_duplicate(adv)
+                return
+            self._last_emitted[device.address] = now
+        self.stats.emitted += 1
+        self.on_scan(adv)
+
+    def __init__(self, on_scan, skip_duplicates: bool = False, on_duplicate=None):
+        uuids = [Aranet4.SERVICE_SAF_TEHNIKA, Aranet4.SERVICE_SAF_TEHNIKA_OLD]
+        self.on_scan = on_scan
+        self.skip_duplicates = skip_duplicates
+        self.on_duplicate = on_duplicate
+        self.stats = ScanStats()
+        # Last advertisement, and `time.monotonic()` of the last emitted
+        # one, of every device address
+        self._last_advertisement = {}
+        self._last_emitted = {}
+        # Bleak is imported on first use, through `client`
+        self.scanner = client.BleakScanner(
+            detection_callback=self._process_advertisement,
+            service_uuids=uuids
+        )
+
+    async def start(self):
+        await self.scanner.start()
+
+    async def stop(self):
+        await self.scanner.stop()
+
+
+async def _find_nearby(
+    detect_callback: callable, duration: int, skip_duplicates: bool = False
+) -> "list[BLEDevice]":
+    scanner = Aranet4Scanner(detect_callback, skip_duplicates)
+    await scanner.start()
+    await asyncio.sleep(duration)
+    await scanner.stop()
+    return [device
+            for device in scanner.scanner.discovered_devices
+            if "Aranet" in device.name]
+
+
+def find_nearby(
+    detect_callback: callable, duration: int = 8, skip_duplicates: bool = False
+) -> "list[BLEDevice]":
+    """
+    Scans for nearby Aranet4 devices.
+    Will call callback on every valid Aranet4 advertisement, including duplicates,
+    unless `skip_duplicates` is set.
+    """
+
+    return asyncio.run(_find_nearby(detect_callback, duration, skip_duplicates))
@@ -0,0 +1,409 @@
+"""
+In-process Aranet device, which answers GATT requests of `client.Aranet4`
+without Bluetooth hardware. Used to test and load-test the download and
+fleet paths offline:
+
+    monitor = Aranet4(address, client=SimulatedDevice(address))
+    pool = Aranet4Pool(client_factory=SimulatedDevice)
+
+Characteristics are those of `docs/UUIDs.md`. History is sent with
+read based protocol (`0x61` command) when `history_v2` is set, otherwise
+as notifications (`0x82` command). Settings are changed with `0x90`-`0x92`
+commands.
+"""
+
+import asyncio
+import random
+import struct
+
+from bleak.exc import BleakError
+
+from aranet4.client import Aranet4, AranetType, Param, _history_struct
+
+# Parameters logged in history of every device type. Humidity is given
+# in 1 % steps too, when requested with `Param.HUMIDITY`
+HISTORY_PARAMS = {
+    AranetType.ARANET4: (Param.TEMPERATURE, Param.HUMIDITY, Param.PRESSURE, Param.CO2),
+    AranetType.ARANET2: (Param.TEMPERATURE, Param.HUMIDITY, Param.HUMIDITY2),
+    AranetType.ARANET_RADIATION: (
+        Param.RADIATION_DOSE, Param.RADIATION_DOSE_RATE, Param.RADIATION_DOSE_INTEGRAL
+    ),
+    AranetType.ARANET_RADON: (
+        Param.TEMPERATURE, Param.HUMIDITY, Param.HUMIDITY2, Param.PRESSURE, Param.RADON_CONCENTRATION
+    ),
+}
+
+_NAMES = {
+    AranetType.ARANET4: "Aranet4",
+    AranetType.ARANET2: "Aranet2",
+    AranetType.ARANET_RADIATION: "Aranet☢",
+    AranetType.ARANET_RADON: "AranetRn+",
+}
+
+# First byte of sensor state, and of Aranet2/Radiation/Radon current readings
+_STATE_TYPES = {
+    AranetType.ARANET4: 0xF1,
+    AranetType.ARANET2: 0xF2,
+    AranetType.ARANET_RADON: 0xF3,
+    AranetType.ARANET_RADIATION: 0xF4,
+}
+_READING_TYPES = {
+    AranetType.ARANET2: 2,
+    AranetType.ARANET_RADON: 3,
+    AranetType.ARANET_RADIATION: 4,
+}
+
+_HISTORY_V1_HEADER = struct.Struct("<BHB")
+_HISTORY_V2_HEADER = struct.Struct("<BHHHHB")
+
+# Raw history value of datapoint number `idx`, counted since device start
+_SAMPLES = {
+    Param.TEMPERATURE: lambda idx: 400 + idx % 40,
+    Param.HUMIDITY: lambda idx: 35 + idx % 200 // 10,
+    Param.HUMIDITY2: lambda idx: 350 + idx % 200,
+    Param.PRESSURE: lambda idx: 10000 + idx % 300,
+    Param.CO2: lambda idx: 400 + idx % 1200,
+    Param.RADIATION_DOSE: lambda idx: idx % 100,
+    Param.RADIATION_DOSE_RATE: lambda idx: 8 + idx % 5,
+    Param.RADIATION_DOSE_INTEGRAL: lambda idx: 1000 + idx * 10,
+    Param.RADON_CONCENTRATION: lambda idx: 10 + idx % 200,
+}
+
+# Sensor state flags
+_INTEGRATIONS_BIT = 0x80
+_EXTENDED_RANGE_BIT = 0x02
+
+
+class SimulatedCharacteristic:
+    """GATT characteristic, as passed to notification callbacks"""
+
+    def __init__(self, uuid: str):
+        self.uuid = uuid
+
+    def __repr__(self):
+        return f"SimulatedCharacteristic({self.uuid!r})"
+
+
+class SimulatedServices:
+    """Same lookup as `BleakGATTServiceCollection`"""
+
+    def __init__(self, uuids):
+        self.characteristics = {uuid: SimulatedCharacteristic(uuid) for uuid in uuids}
+
+    def get_characteristic(self, specifier):
+        return self.characteristics.get(getattr(specifier, "uuid", specifier))
+
+
+class SimulatedDevice:
+    """
+    Fake `BleakClient` of one Aranet device.
+    `type` : Device model, `AranetType`
+    `log_size` : Datapoints stored at start
+    `capacity` : Datapoints device can store, the oldest are dropped when full
+    `interval` : Seconds between datapoints
+    `ago` : Seconds since the last datapoint was logged
+    `history_v2` : Send history with read based protocol, otherwise notifications
+    `packet_size` : Payload bytes of one history packet, header included
+    `latency` : Seconds every GATT operation and notification takes
+    `packet_loss` : Probability a history notification is lost, or a history
+    read finds data not prepared yet
+    `log_every` : Log a new datapoint every this many history packets, so log
+    rolls over during download
+    `seed` : Seed of packet loss randomness
+    """
+
+    def __init__(
+        self,
+        address: str = "00:11:22:33:44:55",
+        type: AranetType = AranetType.ARANET4,
+        log_size: int = 2016,
+        capacity: int = 2016,
+        interval: int = 60,
+        ago: int = 30,
+        history_v2: bool = True,
+        packet_size: int = 244,
+        latency: float = 0,
+        packet_loss: float = 0,
+        log_every: int = None,
+        seed: int = None,
+    ):
+        self.address = address
+        self.type = type
+        self.capacity = capacity
+        self.interval = interval
+        self.history_v2 = history_v2
+        self.packet_size = packet_size
+        self.latency = latency
+        self.packet_loss = packet_loss
+        self.log_every = log_every
+        self.name = f"{_NAMES[type]} {address.replace(':', '')[-5:]}"
+        self.version = "v1.4.4"
+        self.battery = 90
+        self.integrations = True
+        self.extended_range = False
+        self.is_connected = False
+
+        # Raw datapoints of every parameter, oldest first
+        self.history = {param: [] for param in HISTORY_PARAMS[type]}
+        self.logged = 0
+        # Operation counters, and commands received
+        self.reads = 0
+        self.writes = 0
+        self.packets_sent = 0
+        self.packets_lost = 0
+        self.commands = []
+
+        self._random = random.Random(seed)
+        self._request_v2 = None  # (param, next datapoint number)
+        self._request_v1 = None  # (param, start, end)
+        self._notify = {}
+        self._notify_task = None
+        self.log(log_size)
+        self.ago = ago
+
+        uuids = [
+            Aranet4.CHARACTERISTIC_DEVICE_NAME,
+            Aranet4.CHARACTERISTIC_MODEL_NUMBER,
+            Aranet4.CHARACTERISTIC_SERIAL_NO,
+            Aranet4.CHARACTERISTIC_SW_REV,
+            Aranet4.CHARACTERISTIC_HW_REV,
+            Aranet4.CHARACTERISTIC_BATTERY_LEVEL,
+            Aranet4.CHARACTERISTIC_SENSOR_STATE,
+            Aranet4.CHARACTERISTIC_CMD,
+            Aranet4.CHARACTERISTIC_TOTAL_READINGS,
+            Aranet4.CHARACTERISTIC_INTERVAL,
+            Aranet4.CHARACTERISTIC_SECONDS_SINCE_UPDATE,
+            Aranet4.CHARACTERISTIC_HISTORY_READINGS_V1,
+        ]
+        if history_v2:
+            uuids.append(Aranet4.CHARACTERISTIC_HISTORY_READINGS_V2)
+        if type == AranetType.ARANET4:
+            uuids += [Aranet4.CHARACTERISTIC_CURRENT_READINGS, Aranet4.CHARACTERISTIC_CURRENT_READINGS_DET]
+        else:
+            uuids.append(Aranet4.CHARACTERISTIC_CURRENT_READINGS_AR2)
+        self.services = SimulatedServices(uuids)
+
+    def log(self, count: int = 1):
+        """Log `count` new datapoints of every parameter"""
+        for _ in range(count):
+            for param, values in self.history.items():
+                values.append(_SAMPLES[param](self.logged))
+                if len(values) > self.capacity:
+                    del values[0]
+            self.logged += 1
+        self.ago = 0
+
+    @property
+    def log_size(self) -> int:
+        return len(next(iter(self.history.values())))
+
+    def latest(self, param: Param) -> int:
+        """Raw value of the last datapoint of parameter"""
+        values = self.history.get(param)
+        return values[-1] if values else _SAMPLES[param](0)
+
+    async def connect(self, **kwargs):
+        await asyncio.sleep(self.latency)
+        self.is_connected = True
+        return True
+
+    async def disconnect(self):
+        if self._notify_task:
+            self._notify_task.cancel()
+            self._notify_task = None
+        self._notify.clear()
+        self.is_connected = False
+        return True
+
+    def _characteristic(self, specifier) -> str:
+        characteristic = self.services.get_characteristic(specifier)
+        if characteristic is None:
+            raise BleakError(f"Characteristic {specifier} was not found!")
+        if not self.is_connected:
+            raise BleakError("Not connected")
+        return characteristic.uuid
+
+    async def read_gatt_char(self, char_specifier, **kwargs) -> bytearray:
+        uuid = self._characteristic(char_specifier)
+        await asyncio.sleep(self.latency)
+        self.reads += 1
+        return bytearray(self._read(uuid))
+
+    async def write_gatt_char(self, char_specifier, data, response: bool = None):
+        uuid = self._characteristic(char_specifier)
+        await asyncio.sleep(self.latency)
+        self.writes += 1
+        if uuid != Aranet4.CHARACTERISTIC_CMD:
+            raise BleakError(f"Characteristic {uuid} is not writable")
+        self._command(bytes(data))
+
+    async def start_notify(self, char_specifier, callback, **kwargs):
+        uuid = self._characteristic(char_specifier)
+        await asyncio.sleep(self.latency)
+        self._notify[uuid] = callback
+        self._start_history_v1()
+
+    async def stop_notify(self, char_specifier):
+        uuid = self._characteristic(char_specifier)
+        self._notify.pop(uuid, None)
+
+    def _read(self, uuid: str) -> bytes:
+        if uuid == Aranet4.CHARACTERISTIC_HISTORY_READINGS_V2:
+            return self._history_v2_packet()
+        if uuid == Aranet4.CHARACTERISTIC_DEVICE_NAME:
+            return self.name.encode("utf-8")
+        if uuid == Aranet4.CHARACTERISTIC_MODEL_NUMBER:
+            return self.name.split(" ")[0].encode("utf-8")
+        if uuid == Aranet4.CHARACTERISTIC_SERIAL_NO:
+            return self.name.split(" ")[-1].encode("utf-8")
+        if uuid == Aranet4.CHARACTERISTIC_SW_REV:
+            return self.version.encode("utf-8")
+        if uuid == Aranet4.CHARACTERISTIC_HW_REV:
+            return b"12"
+        if uuid == Aranet4.CHARACTERISTIC_BATTERY_LEVEL:
+            return bytes([self.battery])
+        if uuid == Aranet4.CHARACTERISTIC_SENSOR_STATE:
+            return self._sensor_state()
+        if uuid == Aranet4.CHARACTERISTIC_TOTAL_READINGS:
+            return struct.pack("<H", self.log_size)
+        if uuid == Aranet4.CHARACTERISTIC_INTERVAL:
+            return struct.pack("<H", self.interval)
+        if uuid == Aranet4.CHARACTERISTIC_SECONDS_SINCE_UPDATE:
+            return struct.pack("<H", self.ago)
+        if uuid in (Aranet4.CHARACTERISTIC_CURRENT_READINGS, Aranet4.CHARACTERISTIC_CURRENT_READINGS_DET):
+            value = struct.pack(
+                "<HHHBBB",
+                self.latest(Param.CO2),
+                self.latest(Param.TEMPERATURE),
+                self.latest(Param.PRESSURE),
+                self.latest(Param.HUMIDITY),
+                self.battery,
+                1,  # green
+            )
+            if uuid == Aranet4.CHARACTERISTIC_CURRENT_READINGS_DET:
+                value += struct.pack("<HH", self.interval, self.ago)
+            return value
+        if uuid == Aranet4.CHARACTERISTIC_CURRENT_READINGS_AR2:
+            return self._current_readings()
+        # Characteristic without simulated value
+        return b""
+
+    def _current_readings(self) -> bytes:
+        """Current readings of Aranet2, Radiation and Radon"""
+        header = (_READING_TYPES[self.type], self.interval, self.ago, self.battery)
+        if self.type == AranetType.ARANET2:
+            return struct.pack(
+                "<HHHBHHB", *header,
+                self.latest(Param.TEMPERATURE), self.latest(Param.HUMIDITY2), 0,
+            )
+        if self.type == AranetType.ARANET_RADIATION:
+            return struct.pack(
+                "<HHHBIQQB", *header,
+                self.latest(Param.RADIATION_DOSE_RATE) * 10,
+                self.latest(Param.RADIATION_DOSE_INTEGRAL),
+                self.logged * self.interval,
+                0,
+            )
+        radon = self.latest(Param.RADON_CONCENTRATION)
+        return struct.pack(
+            "<HHHBHHHIBIIIIIIIB", *header,
+            self.latest(Param.TEMPERATURE),
+            self.latest(Param.PRESSURE),
+            self.latest(Param.HUMIDITY2),
+            radon,
+            1,  # green
+            # Time and value of 24 h, 7 day and 30 day averages
+            86400, radon, 604800, radon, 2592000, radon,
+            0,
+            0,
+        )
+
+    def _sensor_state(self) -> bytes:
+        options = 0x01  # buzzer available
+        if self.integrations:
+            options |= _INTEGRATIONS_BIT
+        if self.extended_range:
+            options |= _EXTENDED_RANGE_BIT
+        # Buzzer on once, temperature in Celsius
+        return bytes([_STATE_TYPES[self.type], 0x21, options, 0x00])
+
+    def _command(self, data: bytes):
+        self.commands.append(data)
+        command = data[0]
+        if command == 0x61:
+            param, start = struct.unpack_from("<xBH", data)
+            self._request_v2 = (Param(param), max(start, 1))
+        elif command == 0x82:
+            param, start, end = struct.unpack_from("<xBxxHH", data)
+            self._request_v1 = (Param(param), max(start, 1), end)
+            self._start_history_v1()
+        elif command == 0x90:
+            # Interval change clears the log
+            self.interval = data[1] * 60
+            for values in self.history.values():
+                values.clear()
+            self.ago = 0
+        elif command == 0x91:
+            self.integrations = bool(data[1])
+        elif command == 0x92:
+            self.extended_range = bool(data[1])
+
+    def _packet_count(self, param: Param, header_size: int) -> int:
+        """Datapoints of parameter fitting in one history packet"""
+        value_size = _history_struct(param, 1).size
+        return max(min((self.packet_size - header_size) // value_size, 0xFF), 1)
+
+    def _values(self, param: Param, start: int, count: int) -> list:
+        return self.history[param][start - 1:start - 1 + count]
+
+    def _sent_packet(self):
+        self.packets_sent += 1
+        if self.log_every and self.packets_sent % self.log_every == 0:
+            self.log()
+
+    def _history_v2_packet(self) -> bytes:
+        if self._request_v2 is None or self._random.random() < self.packet_loss:
+            # Data not prepared yet
+            if self._request_v2:
+                self.packets_lost += 1
+            return _HISTORY_V2_HEADER.pack(0, self.interval, self.log_size, self.ago, 0, 0)
+
+        param, start = self._request_v2
+        if param not in self.history:
+            # Parameter not logged by this model: empty packet, request dropped
+            self._request_v2 = None
+            return _HISTORY_V2_HEADER.pack(param, self.interval, self.log_size, self.ago, start, 0)
+        values = self._values(param, start, self._packet_count(param, _HISTORY_V2_HEADER.size))
+        self._request_v2 = (param, start + len(values))
+        header = _HISTORY_V2_HEADER.pack(param, self.interval, self.log_size, self.ago, start, len(values))
+        self._sent_packet()
+        return header + _history_struct(param, len(values)).pack(*values)
+
+    def _start_history_v1(self):
+        callback = self._notify.get(Aranet4.CHARACTERISTIC_HISTORY_READINGS_V1)
+        if callback is None or self._request_v1 is None:
+            return
+        request, self._request_v1 = self._request_v1, None
+        if self._notify_task:
+            self._notify_task.cancel()
+        self._notify_task = asyncio.ensure_future(self._send_history_v1(callback, *request))
+
+    async def _send_history_v1(self, callback, param: Param, start: int, end: int):
+        sender = self.services.get_characteristic(Aranet4.CHARACTERISTIC_HISTORY_READINGS_V1)
+        if param not in self.history:
+            # Parameter not logged by this model: end of data packet only
+            await asyncio.sleep(self.latency)
+            callback(sender, bytearray(_HISTORY_V1_HEADER.pack(param, start, 0)))
+            return
+        count = self._packet_count(param, _HISTORY_V1_HEADER.size)
+        while start <= min(end, self.log_size):
+            await asyncio.sleep(self.latency)
+            values = self._values(param, start, min(count, end - start + 1))
+            packet = _HISTORY_V1_HEADER.pack(param, start, len(values))
+            packet += _history_struct(param, len(values)).pack(*values)
+            start += len(values)
+            self._sent_packet()
+            if self._random.random() < self.packet_loss:
+                self.packets_lost += 1
+                continue
+            callback(sender, bytearray(packet))
@@ -0,0 +1,214 @@
+"""
+Local SQLite store of history records of many devices.
+Datapoints are keyed by device address and log time, so overlapping
+downloads are stored only once. Missing or invalid values are NULL, and
+are filled in by later downloads of the same datapoints.
+"""
+
+from array import array
+import bisect
+from itertools import groupby, islice, repeat
+import sqlite3
+import time
+
+from aranet4.records import Record, RecordColumns, _attach_tzinfo
+
+# Column of every `RecordItem` field and its SQLite type
+COLUMNS = {
+    "temperature": "REAL",
+    "humidity": "REAL",
+    "pressure": "REAL",
+    "co2": "INTEGER",
+    "rad_dose": "INTEGER",
+    "rad_dose_rate": "INTEGER",
+    "rad_dose_total": "INTEGER",
+    "radon_concentration": "INTEGER",
+}
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS records (
+    device TEXT NOT NULL,
+    ts REAL NOT NULL,
+    {", ".join(f"{name} {sql_type}" for name, sql_type in COLUMNS.items())},
+    PRIMARY KEY (device, ts)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS devices (
+    device TEXT PRIMARY KEY,
+    name TEXT,
+    version TEXT,
+    records_on_device INTEGER,
+    updated REAL
+);
+"""
+
+# Log times are derived from current time when downloaded, so the same
+# datapoint can be a second off between downloads. Times closer than half
+# of the shortest logging interval (1 minute) are the same datapoint.
+TIME_TOLERANCE = 30
+
+_INSERT = (
+    f"INSERT INTO records (device, ts, {', '.join(COLUMNS)}) "
+    f"VALUES ({', '.join('?' * (len(COLUMNS) + 2))}) "
+    "ON CONFLICT (device, ts) DO UPDATE SET "
+    + ", ".join(f"{name} = COALESCE(records.{name}, excluded.{name})" for name in COLUMNS)
+    + " WHERE "
+    + " OR ".join(f"(records.{name} IS NULL AND excluded.{name} IS NOT NULL)" for name in COLUMNS)
+)
+
+_UPSERT_DEVICE = (
+    "INSERT INTO devices (device, name, version, records_on_device, updated) "
+    "VALUES (?, ?, ?, ?, ?) ON CONFLICT (device) DO UPDATE SET "
+    "name = excluded.name, version = excluded.version, "
+    "records_on_device = excluded.records_on_device, updated = excluded.updated"
+)
+
+
+def _timestamp(when) -> float:
+    """Epoch seconds of datetime (naive is local time) or number"""
+    if hasattr(when, "timestamp"):
+        return _attach_tzinfo(when).timestamp()
+    return when
+
+
+def _null(value):
+    return None if value == -1 else value
+
+
+def _record_rows(device: str, value):
+    """
+    Insert parameters for every row of `Record.value`, -1 stored as NULL.
+    Rows without any value (not fetched from device) are skipped, so they
+    do not hide datapoints downloaded later.
+    """
+    if isinstance(value, RecordColumns):
+        rows = zip(value.timestamps, *[
+            repeat(None) if column is None else map(_null, column)
+            for column in (value.columns.get(name) for name in COLUMNS)
+        ])
+    else:
+        rows = (
+            (item.date.timestamp(), *[_null(getattr(item, name)) for name in COLUMNS])
+            for item in value
+        )
+    for row in rows:
+        if row.count(None) < len(COLUMNS):
+            yield (device,) + row
+
+
+class HistoryStore:
+    """
+    SQLite database of history records, file is created if it does not
+    exist. Can be used as context manager, which closes the database.
+    """
+
+    def __init__(self, path, batch_size: int = 5000):
+        self.batch_size = batch_size
+        self.db = sqlite3.connect(path)
+        # Readers are not blocked while new records are written
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self.db.close()
+
+    def add(self, device: str, records) -> int:
+        """
+        Store records of device with address `device`. `records` is
+        `client.Record` or iterable of them, such as `client.stream_records`.
+        Values of datapoints already stored are kept, missing ones are
+        filled in. Every `batch_size` rows are written in one transaction.
+        Returns number of new rows.
+        """
+        if isinstance(records, Record):
+            records = (records,)
+        device = device.upper()
+        added = 0
+        for record in records:
+            with self.db:
+                self.db.execute(_UPSERT_DEVICE, (
+                    device, record.name, record.version, record.records_on_device, time.time()
+                ))
+            rows = _record_rows(device, record.value)
+            while batch := list(islice(rows, self.batch_size)):
+                with self.db:
+                    added += self._match_stored(device, batch)
+                    self.db.executemany(_INSERT, batch)
+        return added
+
+    def _match_stored(self, device: str, batch: list) -> int:
+        """
+        Replace log time of every row in `batch` by the time already stored
+        for the same datapoint. Returns number of new rows.
+        """
+        times = [row[1] for row in batch]
+        stored = [ts for (ts,) in self.db.execute(
+            "SELECT ts FROM records WHERE device = ? AND ts > ? AND ts < ? ORDER BY ts",
+            (device, min(times) - TIME_TOLERANCE, max(times) + TIME_TOLERANCE),
+        )]
+        added = 0
+        for idx, row in enumerate(batch):
+            ts = row[1]
+            pos = bisect.bisect_right(stored, ts - TIME_TOLERANCE)
+            if pos < len(stored) and stored[pos] < ts + TIME_TOLERANCE:
+                batch[idx] = (device, stored[pos]) + row[2:]
+            else:
+                bisect.insort(stored, ts)
+                added += 1
+        return added
+
+    def devices(self) -> dict:
+        """Dictionary of stored device address and its name"""
+        return dict(self.db.execute("SELECT device, name FROM devices ORDER BY device"))
+
+    def last_timestamp(self, device: str):
+        """Log time of the newest stored record of device, or None"""
+        (timestamp,) = self.db.execute(
+            "SELECT MAX(ts) FROM records WHERE device = ?", (device.upper(),)
+        ).fetchone()
+        return timestamp
+
+    def query(self, start=None, end=None, devices: list = None) -> dict:
+        """
+        Records logged from `start` until `end` (datetime or epoch seconds,
+        both included) of all devices, or of `devices` addresses.
+        Returns dictionary of device address and `client.RecordColumns`.
+        Columns without any value are left out, NULL values read as -1.
+        """
+        conditions = []
+        params = []
+        if start is not None:
+            conditions.append("ts >= ?")
+            params.append(_timestamp(start))
+        if end is not None:
+            conditions.append("ts <= ?")
+            params.append(_timestamp(end))
+        if devices is not None:
+            conditions.append(f"device IN ({', '.join('?' * len(devices))})")
+            params.extend(device.upper() for device in devices)
+        else:
+            # Time range of every device is then searched by primary key
+            conditions.append("device IN (SELECT device FROM devices)")
+        rows = self.db.execute(
+            f"SELECT device, ts, {', '.join(COLUMNS)} FROM records "
+            f"WHERE {' AND '.join(conditions)} ORDER BY device, ts",
+            params,
+        )
+
+        result = {}
+        for device, device_rows in groupby(rows, key=lambda row: row[0]):
+            _, timestamps, *columns = zip(*device_rows)
+            values = {}
+            for (name, sql_type), column in zip(COLUMNS.items(), columns):
+                if all(value is None for value in column):
+                    continue
+                typecode = "d" if sql_type == "REAL" else "q"
+                values[name] = array(typecode, [-1 if value is None else value for value in column])
+            result[device] = RecordColumns(array("d", timestamps), values)
+        return result
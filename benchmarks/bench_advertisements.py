@@ -0,0 +1,145 @@
+"""
+Micro-benchmark of advertisement decoding.
+Compares `Aranet4Advertisement` with the former implementation, which
+copied manufacturer data and inserted the missing Aranet4 device type byte.
+Only the layout step avoids the copy: every advert still creates
+`ManufacturerData`, `Version` and `CurrentReading`, which take most of the
+time, so whole adverts decode only a few percent faster. The layout step
+alone is measured separately.
+
+Usage: PYTHONPATH=. python benchmarks/bench_advertisements.py
+"""
+
+import struct
+import timeit
+
+from bleak.backends.device import BLEDevice
+from bleak.backends.scanner import AdvertisementData
+
+from aranet4.client import (
+    _ADVERTISEMENT_READINGS,
+    Aranet4,
+    Aranet4Advertisement,
+    AranetType,
+    CurrentReading,
+    ManufacturerData,
+)
+
+
+def legacy_advertisement(device, ad_data) -> Aranet4Advertisement:
+    """`Aranet4Advertisement.__init__` before precompiled layouts"""
+    self = Aranet4Advertisement()
+    self.device = device
+    self.rssi = getattr(ad_data, "rssi", None)
+    mf_data = ManufacturerData()
+    raw_bytes = bytearray(ad_data.manufacturer_data[Aranet4.MANUFACTURER_ID])
+
+    valid_name = device.name and device.name.startswith(("Aranet4", "Aranet2", "Aranet☢", "AranetRn"))
+    cond_name = valid_name and device.name.startswith("Aranet4")
+    cond_len = not valid_name and len(raw_bytes) in [7, 22]
+    if cond_name or cond_len:
+        raw_bytes.insert(0, 0)
+
+    value = struct.unpack("<BBBB", raw_bytes[1:5])
+    mf_data.decode(value)
+    self.manufacturer_data = mf_data
+    if not mf_data.integrations:
+        return self
+
+    aranetv = raw_bytes[0]
+    if aranetv == 0:
+        value_fmt = "<xxxxxxxxxHHHBBBHH"
+        aranetv = AranetType.ARANET4
+    elif aranetv == 1:
+        value_fmt = "<xxxxxxxxHHHHBBBHHB"
+        aranetv = AranetType.ARANET2
+    elif aranetv == 2:
+        value_fmt = "<xxxxxxIIHBBBHHB"
+        aranetv = AranetType.ARANET_RADIATION
+    elif aranetv == 3:
+        value_fmt = "<xxxxxxxxHHHHBBBHHB"
+        aranetv = AranetType.ARANET_RADON
+    else:
+        value_fmt = ""
+        aranetv = None
+
+    end = struct.calcsize(value_fmt)
+    if end > 0 and len(raw_bytes[:end]) == end:
+        value = struct.unpack(value_fmt, raw_bytes[:end])
+        self.readings = CurrentReading()
+        self.readings.name = device.name
+        self.readings.decode(value, aranetv)
+    else:
+        mf_data.integrations = False
+    return self
+
+
+# Same adverts as in tests/test_advertisements.py
+ADVERTS = [
+    ("Aranet4 12345", b"!\x05\x03\x01\x00\x05\x00\x01C\x04\x9f\x01\x8b'5\x0c\x02<\x00\x10\x00U"),
+    ("Aranet2 278F8", b"\x01!\x04\x04\x01\x00\x00\x00\x00\x00\x99\x01\x00\x00\n\x02\x00;\x09x\x00R\x00d"),
+    ("Aranet☢ 27DB3", b"\x02!&\x04\x01\x00\xd03\x00\x00l`\x06\x00\x82\x00\x00c\x00,\x01X\x00r"),
+    ("AranetRn+ 298C9", b"\x03!\x04\x06\x01\x00\x00\x00\x07\x00\xfe\x01\xc9'\xce\x01\x00d\x01X\x02\xf6\x01\x08"),
+]
+
+
+def build_adverts() -> list:
+    adverts = []
+    for name, data in ADVERTS:
+        ad_data = AdvertisementData(
+            local_name=name,
+            manufacturer_data={Aranet4.MANUFACTURER_ID: data},
+            service_data={},
+            service_uuids=[],
+            rssi=-60,
+            tx_power=-127,
+            platform_data=(),
+        )
+        adverts.append((BLEDevice(address="00:11:22:33:44:55", name=name, details=None), ad_data))
+    return adverts
+
+
+def legacy_unpack(data: bytes):
+    """Layout step only: copy, insert device type byte, unpack"""
+    raw_bytes = bytearray(data)
+    raw_bytes.insert(0, 0)
+    end = struct.calcsize("<xxxxxxxxxHHHBBBHH")
+    return struct.unpack("<xxxxxxxxxHHHBBBHH", raw_bytes[:end])
+
+
+def layout_unpack(data: bytes):
+    """Layout step only: precompiled layout read at offset"""
+    _, layout = _ADVERTISEMENT_READINGS[AranetType.ARANET4]
+    return layout.unpack_from(data, 0)
+
+
+def main():
+    adverts = build_adverts()
+    for device, ad_data in adverts:
+        assert legacy_advertisement(device, ad_data) == Aranet4Advertisement(device, ad_data)
+
+    number = 5000
+    for name, func in [
+        ("legacy", legacy_advertisement),
+        ("Aranet4Advertisement", Aranet4Advertisement),
+    ]:
+        def run():
+            for device, ad_data in adverts:
+                func(device, ad_data)
+
+        seconds = min(timeit.repeat(run, number=number, repeat=5))
+        print(f"{name:<30} {len(adverts) * number / seconds / 1e3:>8.1f} k adverts/s")
+
+    data = ADVERTS[0][1]
+    assert legacy_unpack(data) == layout_unpack(data)
+    number = 100000
+    for name, func in [
+        ("legacy Aranet4 layout", legacy_unpack),
+        ("precompiled Aranet4 layout", layout_unpack),
+    ]:
+        seconds = min(timeit.repeat(lambda: func(data), number=number, repeat=5))
+        print(f"{name:<30} {number / seconds / 1e3:>8.1f} k adverts/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+Baseline files shared by benchmark scripts. Baseline is JSON with Python
+version, machine and results by case name, and is only comparable with
+results measured on the same machine and Python version.
+"""
+
+import json
+import platform
+
+
+def add_arguments(parser, tolerance: float):
+    """Add `--save`, `--baseline` and `--tolerance` options to `parser`"""
+    parser.add_argument("--save", metavar="FILE", help="Save results as baseline JSON")
+    parser.add_argument("--baseline", metavar="FILE", help="Compare with baseline JSON")
+    parser.add_argument(
+        "--tolerance", type=float, default=tolerance, help=f"Allowed slowdown (default: {tolerance})"
+    )
+
+
+def load_baseline(path) -> dict:
+    """Results by case name of baseline file, empty without `path`"""
+    if not path:
+        return {}
+    with open(path, encoding="utf-8") as file:
+        return json.load(file)["results"]
+
+
+def save_baseline(path, results: dict):
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump({
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "results": results,
+        }, file, indent=2)
+        file.write("\n")
+
+
+def slowdown(value: float, baseline: float, tolerance: float, higher_is_faster: bool) -> tuple:
+    """
+    Relative change of `value` to `baseline`, and whether it is slower
+    by more than `tolerance` (fraction of baseline)
+    """
+    change = value / baseline - 1
+    return change, (change < -tolerance if higher_is_faster else change > tolerance)
@@ -0,0 +1,107 @@
+"""
+Micro-benchmark of datapoint decoding.
+Compares per-parameter precompiled decoders with the former `if/elif`
+implementation of `CurrentReading._set`.
+
+Usage: PYTHONPATH=. python benchmarks/bench_decoders.py
+"""
+
+import timeit
+
+from aranet4.client import PARAM_DECODERS, CurrentReading, Param
+
+
+def legacy_set(param: Param, value: int):
+    """`CurrentReading._set` before precompiled decoders"""
+    invalid_reading_flag = True
+    multiplier = 1
+    if param == Param.CO2:
+        invalid_reading_flag = value >> 15 == 1
+        multiplier = 1
+    elif param == Param.PRESSURE:
+        invalid_reading_flag = value >> 15 == 1
+        multiplier = 0.1
+    elif param == Param.TEMPERATURE:
+        invalid_reading_flag = value >> 14 & 1 == 1
+        multiplier = 0.05
+    elif param == Param.HUMIDITY:
+        invalid_reading_flag = value >> 8
+        multiplier = 1
+    elif param == Param.HUMIDITY2:
+        invalid_reading_flag = value >> 15 == 1
+        multiplier = 0.1
+    elif param == Param.RADIATION_DOSE:
+        invalid_reading_flag = value >> 15 == 1
+        multiplier = 1
+    elif param == Param.RADIATION_DOSE_RATE:
+        invalid_reading_flag = value >> 15 == 1
+        multiplier = 10
+    elif param == Param.RADIATION_DOSE_INTEGRAL:
+        invalid_reading_flag = value >> 63 == 1
+        multiplier = 1
+    elif param == Param.RADON_CONCENTRATION:
+        invalid_reading_flag = value >= 0x1f00
+        multiplier = 1
+
+    if invalid_reading_flag:
+        return -1
+    if isinstance(multiplier, float):
+        return round(value * multiplier, 1)
+    return value * multiplier
+
+
+PARAMS = [
+    Param.TEMPERATURE,
+    Param.HUMIDITY,
+    Param.PRESSURE,
+    Param.CO2,
+    Param.HUMIDITY2,
+    Param.RADIATION_DOSE_RATE,
+    Param.RADON_CONCENTRATION,
+]
+VALUES = list(range(0, 0x200, 7))
+
+
+def run_legacy():
+    for param in PARAMS:
+        for value in VALUES:
+            legacy_set(param, value)
+
+
+def run_set():
+    for param in PARAMS:
+        for value in VALUES:
+            CurrentReading._set(param, value)
+
+
+def run_decoders():
+    for param in PARAMS:
+        decode = PARAM_DECODERS[param].decode
+        for value in VALUES:
+            decode(value)
+
+
+def run_decode_many():
+    for param in PARAMS:
+        PARAM_DECODERS[param].decode_many(VALUES)
+
+
+def main():
+    for param in PARAMS:
+        for value in VALUES:
+            assert legacy_set(param, value) == CurrentReading._set(param, value)
+
+    calls = len(PARAMS) * len(VALUES)
+    number = 200
+    for name, func in [
+        ("legacy if/elif _set", run_legacy),
+        ("CurrentReading._set", run_set),
+        ("PARAM_DECODERS[].decode", run_decoders),
+        ("PARAM_DECODERS[].decode_many", run_decode_many),
+    ]:
+        seconds = min(timeit.repeat(func, number=number, repeat=5))
+        print(f"{name:<30} {calls * number / seconds / 1e6:>8.2f} M values/s")
+
+
+if __name__ == "__main__":
+    main()
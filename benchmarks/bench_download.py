@@ -0,0 +1,56 @@
+"""
+Load test of history download and fleet polling with simulated devices.
+Shows datapoints downloaded per second over both history protocols, and
+how fleet polling scales with connection limit, at given GATT latency.
+
+Usage: PYTHONPATH=. python benchmarks/bench_download.py [latency seconds]
+"""
+
+import asyncio
+import contextlib
+import io
+import sys
+import time
+
+from aranet4 import client
+from aranet4 import fleet
+from aranet4 import history
+from aranet4.pool import Aranet4Pool
+from aranet4.simulator import SimulatedDevice
+
+DEVICES = 20
+
+
+async def download(history_v2: bool, latency: float) -> float:
+    device = SimulatedDevice(log_size=2016, history_v2=history_v2, latency=latency)
+    started = time.perf_counter()
+    async with client.Aranet4(device.address, client=device) as monitor:
+        with contextlib.redirect_stdout(io.StringIO()):
+            record = await history._read_records(monitor, {}, False)
+    seconds = time.perf_counter() - started
+    return len(record.value) * len(record.value.columns) / seconds
+
+
+async def poll_fleet(max_connections: int, latency: float) -> float:
+    addresses = [f"00:11:22:33:44:{idx:02X}" for idx in range(DEVICES)]
+    started = time.perf_counter()
+    async with Aranet4Pool(
+        client_factory=lambda address: SimulatedDevice(address, latency=latency)
+    ) as pool:
+        async for result in fleet.stream_current_readings(addresses, max_connections, pool=pool):
+            assert result.error is None, result.error
+    return time.perf_counter() - started
+
+
+def main(latency: float):
+    print(f"GATT latency {latency * 1000:.1f} ms")
+    for name, history_v2 in [("history v1 notifications", False), ("history v2 reads", True)]:
+        rate = asyncio.run(download(history_v2, latency))
+        print(f"{name:<30} {rate:>10,.0f} datapoints/s")
+    for max_connections in (1, 3, 5):
+        seconds = asyncio.run(poll_fleet(max_connections, latency))
+        print(f"{DEVICES} devices, {max_connections} connections{'':<8} {seconds:>10.3f} s")
+
+
+if __name__ == "__main__":
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else 0.005)
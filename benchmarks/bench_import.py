@@ -0,0 +1,104 @@
+"""
+Import time benchmark of `aranetctl` and library modules. Every module
+is imported in a fresh interpreter with `python -X importtime`, reported
+time is the minimum of all runs and excludes interpreter startup.
+Heavy dependencies loaded by each import are listed too.
+
+Usage:
+    PYTHONPATH=. python benchmarks/bench_import.py [--save FILE]
+    PYTHONPATH=. python benchmarks/bench_import.py --baseline FILE [--tolerance 0.2]
+
+Exit status is 1 when any import is slower than in the baseline by more
+than `--tolerance`, or loads a heavy dependency it did not load before.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+from bench_common import add_arguments, load_baseline, save_baseline, slowdown
+
+# `aranet4.aranetctl` is all `aranetctl --help` imports
+MODULES = (
+    "aranet4",
+    "aranet4.aranetctl",
+    "aranet4.archive",
+    "aranet4.export",
+    "aranet4.store",
+    "aranet4.client",
+    "aranet4.daemon",
+)
+HEAVY = ("requests", "bleak", "asyncio", "numpy", "aranet4.client")
+
+
+def import_times(code: str) -> dict:
+    """Self time in microseconds of every module imported by `code`"""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [os.getcwd(), os.environ.get("PYTHONPATH")])))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True, text=True, env=env, check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(self_us)
+    return times
+
+
+def measure(module: str, startup: set, repeat: int) -> dict:
+    runs = [import_times(f"import {module}") for _ in range(repeat + 1)]
+    # First run compiles bytecode of changed modules
+    totals = [sum(us for name, us in times.items() if name not in startup) for times in runs[1:]]
+    loaded = runs[-1]
+    return {
+        "ms": min(totals) / 1000,
+        "modules": sum(1 for name in loaded if name not in startup),
+        "heavy": [name for name in HEAVY if name in loaded],
+    }
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> tuple:
+    """Returns text of change to baseline and whether import regressed"""
+    if not baseline:
+        return "", False
+    change, slower = slowdown(result["ms"], baseline["ms"], tolerance, False)
+    added = sorted(set(result["heavy"]) - set(baseline["heavy"]))
+    regression = slower or bool(added)
+    text = f"{change:>+8.1%}" + (f" +{','.join(added)}" if added else "")
+    return text + ("  REGRESSION" if regression else ""), regression
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Benchmark import time of aranetctl and library modules")
+    add_arguments(parser, tolerance=0.2)
+    parser.add_argument("--repeat", type=int, default=5, help="Imports of every module (default: 5)")
+    args = parser.parse_args(argv)
+
+    baseline = load_baseline(args.baseline)
+
+    startup = set(import_times("pass"))
+    print(f"{'module':<20} {'ms':>8} {'modules':>8}  {'heavy':<40}" + (f" {'change':>8}" if baseline else ""))
+    results = {}
+    regressions = []
+    for module in MODULES:
+        result = measure(module, startup, args.repeat)
+        results[module] = result
+        change, regression = compare(result, baseline.get(module), args.tolerance)
+        if regression:
+            regressions.append(module)
+        print(f"{module:<20} {result['ms']:>8.1f} {result['modules']:>8}  {','.join(result['heavy']):<40} {change}")
+
+    if args.save:
+        save_baseline(args.save, results)
+
+    if regressions:
+        print(f"{len(regressions)} import(s) regressed compared to baseline")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,88 @@
+"""
+Memory benchmark of reading and advertisement data classes.
+Compares bytes per instance of the slotted data classes with plain
+data classes of the same fields, which keep attributes in `__dict__`.
+
+Usage: PYTHONPATH=. python benchmarks/bench_memory.py
+"""
+
+import copy
+from dataclasses import field, fields, make_dataclass
+import datetime
+import tracemalloc
+
+from aranet4.client import (
+    Aranet4Advertisement,
+    CurrentReading,
+    ManufacturerData,
+    RecordItem,
+    SensorState,
+    Version,
+)
+
+from bench_advertisements import build_adverts
+
+COUNT = 10000
+
+
+def legacy_class(cls):
+    """Plain data class with the fields of `cls`"""
+    return make_dataclass(
+        f"Legacy{cls.__name__}",
+        [(item.name, item.type, field(default=None)) for item in fields(cls)],
+    )
+
+
+def legacy_copy(obj, classes: dict):
+    """Copy of data class `obj` as legacy data class, nested ones too"""
+    cls = classes.get(type(obj))
+    if cls is None:
+        return obj
+    return cls(**{item.name: legacy_copy(getattr(obj, item.name), classes) for item in fields(obj)})
+
+
+def bytes_per_instance(create) -> float:
+    """Memory allocated by `create()` divided by `COUNT` instances it returns"""
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        objects = create()
+        after, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert len(objects) == COUNT
+    return (after - before) / COUNT
+
+
+def samples() -> dict:
+    """Decoded instance of every data class"""
+    adverts = [Aranet4Advertisement(device, ad_data) for device, ad_data in build_adverts()]
+    state = SensorState()
+    state.decode(bytes([0xF1, 0x21, 0x81, 0x00]))
+    item = RecordItem(datetime.datetime.now(datetime.timezone.utc), 21.5, 40, 1012.3, 800, -1, -1, -1, -1)
+    return {
+        "Version": adverts[0].manufacturer_data.version,
+        "ManufacturerData": adverts[0].manufacturer_data,
+        "CurrentReading": adverts[0].readings,
+        "Aranet4Advertisement": adverts[0],
+        "RecordItem": item,
+        "SensorState": state,
+    }
+
+
+def main():
+    classes = {
+        cls: legacy_class(cls)
+        for cls in (Version, ManufacturerData, CurrentReading, Aranet4Advertisement, RecordItem, SensorState)
+    }
+    print(f"{'class':<24} {'dict B/obj':>12} {'slots B/obj':>12} {'saved':>8}")
+    for name, obj in samples().items():
+        legacy = legacy_copy(obj, classes)
+        # Nested objects are shared, only instance itself is measured
+        before = bytes_per_instance(lambda: [copy.copy(legacy) for _ in range(COUNT)])
+        after = bytes_per_instance(lambda: [copy.copy(obj) for _ in range(COUNT)])
+        print(f"{name:<24} {before:>12.0f} {after:>12.0f} {1 - after / before:>8.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+"""
+Benchmark suite of decode, filter and export hot paths. Runs offline,
+reports operations per second and peak traced memory of every case and
+compares them with a saved baseline.
+
+Usage:
+    PYTHONPATH=. python benchmarks/bench_suite.py [-k TEXT] [--save FILE]
+    PYTHONPATH=. python benchmarks/bench_suite.py --baseline FILE [--tolerance 0.1]
+
+Exit status is 1 when any case is slower than in the baseline by more
+than `--tolerance` (fraction of baseline ops/s). Baselines are only
+comparable when saved on the same machine and Python version.
+"""
+
+import argparse
+from array import array
+import asyncio
+import datetime
+import os
+import random
+import sys
+import timeit
+import tracemalloc
+
+from aranet4 import export
+from aranet4.client import (
+    PARAM_DECODERS,
+    Aranet4Advertisement,
+    Filter,
+    Param,
+    Record,
+    RecordChunk,
+    RecordColumns,
+    SensorState,
+    _collect_records,
+    _history_struct,
+    decode_history_values,
+)
+from aranet4.history import LogTimeline, _calc_start_end, _log_times
+
+from bench_advertisements import build_adverts
+from bench_common import add_arguments, load_baseline, save_baseline, slowdown
+
+# Datapoints of one history packet
+PACKET_SIZE = 200
+# Log sizes of about 11 days at 1 minute interval, and the largest log
+# device can report (16-bit count)
+LOG_SIZES = (16 * 1024, 0xFFFF)
+NOW = datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)
+INTERVAL = 60
+
+# First bytes of sensor state of every device type
+SENSOR_STATES = [
+    ("Aranet4", bytes([0xF1, 0x23, 0x83, 0x00])),
+    ("Aranet2", bytes([0xF2, 0x21, 0x02, 0x01])),
+    ("Aranet☢", bytes([0xF4, 0xA1, 0x80, 0x00])),
+    ("AranetRn+", bytes([0xF3, 0x81, 0x80, 0x00])),
+]
+
+# Parameters of Aranet4 records
+RECORD_PARAMS = {
+    Param.TEMPERATURE: "temperature",
+    Param.HUMIDITY: "humidity",
+    Param.PRESSURE: "pressure",
+    Param.CO2: "co2",
+}
+
+
+class Case:
+    """Benchmark case, every call of `func` does `ops` operations"""
+
+    def __init__(self, name: str, func, ops: int = 1):
+        self.name = name
+        self.func = func
+        self.ops = ops
+
+    def measure(self, repeat: int = 5, min_time: float = 0.2) -> dict:
+        # Calls per repeat, so one repeat lasts about `min_time`
+        timer = timeit.Timer(self.func)
+        number, seconds = timer.autorange()
+        number = max(int(number * min_time / seconds), 1)
+        seconds = min(timer.repeat(repeat=repeat, number=number))
+
+        tracemalloc.start()
+        try:
+            self.func()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return {"ops_per_sec": self.ops * number / seconds, "peak_kib": peak / 1024}
+
+
+def history_packet(param: Param, count: int = PACKET_SIZE) -> bytes:
+    """History v2 packet with `count` random valid datapoints"""
+    rnd = random.Random(int(param))
+    top = 0x100 if PARAM_DECODERS[param].value_format == "B" else 0x200
+    values = [rnd.randrange(top) for _ in range(count)]
+    return bytes(10) + _history_struct(param, count).pack(*values)
+
+
+def history_chunks(size: int) -> list:
+    """Decoded `RecordChunk`s of Aranet4 log of `size` datapoints"""
+    chunks = []
+    for param in RECORD_PARAMS:
+        values = decode_history_values(param, history_packet(param), PACKET_SIZE, 10)
+        for start in range(1, size + 1, PACKET_SIZE):
+            chunks.append(RecordChunk(param, start, values[:size - start + 1]))
+    return chunks
+
+
+def history_record(size: int) -> Record:
+    """Aranet4 record of `size` datapoints, as returned by `get_all_records`"""
+    timeline = LogTimeline(NOW, size, INTERVAL, 30)
+    log_filter = Filter(1, size, True, True, True, True, False, False, False, False)
+    record = Record("Aranet4 00001", "v1.4.4", size, log_filter)
+    record.value = RecordColumns(timeline.timestamps(), {
+        "temperature": array("d", [22.05] * size),
+        "humidity": array("h", [40] * size),
+        "pressure": array("d", [1012.3] * size),
+        "co2": array("h", [400 + idx % 2000 for idx in range(size)]),
+    })
+    return record
+
+
+def advertisement_cases() -> list:
+    cases = []
+    for device, ad_data in build_adverts():
+        name = device.name.split(" ")[0]
+        cases.append(Case(f"advertisement/{name}", lambda d=device, a=ad_data: Aranet4Advertisement(d, a)))
+    return cases
+
+
+def history_cases() -> list:
+    cases = []
+    for param in Param:
+        if param == Param.PULSES:
+            continue
+        packet = history_packet(param)
+        cases.append(Case(
+            f"history/{param.name}",
+            lambda p=param, data=packet: decode_history_values(p, data, PACKET_SIZE, 10),
+            PACKET_SIZE,
+        ))
+    return cases
+
+
+def filter_cases() -> list:
+    cases = []
+    for size in LOG_SIZES:
+        cases.append(Case(f"log_times/{size}", lambda s=size: _log_times(NOW, s, INTERVAL, 30), size))
+
+        # Window in the middle of the log, worst case of list search
+        entry_filter = {
+            "start": NOW - datetime.timedelta(seconds=INTERVAL * size // 2),
+            "end": NOW - datetime.timedelta(seconds=INTERVAL * size // 4),
+        }
+        log_times = _log_times(NOW, size, INTERVAL, 30)
+        timeline = LogTimeline(NOW, size, INTERVAL, 30)
+        cases.append(Case(
+            f"calc_start_end/list/{size}",
+            lambda t=log_times, f=entry_filter: _calc_start_end(t, f),
+        ))
+        cases.append(Case(
+            f"calc_start_end/timeline/{size}",
+            lambda t=timeline, f=entry_filter: _calc_start_end(t, f),
+        ))
+    return cases
+
+
+def record_cases(loop: asyncio.AbstractEventLoop) -> list:
+    cases = []
+    for size in LOG_SIZES:
+        chunks = history_chunks(size)
+        timeline = LogTimeline(NOW, size, INTERVAL, 30)
+
+        async def iter_chunks(chunks=chunks):
+            for chunk in chunks:
+                yield chunk
+
+        def assemble(size=size, timeline=timeline, iter_chunks=iter_chunks):
+            """Same steps as `client._read_records` after download"""
+            values = loop.run_until_complete(_collect_records(iter_chunks(), list(RECORD_PARAMS), size))
+            columns = {RECORD_PARAMS[param]: column for param, column in values.items()}
+            return RecordColumns(timeline.timestamps(), columns)[0:size + 1]
+
+        record = history_record(size)
+        cases.append(Case(f"record/assemble/{size}", assemble, size))
+        cases.append(Case(f"record/rows/{size}", lambda r=record: list(r.value), size))
+        cases.append(Case(f"export/write_csv/{size}", lambda r=record: export.write_csv(os.devnull, r), size))
+    return cases
+
+
+def sensor_state_cases() -> list:
+    cases = []
+    for name, data in SENSOR_STATES:
+        cases.append(Case(f"sensor_state/{name}", lambda d=data: SensorState().decode(d)))
+    return cases
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> tuple:
+    """Returns text of change to baseline and whether it is a regression"""
+    if not baseline:
+        return "", False
+    change, regression = slowdown(result["ops_per_sec"], baseline["ops_per_sec"], tolerance, True)
+    memory = result["peak_kib"] - baseline["peak_kib"]
+    return f"{change:>+8.1%} {memory:>+10.1f}{'  REGRESSION' if regression else ''}", regression
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Benchmark decode, filter and export hot paths")
+    parser.add_argument("-k", metavar="TEXT", help="Run only cases with TEXT in name")
+    add_arguments(parser, tolerance=0.1)
+    parser.add_argument("--repeat", type=int, default=5, help="Timing repeats (default: 5)")
+    args = parser.parse_args(argv)
+
+    baseline = load_baseline(args.baseline)
+
+    loop = asyncio.new_event_loop()
+    try:
+        cases = (
+            advertisement_cases() + history_cases() + filter_cases()
+            + record_cases(loop) + sensor_state_cases()
+        )
+        if args.k:
+            cases = [case for case in cases if args.k in case.name]
+
+        print(f"{'case':<32} {'ops/s':>14} {'peak KiB':>10}" + (f" {'change':>8} {'peak KiB':>10}" if baseline else ""))
+        results = {}
+        regressions = []
+        for case in cases:
+            result = case.measure(repeat=args.repeat)
+            results[case.name] = result
+            change, regression = compare(result, baseline.get(case.name), args.tolerance)
+            if regression:
+                regressions.append(case.name)
+            print(f"{case.name:<32} {result['ops_per_sec']:>14,.0f} {result['peak_kib']:>10.1f} {change}")
+    finally:
+        loop.close()
+
+    if args.save:
+        save_baseline(args.save, results)
+
+    if regressions:
+        print(f"{len(regressions)} case(s) slower than baseline by more than {args.tolerance:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,6 +1,5 @@
-import csv
-
 import aranet4
+from aranet4 import export
 
 # Aranet4 MAC address
 device_mac = "XX:XX:XX:XX:XX:XX"
@@ -10,36 +9,13 @@ entry_filter = {
     "last": 25
 }
 
-# Fetch results
-records = aranet4.client.get_all_records(
-    device_mac,
-    entry_filter,
-    remove_empty=True # This will remove blank records, if range parameters (start,end,last) are specified
-)
-
-# Write CSV file
-with open(file="aranet_history.csv", mode="w", encoding="utf-8") as csv_file:
-    writer = csv.writer(csv_file)
-
-    header = [
-        "date",
-        "co2",
-        "temperature",
-        "humidity",
-        "pressure"
-    ]
+# Fetch results in windows, each one is written as soon as it is downloaded
+records = aranet4.client.stream_records(device_mac, entry_filter)
 
-    # Write CSV header
-    writer.writerow(header)
-
-    # Write CSV rows
-    for line in records.value:
-        row = [
-            line.date.isoformat(),
-            line.co2,
-            line.temperature,
-            line.humidity,
-            line.pressure
-        ]
-
-        writer.writerow(row)
+# Write CSV file. Use "aranet_history.ndjson" for newline-delimited JSON,
+# add ".gz" suffix to compress the file.
+export.write_records(
+    "aranet_history.csv",
+    records,
+    fields=["date", "co2", "temperature", "humidity", "pressure"]
+)
@@ -39,7 +39,9 @@ def on_scan(advertisement):
     print()
 
 async def main(argv):
-    scanner = Aranet4Scanner(on_scan)
+    # Devices repeat the same measurement until the next one is taken,
+    # report every measurement only once
+    scanner = Aranet4Scanner(on_scan, skip_duplicates=True)
     await scanner.start()
     while True: # Run forever
         await asyncio.sleep(1)
@@ -1,9 +1,13 @@
+from dataclasses import asdict
+import struct
 import unittest
+from unittest import mock
 
 from bleak.backends.scanner import AdvertisementData
 from bleak.backends.device import BLEDevice
 
 from aranet4.client import Aranet4Advertisement
+from aranet4.client import Aranet4Scanner
 from aranet4.client import AranetType
 
 def fake_ad_data(name, service_uuid, manufacturer_data, address="00:11:22:33:44:55"):
@@ -296,5 +300,84 @@ class DataManipulation(unittest.TestCase):
             srcdata["manufacturer_data"]
         ))
 
+    def test_slots(self):
+        srcdata = TEST_DATA_ARANET_4
+        data = fake_ad_data(srcdata["name"], srcdata["uuid"], srcdata["manufacturer_data"])
+        ad = Aranet4Advertisement(data["device"], data["ad_data"])
+        for obj in (ad, ad.readings, ad.manufacturer_data, ad.manufacturer_data.version):
+            self.assertFalse(hasattr(obj, "__dict__"))
+        self.assertEqual(ad, Aranet4Advertisement(data["device"], data["ad_data"]))
+        self.assertEqual(1091, asdict(ad.readings)["co2"])
+        self.assertEqual(1091, ad.readings.toDict()["co2"])
+
+        # Fields are set, when manufacturer data is missing
+        empty = Aranet4Advertisement(data["device"])
+        self.assertIsNone(empty.readings)
+        self.assertIsNone(empty.rssi)
+
+
+def aranet4_advert(ago, co2=1091, address="00:11:22:33:44:55"):
+    """Aranet4 test advertisement with changed age and CO2 values"""
+    data = TEST_DATA_ARANET_4["manufacturer_data"][1794]
+    data = data[:8] + struct.pack("<H", co2) + data[10:19] + struct.pack("<H", ago) + data[21:]
+    return fake_ad_data(TEST_DATA_ARANET_4["name"], TEST_DATA_ARANET_4["uuid"], {1794: data}, address)
+
+
+def radiation_advert(ago, counter):
+    data = TEST_DATA_ARANET_RADIATION["manufacturer_data"][1794]
+    data = data[:21] + struct.pack("<HB", ago, counter)
+    return fake_ad_data(TEST_DATA_ARANET_RADIATION["name"], TEST_DATA_ARANET_RADIATION["uuid"], {1794: data})
+
+
+class ScannerDuplicates(unittest.TestCase):
+    def scan(self, adverts, skip_duplicates=True):
+        emitted = []
+        scanner = Aranet4Scanner(emitted.append, skip_duplicates)
+        for advert in adverts:
+            scanner._process_advertisement(advert["device"], advert["ad_data"])
+        return scanner, emitted
+
+    def test_aranet4(self):
+        scanner, emitted = self.scan([
+            aranet4_advert(16),
+            aranet4_advert(17),
+            aranet4_advert(18),
+            aranet4_advert(18, address="00:11:22:33:44:66"),
+            aranet4_advert(19, co2=1100),  # changed data
+            aranet4_advert(2),  # new measurement with the same values
+            aranet4_advert(3),
+        ])
+        self.assertEqual([16, 18, 19, 2], [adv.readings.ago for adv in emitted])
+        self.assertEqual((7, 4, 3), (
+            scanner.stats.received, scanner.stats.emitted, scanner.stats.duplicates
+        ))
+
+    def test_counter(self):
+        _, emitted = self.scan([
+            radiation_advert(88, 99),
+            radiation_advert(89, 99),
+            radiation_advert(90, 100),
+        ])
+        self.assertEqual([99, 100], [adv.readings.counter for adv in emitted])
+
+    def test_interval_passed(self):
+        # Missed age reset: same age again after more than the 60 s interval
+        times = [0, 10, 70, 71, 140]
+        with mock.patch("aranet4.scanner.time.monotonic", side_effect=times):
+            _, emitted = self.scan([
+                aranet4_advert(16),
+                aranet4_advert(26),
+                aranet4_advert(86),
+                aranet4_advert(87),
+                aranet4_advert(156),
+            ])
+        self.assertEqual([16, 86, 156], [adv.readings.ago for adv in emitted])
+
+    def test_disabled(self):
+        scanner, emitted = self.scan([aranet4_advert(16), aranet4_advert(17)], False)
+        self.assertEqual(2, len(emitted))
+        self.assertEqual(0, scanner.stats.duplicates)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,106 @@
+from array import array
+import datetime
+import os
+from pathlib import Path
+import tempfile
+import unittest
+
+from aranet4 import archive
+from aranet4 import client
+
+START = 1644903268
+
+
+def build_record(begin, size, interval=300, name="Aranet4 00001"):
+    log_filter = client.Filter(begin, begin + size - 1, True, True, False, True, False, False, False, False)
+    record = client.Record(name, "v1.4.4", 2016, log_filter)
+    first = START + (begin - 1) * interval
+    record.value = client.RecordColumns(
+        range(first, first + size * interval, interval),
+        {
+            "co2": array("h", range(800 + begin, 800 + begin + size)),
+            "temperature": array("d", [20.05] * size),
+            "humidity": array("h", [40] * size),
+        },
+    )
+    return record
+
+
+def utc(timestamp):
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc)
+
+
+class ArchiveFile(unittest.TestCase):
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.path = Path(tmp_dir.name, "history.aranet")
+
+    def test_roundtrip(self):
+        record = build_record(1, 10)
+        archive.write_archive(self.path, record)
+
+        result = archive.read_archive(self.path)
+        self.assertEqual(record.name, result.name)
+        self.assertEqual(record.version, result.version)
+        self.assertEqual(record.records_on_device, result.records_on_device)
+        self.assertEqual(record.filter, result.filter)
+        self.assertListEqual(list(record.value), list(result.value))
+
+    def test_item_rows(self):
+        record = build_record(1, 3)
+        record.value = list(record.value)
+        archive.write_archive(self.path, record)
+        self.assertListEqual(record.value, list(archive.read_archive(self.path).value))
+
+    def test_append_and_index(self):
+        archive.write_archive(self.path, build_record(1, 10))
+        archive.write_archive(self.path, [build_record(11, 5), build_record(16, 5)])
+
+        with archive.Archive(self.path) as data:
+            self.assertEqual(20, len(data))
+            self.assertEqual(3, len(data.segments))
+            self.assertEqual(300, data.interval)
+            self.assertEqual(812, data[11].co2)
+            self.assertEqual(819, data[-2].co2)
+            # Single segment is read without copying
+            self.assertIsInstance(data.read(2, 5).value.column("co2"), memoryview)
+
+            self.assertEqual(5, data.index(utc(START + 1500)))
+            self.assertEqual(6, data.index(utc(START + 1500), after=True))
+            self.assertEqual(6, data.index(utc(START + 1501)))
+            self.assertEqual(20, data.index(utc(START + 10**6)))
+
+            part = data.between(utc(START + 2700), utc(START + 3300))
+            self.assertEqual((10, 12), (part.filter.begin, part.filter.end))
+            self.assertListEqual([810, 811, 812], list(part.value.column("co2")))
+
+        last = archive.read_archive(self.path, last=4)
+        self.assertEqual((17, 20), (last.filter.begin, last.filter.end))
+
+    def test_incomplete_segment(self):
+        archive.write_archive(self.path, build_record(1, 10))
+        size = os.path.getsize(self.path)
+        with open(self.path, "ab") as archive_file:
+            archive_file.write(archive.SEGMENT_MAGIC + b"\xff" * 20)
+
+        self.assertEqual(10, len(archive.read_archive(self.path).value))
+        archive.write_archive(self.path, build_record(11, 5))
+        with archive.Archive(self.path) as data:
+            self.assertEqual(15, len(data))
+            self.assertEqual(os.path.getsize(self.path), data.data_size)
+        self.assertLess(size, os.path.getsize(self.path))
+
+    def test_other_device(self):
+        archive.write_archive(self.path, build_record(1, 10))
+        with self.assertRaises(archive.ArchiveError):
+            archive.write_archive(self.path, build_record(11, 5, name="Aranet4 00002"))
+
+    def test_not_archive(self):
+        self.path.write_text("date,co2\n", encoding="utf-8")
+        with self.assertRaises(archive.ArchiveError):
+            archive.read_archive(self.path)
+
+
+if __name__ == "__main__":
+    unittest.main()
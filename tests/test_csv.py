@@ -1,11 +1,15 @@
+from array import array
 import csv
 import difflib
+import gzip
+import json
 from pathlib import Path
 import tempfile
 import unittest
 
 from aranet4 import client
 from aranet4 import aranetctl
+from aranet4 import export
 
 here = Path(__file__).parent
 data_file = here.joinpath("data", "aranet4_readings.csv")
@@ -40,5 +44,56 @@ class CSVCreation(unittest.TestCase):
         )
         self.assertListEqual([], cmp_result)
 
+
+def build_columns():
+    log_filter = client.Filter(1, 3, True, False, False, True, False, False, False, False)
+    records = client.Record("mock_device", "v1234", 3, log_filter)
+    records.value = client.RecordColumns(
+        range(1644903268, 1644903268 + 900, 300),
+        {"co2": array("h", [830, 843, 900]), "temperature": array("d", [17.95, 17.95, 18.1])},
+    )
+    return records
+
+
+class Export(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+
+    def test_columns_csv(self):
+        path = Path(self.tmp_dir.name, "out.csv")
+        export.write_csv(path, build_columns())
+        self.assertListEqual([
+            "date,co2,temperature",
+            "2022-02-15 05:34:28+00:00,830,17.95",
+            "2022-02-15 05:39:28+00:00,843,17.95",
+            "2022-02-15 05:44:28+00:00,900,18.1",
+        ], path.read_text(encoding="utf-8").splitlines())
+
+    def test_stream_ndjson_gzip(self):
+        records = build_columns()
+        path = Path(self.tmp_dir.name, "out.ndjson.gz")
+        # Same as windows yielded by `client.stream_records`
+        chunks = [
+            client.Record("mock_device", "v1234", 3, records.filter, records.value[idx:idx + 2])
+            for idx in (0, 2)
+        ]
+        export.write_records(path, chunks)
+        with gzip.open(path, mode="rt", encoding="utf-8") as json_file:
+            rows = [json.loads(line) for line in json_file]
+        self.assertListEqual([
+            {"date": "2022-02-15T05:34:28+00:00", "co2": 830, "temperature": 17.95},
+            {"date": "2022-02-15T05:39:28+00:00", "co2": 843, "temperature": 17.95},
+            {"date": "2022-02-15T05:44:28+00:00", "co2": 900, "temperature": 18.1},
+        ], rows)
+
+    def test_selected_fields(self):
+        path = Path(self.tmp_dir.name, "out.csv")
+        export.write_csv(path, build_data(), ["date", "co2", "humidity"])
+        lines = path.read_text(encoding="utf-8").splitlines()
+        self.assertEqual("date,co2,humidity", lines[0])
+        self.assertEqual("2022-02-15 05:34:28,830,54", lines[1])
+
+
 if __name__ == "__main__":
     unittest.main()
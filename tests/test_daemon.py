@@ -0,0 +1,68 @@
+import asyncio
+import json
+import unittest
+
+from aranet4 import daemon
+
+from test_advertisements import aranet4_advert
+
+
+class ScanDaemon(unittest.TestCase):
+    def setUp(self):
+        self.daemon = daemon.ScanDaemon(history_size=2)
+        for ago, co2 in [(16, 1091), (17, 1091), (2, 1100), (3, 1100), (1, 1200)]:
+            advert = aranet4_advert(ago, co2)
+            self.daemon.scanner._process_advertisement(advert["device"], advert["ad_data"])
+
+    def test_latest(self):
+        state = self.daemon.latest("00:11:22:33:44:55")
+        self.assertEqual("Aranet4 12345", state.name)
+        self.assertEqual(-60, state.rssi)
+        self.assertEqual("v1.3.5", str(state.manufacturer_data.version))
+        self.assertEqual(1200, state.readings.co2)
+        # Only new measurements, oldest dropped
+        self.assertEqual([1100, 1200], [readings.co2 for _, readings in state.history])
+        self.assertIsNone(self.daemon.latest("00:11:22:33:44:66"))
+
+    def test_duplicates(self):
+        stats = self.daemon.scanner.stats
+        self.assertEqual((5, 3, 2), (stats.received, stats.emitted, stats.duplicates))
+        state = self.daemon.latest("00:11:22:33:44:55")
+        seen = state.seen
+        # Repeated measurement updates RSSI and time seen only
+        advert = aranet4_advert(2, 1200)
+        advert["ad_data"] = advert["ad_data"]._replace(rssi=-70)
+        self.daemon.scanner._process_advertisement(advert["device"], advert["ad_data"])
+        self.assertEqual(3, stats.duplicates)
+        self.assertEqual(-70, state.rssi)
+        self.assertGreaterEqual(state.seen, seen)
+        self.assertEqual(2, len(state.history))
+
+    def test_serve(self):
+        async def get(port, path):
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+            response = await reader.read()
+            writer.close()
+            head, body = response.split(b"\r\n\r\n", 1)
+            return head.split(b"\r\n")[0].decode(), json.loads(body)
+
+        async def run():
+            server = await self.daemon.serve(port=0)
+            port = server.sockets[0].getsockname()[1]
+            async with server:
+                return [
+                    await get(port, path)
+                    for path in ["/devices", "/devices/00:11:22:33:44:55", "/devices/unknown"]
+                ]
+
+        (status, devices), (_, device), (missing, _) = asyncio.run(run())
+        self.assertEqual("HTTP/1.1 200 OK", status)
+        self.assertEqual(1200, devices["00:11:22:33:44:55"]["readings"]["co2"])
+        self.assertNotIn("history", devices["00:11:22:33:44:55"])
+        self.assertEqual([1100, 1200], [item["co2"] for item in device["history"]])
+        self.assertEqual("HTTP/1.1 404 Not Found", missing)
+
+
+if __name__ == "__main__":
+    unittest.main()
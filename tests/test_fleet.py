@@ -0,0 +1,168 @@
+from array import array
+import asyncio
+import unittest
+from unittest import mock
+
+from aranet4 import client
+
+
+class FakeMonitor(client.Aranet4):
+    """Stand-in for `client.Aranet4`, counting simultaneous connections"""
+
+    active = 0
+    most_active = 0
+    connects = 0
+    delays = {}
+
+    def __init__(self, address, client=None):
+        self.address = address
+        self.device = mock.Mock(is_connected=False)
+        self.metadata = None
+
+    async def connect(self):
+        FakeMonitor.connects += 1
+        FakeMonitor.active += 1
+        FakeMonitor.most_active = max(FakeMonitor.most_active, FakeMonitor.active)
+        self.device.is_connected = True
+        await asyncio.sleep(self.delays.get(self.address, 0.01))
+
+    async def disconnect(self):
+        FakeMonitor.active -= 1
+        self.device.is_connected = False
+
+    async def current_readings(self, details=False):
+        return client.CurrentReading(co2=400 + len(self.address))
+
+    async def get_name(self):
+        return f"Aranet4 {self.address[-5:]}"
+
+    async def get_version(self):
+        return "v1.4.4"
+
+    async def get_total_readings(self):
+        return 100
+
+    async def get_sensor_state(self):
+        return None
+
+    async def get_seconds_since_update(self):
+        return 30
+
+    async def get_interval(self):
+        return 60
+
+    async def iter_records(self, params, log_size, start=1, end=0xFFFF):
+        # Packets of 7 datapoints, first one can start before the window
+        for param in params:
+            for first in range(start - start % 7 + 1, min(end, log_size) + 1, 7):
+                typecode = client.PARAM_DECODERS[param].typecode
+                values = array(typecode, range(first, min(first + 7, log_size + 1)))
+                yield client.RecordChunk(param, first, values)
+
+
+class FakeMonitorTestCase(unittest.TestCase):
+    def setUp(self):
+        FakeMonitor.active = 0
+        FakeMonitor.most_active = 0
+        FakeMonitor.connects = 0
+        FakeMonitor.delays = {}
+        patcher = mock.patch.object(client, "Aranet4", FakeMonitor)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class FleetReadings(FakeMonitorTestCase):
+    def test_connection_limit(self):
+        addresses = [f"11:22:33:44:55:{idx:02X}" for idx in range(10)]
+        results = client.get_fleet_readings(addresses, max_connections=3)
+
+        self.assertEqual(set(addresses), set(results))
+        self.assertEqual(3, FakeMonitor.most_active)
+        self.assertEqual(0, FakeMonitor.active)
+        for address, result in results.items():
+            self.assertIsNone(result.error)
+            self.assertEqual(f"Aranet4 {address[-5:]}", result.readings.name)
+
+    def test_timeout(self):
+        FakeMonitor.delays = {"11:22:33:44:55:00": 5}
+        addresses = ["11:22:33:44:55:00", "11:22:33:44:55:01"]
+
+        async def collect():
+            return [
+                result
+                async for result in client.stream_current_readings(addresses, timeout=0.2)
+            ]
+
+        results = asyncio.run(collect())
+
+        # Fast device is yielded first
+        self.assertEqual(addresses[1], results[0].address)
+        self.assertIsNotNone(results[0].readings)
+        self.assertEqual(addresses[0], results[1].address)
+        self.assertIsInstance(results[1].error, asyncio.TimeoutError)
+        self.assertEqual(0, FakeMonitor.active)
+
+
+class ConnectionPool(FakeMonitorTestCase):
+    def test_reuse_and_idle_close(self):
+        async def run():
+            async with client.Aranet4Pool(idle_time=0.1) as pool:
+                first = await pool.current_readings("11:22:33:44:55:00")
+                second = await pool.current_readings("11:22:33:44:55:00")
+                self.assertEqual(first, second)
+                self.assertEqual(1, FakeMonitor.connects)
+                self.assertEqual(1, FakeMonitor.active)
+                await asyncio.sleep(0.2)
+                self.assertEqual(0, FakeMonitor.active)
+                await pool.current_readings("11:22:33:44:55:00")
+                self.assertEqual(2, FakeMonitor.connects)
+            self.assertEqual(0, FakeMonitor.active)
+
+        asyncio.run(run())
+
+    def test_max_connections(self):
+        addresses = [f"11:22:33:44:55:{idx:02X}" for idx in range(6)]
+
+        async def run():
+            async with client.Aranet4Pool(max_connections=2) as pool:
+                for _ in range(2):
+                    async for result in client.stream_current_readings(addresses, 2, pool=pool):
+                        self.assertIsNone(result.error)
+                self.assertEqual(2, FakeMonitor.most_active)
+
+        asyncio.run(run())
+
+    def test_failure_drops_connection(self):
+        async def run():
+            async with client.Aranet4Pool() as pool:
+                with self.assertRaises(client.Aranet4Error):
+                    async with pool.connection("11:22:33:44:55:00"):
+                        raise client.Aranet4Error("broken")
+                self.assertEqual(0, FakeMonitor.active)
+                await pool.current_readings("11:22:33:44:55:00")
+                self.assertEqual(2, FakeMonitor.connects)
+
+        asyncio.run(run())
+
+
+class StreamRecords(FakeMonitorTestCase):
+    def test_windows(self):
+        records = list(
+            client.stream_records("11:22:33:44:55:00", {"last": 25, "temp": False}, 10)
+        )
+
+        self.assertEqual([(76, 85), (86, 95), (96, 100)], [
+            (record.filter.begin, record.filter.end) for record in records
+        ])
+        self.assertEqual(list(range(76, 101)), [
+            value for record in records for value in record.value.column("co2")
+        ])
+        rows = [row for record in records for row in record.value]
+        self.assertEqual(25, len(rows))
+        self.assertEqual(-1, rows[0].temperature)
+        self.assertEqual(60, (rows[1].date - rows[0].date).total_seconds())
+        self.assertEqual(0, FakeMonitor.active)
+
+
+if __name__ == "__main__":
+    unittest.main()
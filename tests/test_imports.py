@@ -0,0 +1,78 @@
+import json
+import subprocess
+import sys
+import unittest
+from unittest import mock
+
+from aranet4 import aranetctl
+from aranet4 import client
+from aranet4 import daemon
+from aranet4 import fleet
+from aranet4 import history
+from aranet4 import pool
+from aranet4 import scanner
+
+
+def loaded_modules(code):
+    """Names of modules loaded in fresh interpreter by `code`"""
+    result = subprocess.run(
+        [sys.executable, "-c", f"{code}\nimport json, sys\nprint(json.dumps(sorted(sys.modules)))"],
+        capture_output=True, text=True, check=True,
+    )
+    return set(json.loads(result.stdout))
+
+
+class LazyImports(unittest.TestCase):
+    def test_aranetctl(self):
+        modules = loaded_modules("import aranet4.aranetctl")
+        for name in ("requests", "bleak", "asyncio", "aranet4.client", "aranet4.daemon"):
+            self.assertNotIn(name, modules)
+
+    def test_files(self):
+        modules = loaded_modules("import aranet4.archive, aranet4.export, aranet4.store")
+        for name in ("bleak", "asyncio", "aranet4.client"):
+            self.assertNotIn(name, modules)
+
+    def test_client(self):
+        modules = loaded_modules("import aranet4.client")
+        self.assertNotIn("bleak", modules)
+        modules = loaded_modules("from aranet4 import Aranet4Scanner")
+        self.assertIn("aranet4.client", modules)
+        self.assertNotIn("bleak", modules)
+
+    def test_daemon_port(self):
+        self.assertEqual(daemon.DEFAULT_PORT, aranetctl.DAEMON_PORT)
+
+
+class ClientAliases(unittest.TestCase):
+    def test_moved(self):
+        self.assertIs(history.get_all_records, client.get_all_records)
+        self.assertIs(history.SyncCursor, client.SyncCursor)
+        self.assertIs(pool.Aranet4Pool, client.Aranet4Pool)
+        self.assertIs(fleet.get_fleet_readings, client.get_fleet_readings)
+        self.assertIs(scanner.Aranet4Scanner, client.Aranet4Scanner)
+        self.assertIn("find_nearby", dir(client))
+        with self.assertRaises(AttributeError):
+            client.missing
+
+    def test_bleak(self):
+        import bleak
+        from bleak.backends.device import BLEDevice
+
+        self.assertIs(bleak.BleakClient, client.BleakClient)
+        self.assertIs(bleak.BleakScanner, client.BleakScanner)
+        self.assertIs(BLEDevice, client.BLEDevice)
+
+    def test_patch_bleak(self):
+        with mock.patch.object(client, "BleakClient") as bleak_client:
+            monitor = client.Aranet4("11:22:33:44:55:66")
+        bleak_client.assert_called_once_with("11:22:33:44:55:66")
+        self.assertIs(bleak_client.return_value, monitor.device)
+
+        with mock.patch.object(client, "BleakScanner") as bleak_scanner:
+            aranet_scanner = scanner.Aranet4Scanner(lambda adv: None)
+        self.assertIs(bleak_scanner.return_value, aranet_scanner.scanner)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,127 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from aranet4 import client
+from aranet4 import history
+from aranet4.metadata import DeviceInfo, MetadataCache
+from aranet4.pool import Aranet4Pool
+from aranet4.simulator import SimulatedDevice
+
+from test_advertisements import aranet4_advert
+
+
+def advertisement(address, version):
+    advert = aranet4_advert(16, address=address)
+    adv = client.Aranet4Advertisement(advert["device"], advert["ad_data"])
+    adv.manufacturer_data.version = client.Version(*version)
+    return adv
+
+
+class Metadata(unittest.TestCase):
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.path = os.path.join(tmp_dir.name, "devices.json")
+
+    def test_polls(self):
+        device = SimulatedDevice(log_size=100)
+        cache = MetadataCache(self.path)
+
+        async def run():
+            async with client.Aranet4Pool(client_factory=lambda address: device, metadata=cache) as pool:
+                return [await pool.current_readings(device.address) for _ in range(3)]
+
+        readings = asyncio.run(run())
+        self.assertTrue(all((item.name, item.version) == (device.name, "v1.4.4") for item in readings))
+        # Name and version are read once, first poll reads no more than without cache
+        self.assertEqual(2 + 3 * 2, device.reads)
+
+        info = MetadataCache(self.path).get(device.address.lower())
+        self.assertEqual(DeviceInfo(device.address, device.name, "v1.4.4"), info)
+
+    def test_records(self):
+        device = SimulatedDevice(log_size=100)
+        cache = MetadataCache()
+        cache.put(DeviceInfo(device.address, "Aranet4 cached", "v1.4.4"))
+
+        async def run():
+            monitor = client.Aranet4(device.address, client=device)
+            monitor.metadata = cache
+            async with monitor:
+                return await client._read_records(monitor, {}, False)
+
+        record = asyncio.run(run())
+        self.assertEqual(("Aranet4 cached", "v1.4.4"), (record.name, record.version))
+        self.assertEqual(100, len(record.value))
+
+    def test_records_skip_sensor_state(self):
+        # History planning needs only name and version, sensor state is not read
+        device = SimulatedDevice(log_size=100)
+        cache = MetadataCache()
+        cache.put(DeviceInfo(device.address, "Aranet4 cached", "v1.4.4"))
+        read = device.read_gatt_char
+
+        async def read_gatt_char(char_specifier, **kwargs):
+            self.assertNotEqual(client.Aranet4.CHARACTERISTIC_SENSOR_STATE, char_specifier)
+            return await read(char_specifier, **kwargs)
+
+        async def run():
+            monitor = client.Aranet4(device.address, client=device)
+            monitor.metadata = cache
+            async with monitor:
+                return await client._read_records(monitor, {}, False)
+
+        with mock.patch.object(device, "read_gatt_char", read_gatt_char):
+            record = asyncio.run(run())
+        self.assertEqual(100, len(record.value))
+
+    def test_missing_characteristics(self):
+        device = SimulatedDevice(log_size=100)
+        del device.services.characteristics[client.Aranet4.CHARACTERISTIC_SERIAL_NO]
+        del device.services.characteristics[client.Aranet4.CHARACTERISTIC_HW_REV]
+        cache = MetadataCache()
+
+        async def run():
+            async with Aranet4Pool(client_factory=lambda address: device, metadata=cache) as pool:
+                return await pool.current_readings(device.address)
+
+        readings = asyncio.run(run())
+        self.assertEqual((device.name, "v1.4.4"), (readings.name, readings.version))
+        self.assertEqual(DeviceInfo(device.address, device.name, "v1.4.4"), cache.get(device.address))
+
+    def test_public_functions(self):
+        device = SimulatedDevice(log_size=100)
+        cache = MetadataCache(self.path)
+
+        with mock.patch.object(client, "BleakClient", lambda address: device):
+            readings = client.get_current_readings(device.address, metadata=cache)
+            with mock.patch.object(device, "read_gatt_char", wraps=device.read_gatt_char) as read:
+                record = history.get_all_records(device.address, {}, metadata=cache)
+
+        self.assertEqual(device.name, readings.name)
+        self.assertEqual((device.name, "v1.4.4"), (record.name, record.version))
+        self.assertEqual(100, len(record.value))
+        self.assertEqual(device.name, MetadataCache(self.path).get(device.address).name)
+        # Second connection reads no device details
+        uuids = {call.args[0] for call in read.call_args_list}
+        self.assertIn(client.Aranet4.CHARACTERISTIC_TOTAL_READINGS, uuids)
+        self.assertNotIn(client.Aranet4.CHARACTERISTIC_DEVICE_NAME, uuids)
+        self.assertNotIn(client.Aranet4.CHARACTERISTIC_SW_REV, uuids)
+
+    def test_firmware_update(self):
+        cache = MetadataCache(self.path)
+        cache.put(DeviceInfo("00:11:22:33:44:55", "Aranet4 12345", "v1.4.4"))
+        cache.put(DeviceInfo("00:11:22:33:44:66", "Aranet4 12346", "v1.4.4"))
+
+        self.assertFalse(cache.check_advertisement(advertisement("00:11:22:33:44:55", (1, 4, 4))))
+        self.assertTrue(cache.check_advertisement(advertisement("00:11:22:33:44:55", (1, 4, 19))))
+        self.assertFalse(cache.check_advertisement(advertisement("00:11:22:33:44:77", (1, 4, 19))))
+        self.assertIsNone(cache.get("00:11:22:33:44:55"))
+        self.assertEqual(["00:11:22:33:44:66"], list(MetadataCache(self.path).devices))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+import asyncio
+import unittest
+
+from aranet4 import client
+from aranet4 import daemon
+from aranet4 import metrics
+from aranet4.simulator import SimulatedDevice
+
+from test_advertisements import aranet4_advert
+
+
+def samples(text):
+    """Dictionary of sample name with labels and value"""
+    return dict(
+        line.rsplit(" ", 1) for line in text.splitlines() if line and not line.startswith("#")
+    )
+
+
+class Metrics(unittest.TestCase):
+    def test_scanner(self):
+        registry = metrics.Metrics()
+        scanner = client.Aranet4Scanner(lambda adv: None, skip_duplicates=True)
+        registry.add_scanner(scanner)
+        for ago, co2, address in [(16, 1091, "00:11:22:33:44:55"), (17, 1091, "00:11:22:33:44:55"),
+                                  (2, 1100, "00:11:22:33:44:66")]:
+            advert = aranet4_advert(ago, co2, address)
+            scanner._process_advertisement(advert["device"], advert["ad_data"])
+
+        result = samples(registry.render())
+        self.assertEqual("3", result["aranet4_advertisements_received_total"])
+        self.assertEqual("2", result["aranet4_advertisements_emitted_total"])
+        self.assertEqual("1", result["aranet4_advertisements_duplicates_total"])
+        self.assertEqual("3", result['aranet4_advertisement_decode_seconds_bucket{le="+Inf"}'])
+        self.assertEqual("3", result["aranet4_advertisement_decode_seconds_count"])
+        self.assertLess(float(result['aranet4_device_last_seen_seconds{address="00:11:22:33:44:66"}']), 5)
+
+    def test_daemon_duplicates(self):
+        scan_daemon = daemon.ScanDaemon()
+        for ago in (16, 17, 18, 2):
+            advert = aranet4_advert(ago)
+            scan_daemon.scanner._process_advertisement(advert["device"], advert["ad_data"])
+
+        status, content_type, body = scan_daemon._respond("/metrics")
+        result = samples(body.decode())
+        self.assertEqual(("200 OK", metrics.CONTENT_TYPE), (status, content_type))
+        self.assertEqual("4", result["aranet4_advertisements_received_total"])
+        self.assertEqual("2", result["aranet4_advertisements_emitted_total"])
+        self.assertEqual("2", result["aranet4_advertisements_duplicates_total"])
+
+    def test_gatt(self):
+        registry = metrics.Metrics()
+        device = SimulatedDevice(log_size=100, packet_loss=0.2, seed=3)
+
+        async def run():
+            async with client.Aranet4Pool(client_factory=lambda address: device, stats=registry.gatt) as pool:
+                await pool.get_all_records(device.address, {})
+
+        asyncio.run(run())
+        result = samples(registry.render())
+        self.assertEqual("1", result["aranet4_connections_total"])
+        self.assertEqual("0", result["aranet4_connection_failures_total"])
+        self.assertEqual(str(device.packets_sent), result["aranet4_history_packets_total"])
+        self.assertEqual(str(device.packets_lost), result["aranet4_history_empty_reads_total"])
+        self.assertEqual("1", result['aranet4_gatt_operations_total{kind="read",characteristic="total_readings"}'])
+        self.assertEqual(str(device.reads), result['aranet4_gatt_operation_seconds_count{kind="read"}'])
+        # 10 byte header, 100 datapoints of 2 bytes and of humidity in 1 byte
+        history_bytes = 10 * (device.packets_sent + device.packets_lost) + 3 * 200 + 100
+        self.assertEqual(str(history_bytes), result["aranet4_history_bytes_total"])
+
+    def test_serve(self):
+        registry = metrics.Metrics()
+
+        async def get(port, path):
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+            response = await reader.read()
+            writer.close()
+            return response.split(b"\r\n\r\n", 1)
+
+        async def run():
+            server = await registry.serve(port=0)
+            port = server.sockets[0].getsockname()[1]
+            async with server:
+                return await get(port, "/metrics"), await get(port, "/")
+
+        (head, body), (missing, _) = asyncio.run(run())
+        self.assertIn(b"Content-Type: text/plain; version=0.0.4", head)
+        self.assertIn(b"# TYPE aranet4_connections_total counter\naranet4_connections_total 0\n", body)
+        self.assertTrue(missing.startswith(b"HTTP/1.1 404 Not Found"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,448 @@
+import asyncio
+from dataclasses import replace
+import time
+import unittest
+from unittest import mock
+
+from aranet4 import client
+from aranet4 import history
+from aranet4.client import AranetType, Param, PARAM_DECODERS
+from aranet4.simulator import SimulatedDevice
+
+
+def read_records(device, entry_filter=None, packet_timeout=10):
+    async def run():
+        async with client.Aranet4(device.address, client=device) as monitor:
+            monitor.packet_timeout = packet_timeout
+            return await client._read_records(monitor, entry_filter or {}, False)
+
+    return asyncio.run(run())
+
+
+def decoded(device, param):
+    return PARAM_DECODERS[param].decode_many(device.history[param])
+
+
+class SimulatedDevices(unittest.TestCase):
+    def test_current_readings(self):
+        expected = {
+            AranetType.ARANET4: ("co2", 499),
+            AranetType.ARANET2: ("humidity", 44.9),
+            AranetType.ARANET_RADIATION: ("radiation_rate", 120),
+            AranetType.ARANET_RADON: ("radon_concentration", 109),
+        }
+        for device_type, (name, value) in expected.items():
+            with self.subTest(device_type):
+                device = SimulatedDevice(type=device_type, log_size=100)
+
+                async def run():
+                    async with client.Aranet4(device.address, client=device) as monitor:
+                        return await client._read_current(monitor), await monitor.get_sensor_state()
+
+                readings, state = asyncio.run(run())
+                self.assertEqual(device_type, readings.type)
+                self.assertEqual(device_type, state.type)
+                self.assertEqual(device.name, readings.name)
+                self.assertEqual(100, readings.stored)
+                self.assertEqual(value, getattr(readings, name))
+                if device_type in (AranetType.ARANET2, AranetType.ARANET_RADIATION):
+                    self.assertEqual((60, 30), (readings.interval, readings.ago))
+
+    def test_history(self):
+        for history_v2 in (True, False):
+            with self.subTest(history_v2=history_v2):
+                device = SimulatedDevice(log_size=500, history_v2=history_v2, packet_size=20)
+                record = read_records(device, {"humi": True})
+                self.assertEqual(500, len(record.value))
+                self.assertEqual(decoded(device, Param.CO2), list(record.value.column("co2")))
+                self.assertEqual(decoded(device, Param.TEMPERATURE), list(record.value.column("temperature")))
+                # v2 packet holds 5 datapoints of 2 bytes and 10 of humidity, v1 holds 8 and 16
+                self.assertEqual(3 * 100 + 50 if history_v2 else 3 * 63 + 32, device.packets_sent)
+
+    def test_pipelining(self):
+        params = [Param.CO2, Param.TEMPERATURE]
+        for history_v2, data_kind, packets in ((True, "read", 6), (False, "notify", 4)):
+            with self.subTest(history_v2=history_v2):
+                device = SimulatedDevice(log_size=30, history_v2=history_v2, packet_size=20)
+                operations = []
+
+                async def run():
+                    monitor = client.Aranet4(device.address, client=device)
+                    monitor.packet_timeout = 5
+                    monitor.on_operation = lambda op: operations.append((time.monotonic(), op))
+                    async with monitor:
+                        await monitor.get_records_batch(params, 30)
+                    return monitor
+
+                monitor = asyncio.run(run())
+                history = [
+                    (when, op) for when, op in operations
+                    if op.kind in ("write", data_kind)
+                ]
+                # Next request follows final packet of previous parameter,
+                # without extra read or waiting for packet timeout
+                self.assertEqual(
+                    (["write"] + [data_kind] * packets) * 2, [op.kind for _, op in history]
+                )
+                final_packet, next_request = history[packets], history[packets + 1]
+                self.assertLess(next_request[0] - final_packet[0], 1)
+                self.assertSetEqual(set(params), set(monitor.record_timings))
+                self.assertTrue(all(seconds > 0 for seconds in monitor.record_timings.values()))
+
+    def test_model_names(self):
+        # Aranet4 logs every default parameter, unknown model has no history
+        device = SimulatedDevice(log_size=100)
+        record = read_records(device)
+        self.assertEqual(decoded(device, Param.CO2), list(record.value.column("co2")))
+        self.assertEqual(decoded(device, Param.PRESSURE), list(record.value.column("pressure")))
+
+        device = SimulatedDevice(log_size=100)
+        device.name = "Unknown 12345"
+        record = read_records(device)
+        self.assertEqual([], record.value)
+        self.assertEqual(0, device.packets_sent)
+
+    def test_history_filter(self):
+        device = SimulatedDevice(type=AranetType.ARANET_RADIATION, log_size=300, history_v2=False)
+        record = read_records(device, {"last": 10})
+        self.assertEqual((291, 300), (record.filter.begin, record.filter.end))
+        column = list(record.value.column("rad_dose_total"))
+        self.assertEqual(decoded(device, Param.RADIATION_DOSE_INTEGRAL)[-10:], column[-10:])
+        self.assertEqual([-1] * 290, column[:-10])
+
+    def test_packet_loss(self):
+        device = SimulatedDevice(log_size=300, packet_loss=0.2, seed=1)
+        record = read_records(device)
+        self.assertGreater(device.packets_lost, 0)
+        self.assertEqual(decoded(device, Param.PRESSURE), list(record.value.column("pressure")))
+
+        # Lost notification leaves a gap
+        device = SimulatedDevice(log_size=300, history_v2=False, packet_loss=0.2, seed=1)
+        record = read_records(device, packet_timeout=0.2)
+        column = list(record.value.column("co2"))
+        self.assertIn(-1, column)
+        self.assertEqual(
+            [value for value in decoded(device, Param.CO2) if value in column],
+            [value for value in column if value != -1],
+        )
+
+    def test_roll_over(self):
+        device = SimulatedDevice(log_size=100, capacity=100, packet_size=20, log_every=4)
+        record = read_records(device, {"temp": False, "humi": False, "pres": False})
+        # 20 packets of 5 datapoints, a datapoint logged after every 4th
+        self.assertEqual((20, 105), (device.packets_sent, device.logged))
+        self.assertEqual(100, device.log_size)
+        self.assertEqual(100, len(record.value))
+        # Log was shifted by one for every datapoint logged before the packet
+        expected = [400 + idx + idx // 5 // 4 for idx in range(100)]
+        self.assertEqual(expected, list(record.value.column("co2")))
+
+    def test_unsupported_param(self):
+        async def run(device):
+            monitor = client.Aranet4(device.address, client=device)
+            monitor.packet_timeout = 0.2
+            async with monitor:
+                return await asyncio.wait_for(monitor.get_records_batch([Param.CO2], 100), 5)
+
+        # Aranet2 doesn't log CO2: v1 ends with empty packet, v2 never has data
+        device = SimulatedDevice(type=AranetType.ARANET2, log_size=100, history_v2=False)
+        results = asyncio.run(run(device))
+        self.assertEqual([-1] * 100, list(results[Param.CO2]))
+        self.assertEqual(0, device.packets_sent)
+
+        device = SimulatedDevice(type=AranetType.ARANET2, log_size=100)
+        with self.assertRaises(client.Aranet4Error):
+            asyncio.run(run(device))
+        self.assertEqual(0, device.packets_sent)
+
+    def test_stats(self):
+        for history_v2 in (True, False):
+            with self.subTest(history_v2=history_v2):
+                # Lost final notification would stall v1 download
+                loss = 0.1 if history_v2 else 0
+                device = SimulatedDevice(log_size=300, history_v2=history_v2, packet_loss=loss, seed=2)
+                operations = []
+
+                async def run():
+                    monitor = client.Aranet4(device.address, client=device)
+                    monitor.on_operation = operations.append
+                    async with monitor:
+                        await client._read_records(monitor, {}, False)
+                    return monitor.stats
+
+                stats = asyncio.run(run())
+                self.assertEqual(device.reads, stats.total("read").count)
+                self.assertEqual(device.writes, stats.total("write").count)
+                self.assertEqual(1, stats.total("connect").count)
+                self.assertEqual(sum(stats.total("read").histogram), stats.total("read").count)
+                self.assertEqual(len(operations), sum(op.count for op in stats.operations.values()))
+                if history_v2:
+                    self.assertEqual(device.packets_lost, stats.empty_reads)
+                    self.assertEqual(device.packets_sent, stats.history_packets)
+                else:
+                    self.assertEqual(device.packets_sent, stats.total("notify").count)
+                    self.assertEqual(1, stats.total("start_notify").count)
+
+                names = {item["characteristic"] for item in stats.to_dict()["operations"]}
+                self.assertIn("total_readings", names)
+                self.assertIn("cmd", names)
+
+    def test_settings(self):
+        device = SimulatedDevice(log_size=100)
+
+        async def run():
+            async with client.Aranet4(device.address, client=device) as monitor:
+                return await client._apply_settings(
+                    monitor, {"interval": "5", "range": "extended", "integrations": "off"}
+                )
+
+        status = asyncio.run(run())
+        self.assertDictEqual({"interval": True, "range": True, "integrations": True}, status)
+        self.assertEqual([b"\x90\x05", b"\x92\x01", b"\x91\x00"], device.commands)
+        self.assertEqual(300, device.interval)
+        # Log is cleared by interval change
+        self.assertEqual(0, device.log_size)
+        # Sensor state and interval are read once for all settings
+        self.assertEqual(2, device.reads)
+
+    def test_apply_settings(self):
+        device = SimulatedDevice(log_size=100)
+
+        async def run():
+            async with client.Aranet4(device.address, client=device) as monitor:
+                verified = await monitor.apply_settings(interval=2, extended_range=True, integrations=False)
+                # Device ignores the command
+                device.write_gatt_char = lambda char_specifier, data, response=None: asyncio.sleep(0)
+                failed = await monitor.apply_settings(integrations=True)
+                unverified = await monitor.apply_settings(interval=10, verify=False)
+                return verified, failed, unverified
+
+        verified, failed, unverified = asyncio.run(run())
+        self.assertEqual(client.SettingResult("interval", 2, 2, True), verified["interval"])
+        self.assertEqual(client.SettingResult("range", True, True, True), verified["range"])
+        self.assertEqual(client.SettingResult("integrations", False, False, True), verified["integrations"])
+        self.assertTrue(all(result.ok for result in verified.values()))
+        self.assertFalse(failed["integrations"].ok)
+        self.assertEqual(["integrations"], list(failed))
+        self.assertEqual((None, False, True), (unverified["interval"].actual, unverified["interval"].verified,
+                                                unverified["interval"].ok))
+        self.assertEqual(3, device.reads)
+
+    def test_fleet(self):
+        devices = {}
+        connects = []
+
+        def connect(address):
+            connects.append(address)
+            devices[address] = SimulatedDevice(address, log_size=10, latency=0.01)
+            return devices[address]
+
+        addresses = [f"00:11:22:33:44:{idx:02X}" for idx in range(6)]
+
+        async def run():
+            async with client.Aranet4Pool(client_factory=connect) as pool:
+                first = [reading async for reading in client.stream_current_readings(addresses, pool=pool)]
+                again = await pool.current_readings(addresses[0])
+                return first, again
+
+        first, again = asyncio.run(run())
+        self.assertSetEqual(set(addresses), {reading.address for reading in first})
+        self.assertTrue(all(reading.error is None for reading in first))
+        self.assertEqual(409, again.co2)
+        # Connection of the first device was reused for the second reading
+        self.assertEqual(addresses, sorted(connects))
+        self.assertFalse(any(device.is_connected for device in devices.values()))
+
+
+def sync(device, cursor):
+    async def run():
+        async with client.Aranet4(device.address, client=device) as monitor:
+            return await client._read_records(monitor, {}, True, cursor)
+
+    return asyncio.run(run())
+
+
+def elapse(device, cursor, count):
+    """
+    Log `count` datapoints. Log times are derived from current time, so
+    previous sync is moved back as if they were logged since then.
+    """
+    device.log(count)
+    device.ago = 30
+    cursor.timestamp -= count * device.interval
+
+
+class SyncRecords(unittest.TestCase):
+    def test_new_tail(self):
+        device = SimulatedDevice(log_size=100)
+        cursor = client.SyncCursor(device.address)
+        self.assertEqual(100, len(sync(device, cursor).value))
+        self.assertEqual((100, 60), (cursor.index, cursor.interval))
+
+        elapse(device, cursor, 5)
+        record = sync(device, cursor)
+        self.assertEqual((101, 105), (record.filter.begin, record.filter.end))
+        self.assertEqual(decoded(device, Param.CO2)[-5:], [item.co2 for item in record.value])
+        self.assertEqual(105, cursor.index)
+
+    def test_nothing_new(self):
+        device = SimulatedDevice(log_size=100)
+        cursor = client.SyncCursor(device.address)
+        sync(device, cursor)
+        previous = replace(cursor)
+
+        record = sync(device, cursor)
+        self.assertEqual(0, len(record.value))
+        self.assertEqual(previous, cursor)
+
+    def test_interval_change(self):
+        device = SimulatedDevice(log_size=100)
+        cursor = client.SyncCursor(device.address)
+        sync(device, cursor)
+
+        # Interval change clears the log on device
+        device._command(b"\x90\x02")
+        elapse(device, cursor, 20)
+        record = sync(device, cursor)
+        self.assertEqual((1, 20), (record.filter.begin, record.filter.end))
+        self.assertEqual(decoded(device, Param.CO2), [item.co2 for item in record.value])
+        self.assertEqual((20, 120), (cursor.index, cursor.interval))
+
+    def test_roll_over(self):
+        device = SimulatedDevice(log_size=100, capacity=100)
+        cursor = client.SyncCursor(device.address)
+        sync(device, cursor)
+
+        elapse(device, cursor, 10)
+        self.assertEqual(100, device.log_size)
+        record = sync(device, cursor)
+        # Last synced datapoint moved from index 100 to 90
+        self.assertEqual((91, 100), (record.filter.begin, record.filter.end))
+        self.assertEqual(decoded(device, Param.TEMPERATURE)[-10:], [item.temperature for item in record.value])
+        self.assertEqual(100, cursor.index)
+
+
+class FakeClock:
+    """
+    `time.monotonic` of client and `asyncio.sleep`, time passes only by
+    sleeping. Delays of sleeps are kept in `sleeps`.
+    """
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+        self._sleep = asyncio.sleep
+
+    def monotonic(self):
+        return self.now
+
+    async def sleep(self, delay):
+        self.sleeps.append(delay)
+        self.now += delay
+        await self._sleep(0)
+
+
+class HistoryStalls(unittest.TestCase):
+    def download(self, device, packet_timeout=10, history_timeout=300):
+        """
+        Download CO2 history on fake clock, keeping stats and times of
+        history reads
+        """
+        clock = FakeClock()
+        monitor = client.Aranet4(device.address, client=device)
+        monitor.packet_timeout = packet_timeout
+        monitor.history_timeout = history_timeout
+        self.stats = monitor.stats
+        self.sleeps = clock.sleeps
+        self.reads = []
+
+        def on_operation(op):
+            if op.uuid == client.Aranet4.CHARACTERISTIC_HISTORY_READINGS_V2:
+                self.reads.append(round(clock.monotonic(), 6))
+
+        monitor.on_operation = on_operation
+
+        async def run():
+            async with monitor:
+                await monitor.get_records_batch([Param.CO2], device.log_size)
+
+        with mock.patch.object(client, "time", clock), mock.patch("asyncio.sleep", clock.sleep):
+            asyncio.run(run())
+
+    def test_packet_timeout(self):
+        device = SimulatedDevice(log_size=100, packet_loss=1.0)
+        with self.assertRaisesRegex(client.Aranet4Error, "CO2 stalled for 0.5 s"):
+            self.download(device, packet_timeout=0.5)
+        self.assertEqual(0, self.stats.history_packets)
+        self.assertEqual(device.packets_lost, self.stats.empty_reads)
+        # Retried at once, then with doubling delay up to READ_BACKOFF_MAX,
+        # until no packet was read for `packet_timeout`
+        self.assertEqual([0, 0, 0.01, 0.03, 0.07, 0.15, 0.31, 0.51], self.reads)
+        self.assertEqual(8, self.stats.empty_reads)
+        self.assertAlmostEqual(0.51, self.stats.stall_time)
+
+    def test_history_timeout(self):
+        device = SimulatedDevice(log_size=100, packet_loss=1.0)
+        with self.assertRaisesRegex(client.Aranet4Error, "CO2 timed out"):
+            self.download(device, history_timeout=0.3)
+        self.assertEqual([0, 0, 0.01, 0.03, 0.07, 0.15, 0.31], self.reads)
+        self.assertAlmostEqual(0.31, self.stats.stall_time)
+
+    def test_recovered_stall(self):
+        device = SimulatedDevice(log_size=100, packet_loss=0.5, seed=4)
+        self.download(device)
+        self.assertGreater(device.packets_lost, 0)
+        self.assertEqual(device.packets_lost, self.stats.empty_reads)
+        self.assertEqual(device.packets_sent, self.stats.history_packets)
+        # Clock moved only while backing off from empty reads
+        self.assertGreater(self.stats.stall_time, 0)
+        self.assertAlmostEqual(sum(self.sleeps), self.stats.stall_time)
+
+
+class StreamRecords(unittest.TestCase):
+    def test_single_request_per_param(self):
+        for history_v2 in (True, False):
+            with self.subTest(history_v2=history_v2):
+                device = SimulatedDevice(log_size=1000, history_v2=history_v2)
+
+                async def run():
+                    async with client.Aranet4Pool(client_factory=lambda address: device) as pool:
+                        stream = client._stream_records(device.address, {"last": 950}, 100, pool=pool)
+                        return [record async for record in stream]
+
+                records = asyncio.run(run())
+                self.assertEqual(
+                    [(begin, min(begin + 99, 1000)) for begin in range(51, 1001, 100)],
+                    [(record.filter.begin, record.filter.end) for record in records],
+                )
+                self.assertEqual(decoded(device, Param.CO2)[50:], [row.co2 for record in records for row in record.value])
+                self.assertEqual(
+                    decoded(device, Param.PRESSURE)[50:],
+                    [value for record in records for value in record.value.column("pressure")],
+                )
+                # Temperature, humidity, pressure and CO2 requested once each
+                self.assertEqual(4, len(device.commands))
+
+    def test_window_storage(self):
+        # Datapoints are stored per window, never in columns of the whole range
+        device = SimulatedDevice(log_size=1000, packet_loss=0.1, seed=3)
+        sizes = []
+
+        def empty_reading(size, typecode="q"):
+            sizes.append(size)
+            return client._empty_reading(size, typecode)
+
+        async def run():
+            async with client.Aranet4Pool(client_factory=lambda address: device) as pool:
+                stream = client._stream_records(device.address, {}, 128, pool=pool)
+                return [(record.filter.begin, list(record.value.column("co2"))) async for record in stream]
+
+        with mock.patch.object(history, "_empty_reading", empty_reading):
+            records = asyncio.run(run())
+        self.assertLessEqual(max(sizes), 128)
+        self.assertEqual(list(range(1, 1001, 128)), [begin for begin, _ in records])
+        self.assertEqual(decoded(device, Param.CO2), [value for _, column in records for value in column])
+
+
+if __name__ == "__main__":
+    unittest.main()
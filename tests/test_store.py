@@ -0,0 +1,105 @@
+from array import array
+import contextlib
+from pathlib import Path
+import sqlite3
+import tempfile
+import unittest
+
+from aranet4 import client
+from aranet4 import store
+
+START = 1644903268
+
+
+def build_record(begin, size, co2_start=800):
+    log_filter = client.Filter(begin, begin + size - 1, True, True, False, True, False, False, False, False)
+    record = client.Record("Aranet4 00001", "v1.4.4", 2016, log_filter)
+    first = START + (begin - 1) * 300
+    record.value = client.RecordColumns(
+        range(first, first + size * 300, 300),
+        {
+            "co2": array("h", range(co2_start, co2_start + size)),
+            "temperature": array("d", [20.05] * size),
+            "humidity": array("h", [40] * size),
+        },
+    )
+    return record
+
+
+class HistoryStore(unittest.TestCase):
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.path = Path(tmp_dir.name, "history.db")
+        self.store = store.HistoryStore(self.path, batch_size=4)
+        self.addCleanup(self.store.close)
+
+    def test_deduplicate(self):
+        self.assertEqual(10, self.store.add("aa:bb:cc:dd:ee:01", build_record(1, 10)))
+        # Overlapping download of a stream
+        added = self.store.add("AA:BB:CC:DD:EE:01", [build_record(6, 5), build_record(11, 5)])
+        self.assertEqual(5, added)
+        self.assertEqual(START + 14 * 300, self.store.last_timestamp("aa:bb:cc:dd:ee:01"))
+        self.assertDictEqual({"AA:BB:CC:DD:EE:01": "Aranet4 00001"}, self.store.devices())
+
+    def test_shifted_download(self):
+        self.assertEqual(3, self.store.add("AA:BB:CC:DD:EE:01", build_record(1, 3)))
+        # Same datapoints, log times a second later
+        shifted = build_record(1, 5)
+        shifted.value.timestamps = range(START + 1, START + 1 + 5 * 300, 300)
+        self.assertEqual(2, self.store.add("AA:BB:CC:DD:EE:01", shifted))
+
+        rows = self.store.db.execute("SELECT ts FROM records ORDER BY ts").fetchall()
+        self.assertListEqual([(START,), (START + 300,), (START + 600,), (START + 901,), (START + 1201,)], rows)
+
+    def test_complete_partial_download(self):
+        # Downloaded without temperature
+        record = build_record(1, 3)
+        del record.value.columns["temperature"]
+        self.assertEqual(3, self.store.add("AA:BB:CC:DD:EE:01", record))
+
+        full = build_record(1, 3, 900)
+        full.value.timestamps = range(START - 1, START - 1 + 3 * 300, 300)
+        self.assertEqual(0, self.store.add("AA:BB:CC:DD:EE:01", full))
+        rows = self.store.db.execute("SELECT ts, co2, temperature FROM records ORDER BY ts").fetchall()
+        # Stored values are kept
+        self.assertListEqual([(START, 800, 20.05), (START + 300, 801, 20.05), (START + 600, 802, 20.05)], rows)
+
+    def test_query(self):
+        self.store.add("AA:BB:CC:DD:EE:01", build_record(1, 10))
+        self.store.add("AA:BB:CC:DD:EE:02", build_record(1, 10, 1200))
+
+        result = self.store.query(START + 300, START + 900)
+        self.assertListEqual(["AA:BB:CC:DD:EE:01", "AA:BB:CC:DD:EE:02"], list(result))
+        self.assertListEqual([1201, 1202, 1203], list(result["AA:BB:CC:DD:EE:02"].column("co2")))
+        self.assertIsNone(result["AA:BB:CC:DD:EE:02"].column("pressure"))
+        row = result["AA:BB:CC:DD:EE:01"][0]
+        self.assertEqual(START + 300, row.date.timestamp())
+        self.assertEqual((801, 20.05, 40, -1), (row.co2, row.temperature, row.humidity, row.pressure))
+
+        result = self.store.query(devices=["aa:bb:cc:dd:ee:02"])
+        self.assertListEqual(["AA:BB:CC:DD:EE:02"], list(result))
+        self.assertEqual(10, len(result["AA:BB:CC:DD:EE:02"]))
+
+    def test_missing_values(self):
+        record = build_record(1, 4)
+        record.value.columns["co2"][1] = -1
+        # Not fetched rows, outside of filter range
+        record.value.columns["co2"][3] = -1
+        record.value.columns["temperature"][3] = -1
+        record.value.columns["humidity"][3] = -1
+        self.assertEqual(3, self.store.add("AA:BB:CC:DD:EE:01", record))
+
+        rows = self.store.db.execute("SELECT co2 FROM records ORDER BY ts").fetchall()
+        self.assertListEqual([(800,), (None,), (802,)], rows)
+        # Row is stored once downloaded
+        self.assertEqual(1, self.store.add("AA:BB:CC:DD:EE:01", build_record(1, 4)))
+
+    def test_wal(self):
+        with contextlib.closing(sqlite3.connect(self.path)) as db:
+            (mode,) = db.execute("PRAGMA journal_mode").fetchone()
+        self.assertEqual("wal", mode)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,10 +1,22 @@
+from array import array
+import asyncio
 import datetime
 import io
+from pathlib import Path
+import struct
+import tempfile
+import time
 import unittest
 from unittest import mock
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 from aranet4 import client
 from aranet4 import aranetctl
+from aranet4 import history
 from aranet4.client import AranetType
 
 result = client.CurrentReading(
@@ -39,7 +51,10 @@ device_readings = """=======================================
 
 base_args = dict(
     device_mac="11:22:33:44:55:66",
+    cache=None,
+    daemon=None,
     end=None,
+    input=None,
     last=None,
     output=None,
     records=False,
@@ -48,6 +63,7 @@ base_args = dict(
     set_integrations=None,
     set_interval=None,
     start=None,
+    sync=None,
     url=None,
     wait=False,
     co2=True,
@@ -64,6 +80,16 @@ class DataManipulation(unittest.TestCase):
             aranetctl.main(["C7:18:1E:21:F4:87"])
             self.assertEqual(device_readings, fake_out.getvalue())
 
+    def test_current_values_cache(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir, "devices.json")
+            with mock.patch.object(client, "get_current_readings", return_value=result) as readings:
+                with unittest.mock.patch("sys.stdout", new=io.StringIO()):
+                    aranetctl.main(["C7:18:1E:21:F4:87", "--cache", str(path)])
+        address, cache = readings.call_args.args
+        self.assertEqual("C7:18:1E:21:F4:87", address)
+        self.assertEqual(path, cache.path)
+
     def test_parse_args1(self):
         expected = base_args.copy()
         args = aranetctl.parse_args(["11:22:33:44:55:66"])
@@ -122,6 +148,192 @@ class DataManipulation(unittest.TestCase):
         times = client._log_times(now, log_records, log_interval, 20)
         self.assertListEqual(expected, times)
 
+    def test_log_timeline(self):
+        now = datetime.datetime(2000, 10, 11, 23, 59, 30, tzinfo=datetime.timezone.utc)
+        timeline = client.LogTimeline(now, 13, 300, 20)
+        times = client._log_times(now, 13, 300, 20)
+        self.assertListEqual(times, list(timeline))
+        self.assertEqual(times[-1], timeline[-1])
+        self.assertListEqual(
+            [time.timestamp() for time in times], list(timeline.timestamps())
+        )
+
+        step = datetime.timedelta(seconds=97)
+        for offset in range(-50, 50):
+            when = times[0] + step * offset
+            for entry_filter in [
+                {"start": when},
+                {"end": when},
+                {"start": when, "end": when + step * 7},
+                {"last": 5, "end": when},
+            ]:
+                self.assertEqual(
+                    client._calc_start_end(times, entry_filter),
+                    client._calc_start_end(timeline, entry_filter),
+                    entry_filter,
+                )
+
+    def test_record_columns(self):
+        start = datetime.datetime(2022, 2, 15, 5, 34, 28, tzinfo=datetime.timezone.utc)
+        timestamps = array("d", [start.timestamp() + 300 * idx for idx in range(4)])
+        columns = {
+            "co2": array("h", [830, 843, -1, 850]),
+            "temperature": array("d", [17.95, 18.0, -1, 18.05]),
+        }
+        rows = client.RecordColumns(timestamps, columns)
+
+        self.assertEqual(4, len(rows))
+        self.assertEqual(
+            client.RecordItem(start, 17.95, -1, -1, 830, -1, -1, -1, -1), rows[0]
+        )
+        self.assertEqual(list(rows), [rows[idx] for idx in range(len(rows))])
+        tail = rows[2:]
+        self.assertEqual(2, len(tail))
+        self.assertEqual(850, tail[1].co2)
+        self.assertEqual(start + datetime.timedelta(seconds=900), tail[1].date)
+        self.assertIsNone(tail.column("pressure"))
+
+    def test_decode_history_values(self):
+        raw = [0, 1, 7, 417, 0x1eff, 0x1f00, 0x3fff, 0x4001, 0x7fff, 0x8000, 0xffff]
+        for param, value_format in [
+            (client.Param.TEMPERATURE, "H"),
+            (client.Param.HUMIDITY, "B"),
+            (client.Param.HUMIDITY2, "H"),
+            (client.Param.PRESSURE, "H"),
+            (client.Param.CO2, "H"),
+            (client.Param.RADIATION_DOSE, "Hx"),
+            (client.Param.RADIATION_DOSE_RATE, "Hx"),
+            (client.Param.RADIATION_DOSE_INTEGRAL, "Q"),
+            (client.Param.RADON_CONCENTRATION, "I"),
+        ]:
+            values = [value & 0xff for value in raw] if value_format == "B" else raw
+            payload = b"\x00\x00" + struct.pack("<" + value_format * len(values), *values)
+            expected = [client.CurrentReading._set(param, value) for value in values]
+            decoded = client.decode_history_values(param, payload, len(values), 2)
+            self.assertListEqual(expected, list(decoded), param.name)
+            if numpy:
+                decoded = client.decode_history_values(param, payload, len(values), 2, True)
+                self.assertListEqual(expected, list(decoded), param.name)
+
+    def test_history_delegate_completion(self):
+        async def run():
+            monitor = mock.Mock(reading=True)
+            delegate = client.Aranet4HistoryDelegate(
+                "handle", client.Param.CO2, 4, monitor
+            )
+            waiter = asyncio.ensure_future(delegate.wait(1, time.monotonic() + 5))
+            delegate.handle_notification(0, struct.pack("<BHBHH", 4, 1, 2, 800, 801))
+            await asyncio.sleep(0)
+            self.assertFalse(waiter.done())
+            delegate.handle_notification(0, struct.pack("<BHBHH", 4, 3, 2, 802, 0x8000))
+            await asyncio.wait_for(waiter, 0.5)
+            self.assertFalse(monitor.reading)
+            self.assertListEqual([800, 801, 802, -1], list(delegate.result))
+
+        asyncio.run(run())
+
+    def test_history_delegate_stall(self):
+        async def run():
+            delegate = client.Aranet4HistoryDelegate(
+                "handle", client.Param.CO2, 4, mock.Mock()
+            )
+            delegate.handle_notification(0, struct.pack("<BHBHH", 4, 1, 2, 800, 801))
+            with self.assertRaises(client.Aranet4Error):
+                await delegate.wait(0.05, time.monotonic() + 5)
+
+        asyncio.run(run())
+
+    def test_history_delegate_chunks(self):
+        async def run():
+            delegate = client.Aranet4HistoryDelegate(
+                "handle", client.Param.CO2, 4, mock.Mock(), chunks=asyncio.Queue()
+            )
+            deadline = time.monotonic() + 5
+            delegate.handle_notification(0, struct.pack("<BHBHH", 4, 1, 2, 800, 801))
+            delegate.handle_notification(0, struct.pack("<BHBHH", 4, 3, 2, 802, 803))
+            delegate.handle_notification(0, struct.pack("<BHB", 4, 5, 0))
+            chunks = []
+            while (chunk := await delegate.next_chunk(1, deadline)) is not None:
+                chunks.append(chunk)
+            self.assertEqual(
+                [(1, [800, 801]), (3, [802, 803])],
+                [(chunk.start, list(chunk.values)) for chunk in chunks],
+            )
+
+        asyncio.run(run())
+
+    def test_iter_records_v2(self):
+        values = {client.Param.CO2: list(range(800, 805)), client.Param.HUMIDITY: [40] * 5}
+        requested = []
+        reads = {}
+
+        async def write_gatt_char(uuid, data, response):
+            requested.append(client.Param(data[1]))
+
+        async def read_gatt_char(uuid):
+            # Three datapoints per packet
+            param = requested[-1]
+            start = 1 + 3 * reads.get(param, 0)
+            reads[param] = reads.get(param, 0) + 1
+            chunk = values[param][start - 1:start + 2]
+            fmt = "B" if param == client.Param.HUMIDITY else "H"
+            header = struct.pack("<BHHHHB", param, 60, 5, 10, start, len(chunk))
+            return header + struct.pack(f"<{len(chunk)}{fmt}", *chunk)
+
+        monitor = client.Aranet4("11:22:33:44:55:66")
+        monitor.device = mock.Mock(write_gatt_char=write_gatt_char, read_gatt_char=read_gatt_char)
+
+        async def run():
+            return [
+                chunk async for chunk in monitor.iter_records(list(values), 5)
+            ]
+
+        chunks = asyncio.run(run())
+        self.assertEqual(
+            [
+                (client.Param.CO2, 1, [800, 801, 802]),
+                (client.Param.CO2, 4, [803, 804]),
+                (client.Param.HUMIDITY, 1, [40, 40, 40]),
+                (client.Param.HUMIDITY, 4, [40, 40]),
+            ],
+            [(chunk.param, chunk.start, list(chunk.values)) for chunk in chunks],
+        )
+        self.assertSetEqual(set(values), set(monitor.record_timings))
+
+    def test_sync_cursors_roundtrip(self):
+        cursors = {
+            "11:22:33:44:55:66": client.SyncCursor("11:22:33:44:55:66", 2016, 1645000000.0, 300)
+        }
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            state_file = Path(tmp_dir, "sync.json")
+            self.assertDictEqual({}, client._load_sync_cursors(state_file))
+            client._save_sync_cursors(state_file, cursors)
+            self.assertDictEqual(cursors, client._load_sync_cursors(state_file))
+
+    def test_parse_args_sync(self):
+        expected = base_args.copy()
+        expected["records"] = True
+        expected["sync"] = Path("sync.json")
+        args = aranetctl.parse_args("11:22:33:44:55:66 -r --sync sync.json".split())
+        self.assertDictEqual(expected, args.__dict__)
+
+    def test_history_module(self):
+        now = datetime.datetime(2000, 10, 11, 23, 59, 30, tzinfo=datetime.timezone.utc)
+        timeline = history.LogTimeline(now, 200, 60, 20)
+        times = history._log_times(now, 200, 60, 20)
+        self.assertListEqual(times, list(timeline))
+        self.assertEqual((181, 200), history._calc_start_end(times, {"last": 20}))
+        self.assertEqual((181, 200), history._calc_start_end(timeline, {"last": 20}))
+        # Same functions as the compatibility names in `client`
+        self.assertIs(history._calc_start_end, client._calc_start_end)
+        self.assertIs(history._log_times, client._log_times)
+
+    def test_parse_args_cache(self):
+        expected = base_args.copy()
+        expected["cache"] = Path("devices.json")
+        args = aranetctl.parse_args("11:22:33:44:55:66 --cache devices.json".split())
+        self.assertDictEqual(expected, args.__dict__)
+
 
 if __name__ == "__main__":
     unittest.main()